@@ -0,0 +1,91 @@
+"""Add per-project label dictionary
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+# Annotations backfilled per statement, so no single UPDATE holds row locks for long
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    # Create labels table
+    op.create_table(
+        'labels',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('color', sa.String(), nullable=True),
+        sa.Column('aliases', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('project_id', 'name', name='uq_labels_project_id_name')
+    )
+    op.create_index(op.f('ix_labels_id'), 'labels', ['id'], unique=False)
+    op.create_index(op.f('ix_labels_project_id'), 'labels', ['project_id'], unique=False)
+
+    # Nullable column without default: metadata-only change, no table rewrite.
+    # Batch mode lets SQLite, which can't ALTER constraints, copy the table instead
+    with op.batch_alter_table('annotations') as batch:
+        batch.add_column(sa.Column('label_id', sa.Integer(), nullable=True))
+        batch.create_foreign_key('fk_annotations_label_id_labels', 'labels', ['label_id'], ['id'])
+
+    # Populate the dictionary from the distinct labels already in use
+    op.execute(
+        """
+        INSERT INTO labels (project_id, name, created_at, updated_at)
+        SELECT DISTINCT images.project_id, annotations.label, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM annotations
+        JOIN images ON images.id = annotations.image_id
+        WHERE images.project_id IS NOT NULL
+        """
+    )
+
+    # Backfill and index outside the migration transaction so writers are not blocked
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text("SELECT MAX(id) FROM annotations")).scalar() or 0
+
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    """
+                    UPDATE annotations SET label_id = (
+                        SELECT labels.id FROM labels
+                        JOIN images ON images.project_id = labels.project_id
+                        WHERE images.id = annotations.image_id
+                        AND labels.name = annotations.label
+                    )
+                    WHERE label_id IS NULL AND id >= :start AND id < :end
+                    """
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+            )
+
+        op.create_index(
+            op.f('ix_annotations_label_id'), 'annotations', ['label_id'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_annotations_label_id'), table_name='annotations')
+    with op.batch_alter_table('annotations') as batch:
+        batch.drop_constraint('fk_annotations_label_id_labels', type_='foreignkey')
+        batch.drop_column('label_id')
+    op.drop_index(op.f('ix_labels_project_id'), table_name='labels')
+    op.drop_index(op.f('ix_labels_id'), table_name='labels')
+    op.drop_table('labels')
@@ -0,0 +1,24 @@
+"""Add packed polygon coordinates
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-02-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Packed little-endian float32 vertex pairs (bytea on PostgreSQL)
+    op.add_column('annotations', sa.Column('coordinates_packed', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('annotations', 'coordinates_packed')
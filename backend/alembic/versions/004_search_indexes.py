@@ -0,0 +1,79 @@
+"""Add search indexes
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-02-15 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+# SQLite fallback: external-content FTS5 tables kept in sync by triggers
+SQLITE_FTS_TABLES = [
+    ('images_fts', 'images', 'original_filename'),
+    ('annotations_fts', 'annotations', 'label'),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+        # Build indexes without blocking writes
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_images_original_filename_trgm '
+                'ON images USING gin (original_filename gin_trgm_ops)'
+            )
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_annotations_label_trgm '
+                'ON annotations USING gin (label gin_trgm_ops)'
+            )
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_annotations_metadata_gin '
+                'ON annotations USING gin ((CAST(metadata AS JSONB)))'
+            )
+
+    elif bind.dialect.name == 'sqlite':
+        for fts_table, table, column in SQLITE_FTS_TABLES:
+            op.execute(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+                f"{column}, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            op.execute(
+                f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+                f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END"
+            )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_annotations_metadata_gin')
+        op.execute('DROP INDEX IF EXISTS ix_annotations_label_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_images_original_filename_trgm')
+
+    elif bind.dialect.name == 'sqlite':
+        for fts_table, _, _ in SQLITE_FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts_table}')
@@ -0,0 +1,41 @@
+"""Add task queue columns to vision tasks
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-02-22 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('vision_tasks', sa.Column('attempts', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('vision_tasks', sa.Column('max_attempts', sa.Integer(), nullable=True, server_default='3'))
+    op.add_column('vision_tasks', sa.Column('available_at', sa.DateTime(), nullable=True))
+    op.add_column('vision_tasks', sa.Column('locked_by', sa.String(), nullable=True))
+    op.add_column('vision_tasks', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('vision_tasks', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+    # Tasks left pending by the old in-process dispatcher become claimable
+    op.execute("UPDATE vision_tasks SET available_at = created_at WHERE status = 'pending'")
+
+    op.create_index(
+        'ix_vision_tasks_status_available_at', 'vision_tasks', ['status', 'available_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_vision_tasks_status_available_at', table_name='vision_tasks')
+    op.drop_column('vision_tasks', 'heartbeat_at')
+    op.drop_column('vision_tasks', 'lease_expires_at')
+    op.drop_column('vision_tasks', 'locked_by')
+    op.drop_column('vision_tasks', 'available_at')
+    op.drop_column('vision_tasks', 'max_attempts')
+    op.drop_column('vision_tasks', 'attempts')
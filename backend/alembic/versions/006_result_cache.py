@@ -0,0 +1,31 @@
+"""Add image content hashes and vision result cache keys
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-02-26 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing images are hashed lazily, the first time a cached task is requested
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_images_content_hash'), 'images', ['content_hash'], unique=False)
+
+    op.add_column('vision_tasks', sa.Column('cache_key', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_vision_tasks_cache_key'), 'vision_tasks', ['cache_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_vision_tasks_cache_key'), table_name='vision_tasks')
+    op.drop_column('vision_tasks', 'cache_key')
+    op.drop_index(op.f('ix_images_content_hash'), table_name='images')
+    op.drop_column('images', 'content_hash')
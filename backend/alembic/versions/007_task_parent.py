@@ -0,0 +1,32 @@
+"""Add parent tasks for per-image results of batch tasks
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-03-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Batch mode lets SQLite, which can't ALTER constraints, copy the table instead
+    with op.batch_alter_table('vision_tasks') as batch:
+        batch.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            'fk_vision_tasks_parent_id', 'vision_tasks', ['parent_id'], ['id'], ondelete='CASCADE'
+        )
+    op.create_index(op.f('ix_vision_tasks_parent_id'), 'vision_tasks', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_vision_tasks_parent_id'), table_name='vision_tasks')
+    with op.batch_alter_table('vision_tasks') as batch:
+        batch.drop_constraint('fk_vision_tasks_parent_id', type_='foreignkey')
+        batch.drop_column('parent_id')
@@ -1,28 +1,37 @@
 """Annotation endpoints."""
+from collections import defaultdict
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.models.annotation import Annotation
 from app.models.image import Image
-from app.schemas.annotation import Annotation as AnnotationSchema, AnnotationCreate, AnnotationUpdate
+from app.models.project import Project
+from app.schemas.annotation import Annotation as AnnotationSchema, AnnotationCreate, AnnotationUpdate, AnnotationCompact
+from app.services.geometry_service import GeometryService
+from app.services.label_service import LabelService
+from app.utils.coordinate_codec import pack_coordinates, encode_base64, encode_flat
 
 
 router = APIRouter(prefix="/annotations", tags=["annotations"])
 
+# Update fields that change an annotation's shape
+GEOMETRY_FIELDS = {"x", "y", "width", "height", "coordinates"}
 
-@router.get("/", response_model=List[AnnotationSchema])
-async def list_annotations(
-    skip: int = 0,
-    limit: int = 100,
+
+def _filtered_annotations(
+    db: Session,
+    current_user: dict,
     image_id: int = None,
     label: str = None,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    label_id: int = None,
 ):
-    """List annotations."""
+    """Build the annotation query shared by the list endpoints."""
     query = db.query(Annotation)
+    image = None
     
     if image_id:
         # Verify user owns the image
@@ -39,13 +48,91 @@ async def list_annotations(
         
         query = query.filter(Annotation.image_id == image_id)
     
+    if label_id:
+        query = query.filter(Annotation.label_id == label_id)
+    
     if label:
-        query = query.filter(Annotation.label == label)
+        # Match through the label dictionaries of the image's project (or the
+        # user's projects), aliases included; annotations on images without
+        # a project have no label id and keep the text match
+        if image is not None:
+            project_ids = [image.project_id] if image.project_id else []
+        else:
+            project_ids = [
+                project_id for (project_id,) in db.query(Project.id).filter(
+                    Project.owner_id == int(current_user["id"])
+                )
+            ]
+        matching_label_ids = LabelService.matching_label_ids(db, project_ids, label)
+        query = query.filter(or_(
+            Annotation.label_id.in_(matching_label_ids),
+            and_(Annotation.label_id.is_(None), Annotation.label == label),
+        ))
     
+    return query
+
+
+@router.get("/", response_model=List[AnnotationSchema])
+async def list_annotations(
+    skip: int = 0,
+    limit: int = 100,
+    image_id: int = None,
+    label: str = None,
+    label_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """List annotations."""
+    query = _filtered_annotations(db, current_user, image_id, label, label_id)
     annotations = query.offset(skip).limit(limit).all()
     return annotations
 
 
+@router.get("/compact", response_model=List[AnnotationCompact])
+async def list_annotations_compact(
+    skip: int = 0,
+    limit: int = 100,
+    image_id: int = None,
+    label: str = None,
+    label_id: int = None,
+    encoding: str = "base64",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """List annotations with polygon coordinates as base64 packed float32 or a flat array."""
+    if encoding not in ("base64", "flat"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Encoding must be 'base64' or 'flat'"
+        )
+    
+    encode = encode_base64 if encoding == "base64" else encode_flat
+    query = _filtered_annotations(db, current_user, image_id, label, label_id)
+    
+    results = []
+    for ann in query.offset(skip).limit(limit).all():
+        packed = ann.coordinates_packed
+        if packed is None and ann.coordinates_json:
+            packed = pack_coordinates(ann.coordinates_json)
+        
+        results.append(AnnotationCompact(
+            id=ann.id,
+            image_id=ann.image_id,
+            label=ann.label,
+            label_id=ann.label_id,
+            annotation_type=ann.annotation_type,
+            x=ann.x,
+            y=ann.y,
+            width=ann.width,
+            height=ann.height,
+            coordinates_encoding=encoding if packed is not None else None,
+            coordinates=encode(packed),
+            confidence=ann.confidence,
+        ))
+    
+    return results
+
+
 @router.post("/", response_model=AnnotationSchema, status_code=status.HTTP_201_CREATED)
 async def create_annotation(
     annotation_data: AnnotationCreate,
@@ -66,7 +153,19 @@ async def create_annotation(
         )
     
     annotation = Annotation(**annotation_data.dict())
+    
+    # Clip geometry to the image bounds
+    _, invalid, _ = GeometryService.sanitize_annotations(
+        [annotation], {image.id: (image.width, image.height)}, settings.GEOMETRY_SIMPLIFY_TOLERANCE
+    )
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Annotation geometry is empty or outside the image"
+        )
+    
     db.add(annotation)
+    LabelService.apply_labels(db, image.project_id, [annotation])
     db.commit()
     db.refresh(annotation)
     
@@ -85,7 +184,8 @@ async def create_batch_annotations(
     current_user: dict = Depends(get_current_user)
 ):
     """Create multiple annotations at once."""
-    created_annotations = []
+    pending_annotations = []
+    images = {}
     
     for annotation_data in annotations_data:
         # Verify user owns the image
@@ -97,14 +197,30 @@ async def create_batch_annotations(
         if not image:
             continue  # Skip invalid images
         
-        annotation = Annotation(**annotation_data.dict())
+        pending_annotations.append(Annotation(**annotation_data.dict()))
+        images[image.id] = image
+    
+    # Clip the whole batch at once and skip shapes left empty or outside their image
+    created_annotations, _, _ = GeometryService.sanitize_annotations(
+        pending_annotations,
+        {image.id: (image.width, image.height) for image in images.values()},
+        settings.GEOMETRY_SIMPLIFY_TOLERANCE,
+    )
+    
+    annotations_by_project = defaultdict(list)
+    for annotation in created_annotations:
+        image = images[annotation.image_id]
         db.add(annotation)
-        created_annotations.append(annotation)
+        annotations_by_project[image.project_id].append(annotation)
         
         # Update image status
         if image.status == "pending":
             image.status = "annotating"
     
+    # Resolve label ids once per project for the whole batch
+    for project_id, project_annotations in annotations_by_project.items():
+        LabelService.apply_labels(db, project_id, project_annotations)
+    
     db.commit()
     
     # Refresh all annotations
@@ -173,9 +289,26 @@ async def update_annotation(
         )
     
     # Update fields
-    for field, value in annotation_data.dict(exclude_unset=True).items():
+    update_data = annotation_data.dict(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(annotation, field, value)
     
+    # Edited geometry is clipped to the image bounds like new annotations
+    if GEOMETRY_FIELDS & update_data.keys():
+        _, invalid, _ = GeometryService.sanitize_annotations(
+            [annotation], {image.id: (image.width, image.height)}, settings.GEOMETRY_SIMPLIFY_TOLERANCE
+        )
+        if invalid:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Annotation geometry is empty or outside the image"
+            )
+    
+    if "label" in update_data:
+        annotation.label_id = None
+        LabelService.apply_labels(db, image.project_id, [annotation])
+    
     db.commit()
     db.refresh(annotation)
     return annotation
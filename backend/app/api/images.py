@@ -2,11 +2,16 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session, selectinload
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.models.image import Image
-from app.schemas.image import Image as ImageSchema, ImageUpdate
+from app.models.label import Label
+from app.schemas.image import Image as ImageSchema, ImageUpdate, ImageWorkspace
+from app.schemas.annotation import DuplicateGroup
+from app.services.label_service import LabelService
+from app.services.overlap_service import OverlapService
 from app.utils.file_utils import save_upload_file, delete_file
 import os
 
@@ -57,6 +62,7 @@ async def upload_image(
             height=metadata.get("height"),
             file_size=metadata.get("file_size"),
             mime_type=metadata.get("mime_type"),
+            content_hash=metadata.get("content_hash"),
             project_id=project_id,
             uploader_id=int(current_user["id"]),
         )
@@ -66,7 +72,7 @@ async def upload_image(
         db.refresh(image)
         
         return image
-        
+    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -98,13 +104,14 @@ async def upload_batch(
                 height=metadata.get("height"),
                 file_size=metadata.get("file_size"),
                 mime_type=metadata.get("mime_type"),
+                content_hash=metadata.get("content_hash"),
                 project_id=project_id,
                 uploader_id=int(current_user["id"]),
             )
             
             db.add(image)
             uploaded_images.append(image)
-            
+        
         except Exception as e:
             # Continue with other files even if one fails
             continue
@@ -139,6 +146,49 @@ async def get_image(
     return image
 
 
+@router.get("/{image_id}/workspace", response_model=ImageWorkspace)
+async def get_image_workspace(
+    image_id: int,
+    prefetch: int = 2,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get image metadata, annotations, project labels and neighbouring image ids at once."""
+    user_id = int(current_user["id"])
+    image = db.query(Image).options(selectinload(Image.annotations)).filter(
+        Image.id == image_id,
+        Image.uploader_id == user_id
+    ).first()
+    
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    labels = []
+    if image.project_id:
+        labels = db.query(Label).filter(Label.project_id == image.project_id).order_by(Label.name).all()
+    
+    # Closest images on either side, in upload order, within the same project
+    siblings = select(Image.id).where(
+        Image.uploader_id == user_id,
+        Image.project_id == image.project_id if image.project_id else Image.project_id.is_(None),
+    )
+    before = siblings.where(Image.id < image_id).order_by(Image.id.desc()).limit(prefetch).subquery()
+    after = siblings.where(Image.id > image_id).order_by(Image.id).limit(prefetch).subquery()
+    neighbour_ids = db.execute(union_all(select(before.c.id), select(after.c.id))).scalars().all()
+    
+    return {
+        "image": image,
+        "annotations": sorted(image.annotations, key=lambda ann: ann.id),
+        "labels": labels,
+        "previous_ids": sorted((i for i in neighbour_ids if i < image_id), reverse=True),
+        "next_ids": sorted(i for i in neighbour_ids if i > image_id),
+        "file_url": f"/uploads/{image.filename}",
+    }
+
+
 @router.get("/{image_id}/file")
 async def get_image_file(
     image_id: int,
@@ -170,6 +220,55 @@ async def get_image_file(
     )
 
 
+@router.get("/{image_id}/annotations/duplicates", response_model=List[DuplicateGroup])
+async def find_duplicate_annotations(
+    image_id: int,
+    iou_threshold: float = 0.7,
+    same_label: bool = True,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Find groups of stacked duplicate boxes on an image."""
+    image = db.query(Image).filter(
+        Image.id == image_id,
+        Image.uploader_id == int(current_user["id"])
+    ).first()
+    
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    return OverlapService.find_image_duplicates(image_id, db, iou_threshold, same_label)
+
+
+@router.post("/{image_id}/annotations/duplicates/merge", response_model=List[DuplicateGroup])
+async def merge_duplicate_annotations(
+    image_id: int,
+    iou_threshold: float = 0.7,
+    same_label: bool = True,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete duplicate boxes on an image, keeping one box per group."""
+    image = db.query(Image).filter(
+        Image.id == image_id,
+        Image.uploader_id == int(current_user["id"])
+    ).first()
+    
+    if not image:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    groups = OverlapService.find_image_duplicates(image_id, db, iou_threshold, same_label)
+    OverlapService.delete_duplicates(groups, db)
+    db.commit()
+    return groups
+
+
 @router.put("/{image_id}", response_model=ImageSchema)
 async def update_image(
     image_id: int,
@@ -190,9 +289,17 @@ async def update_image(
         )
     
     # Update fields
-    for field, value in image_data.dict(exclude_unset=True).items():
+    update_data = image_data.dict(exclude_unset=True)
+    moved = "project_id" in update_data and update_data["project_id"] != image.project_id
+    for field, value in update_data.items():
         setattr(image, field, value)
     
+    if moved:
+        # Label ids are per project, so the annotations resolve against the new dictionary
+        for annotation in image.annotations:
+            annotation.label_id = None
+        LabelService.apply_labels(db, image.project_id, image.annotations)
+    
     db.commit()
     db.refresh(image)
     return image
@@ -0,0 +1,156 @@
+"""Label endpoints."""
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.security import get_current_user
+from app.db.database import get_db
+from app.models.annotation import Annotation
+from app.models.label import Label
+from app.models.project import Project
+from app.schemas.label import Label as LabelSchema, LabelCreate, LabelUpdate
+
+
+router = APIRouter(prefix="/labels", tags=["labels"])
+
+
+def _get_owned_label(label_id: int, db: Session, current_user: dict) -> Label:
+    """Get a label whose project is owned by the current user."""
+    label = db.query(Label).join(Project).filter(
+        Label.id == label_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not label:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Label not found"
+        )
+    
+    return label
+
+
+@router.get("/", response_model=List[LabelSchema])
+async def list_labels(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """List the label dictionary of a project."""
+    labels = db.query(Label).join(Project).filter(
+        Label.project_id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).order_by(Label.name).all()
+    return labels
+
+
+@router.post("/", response_model=LabelSchema, status_code=status.HTTP_201_CREATED)
+async def create_label(
+    label_data: LabelCreate,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Create a new label in a project."""
+    project = db.query(Project).filter(
+        Project.id == label_data.project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    existing = db.query(Label).filter(
+        Label.project_id == label_data.project_id,
+        Label.name == label_data.name
+    ).first()
+    
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Label already exists"
+        )
+    
+    label = Label(**label_data.dict())
+    db.add(label)
+    db.commit()
+    db.refresh(label)
+    return label
+
+
+@router.put("/{label_id}", response_model=LabelSchema)
+async def update_label(
+    label_id: int,
+    label_data: LabelUpdate,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Update a label; renames are propagated to its annotations."""
+    label = _get_owned_label(label_id, db, current_user)
+    
+    update_data = label_data.dict(exclude_unset=True)
+    if "name" in update_data and update_data["name"] != label.name:
+        existing = db.query(Label).filter(
+            Label.project_id == label.project_id,
+            Label.name == update_data["name"]
+        ).first()
+        
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Label already exists"
+            )
+    
+    for field, value in update_data.items():
+        setattr(label, field, value)
+    
+    if "name" in update_data:
+        db.query(Annotation).filter(Annotation.label_id == label.id).update(
+            {Annotation.label: label.name}, synchronize_session=False
+        )
+    
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request took the name first
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Label already exists"
+        )
+    
+    db.refresh(label)
+    return label
+
+
+@router.delete("/{label_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_label(
+    label_id: int,
+    reassign_to: int = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete a label and its annotations, or move them to another label of the project first."""
+    label = _get_owned_label(label_id, db, current_user)
+    annotations = db.query(Annotation).filter(Annotation.label_id == label.id)
+    
+    if reassign_to is not None:
+        target = _get_owned_label(reassign_to, db, current_user)
+        if target.id == label.id or target.project_id != label.project_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Annotations can only move to another label of the same project"
+            )
+        annotations.update(
+            {Annotation.label_id: target.id, Annotation.label: target.name}, synchronize_session=False
+        )
+    else:
+        # Annotations left with only the text label would bring the label back
+        annotations.delete(synchronize_session=False)
+    
+    db.delete(label)
+    db.commit()
+    
+    return None
@@ -1,16 +1,25 @@
 """ML Model endpoints."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.core.security import get_current_user
 from app.db.database import get_db
+from app.models.image import Image
 from app.models.model import MLModel
-from app.schemas.model import MLModel as MLModelSchema, MLModelCreate
+from app.models.project import Project
+from app.schemas.model import MLModel as MLModelSchema, MLModelCreate, BatchPredictRequest
+from app.services.model_registry import ModelRegistry, ModelWeightsMissing
+from app.services.task_queue import TaskQueue
 from app.services.training_service import TrainingService
 
 
 router = APIRouter(prefix="/models", tags=["models"])
 
+# Model states while a training task is queued or running
+TRAINING_STATUSES = ("queued", "training", "cancelling")
+
 
 @router.get("/", response_model=List[MLModelSchema])
 async def list_models(
@@ -37,7 +46,7 @@ async def create_model(
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new ML model."""
-    model = MLModel(**model_data.dict())
+    model = MLModel(**model_data.dict(), status="created")
     db.add(model)
     db.commit()
     db.refresh(model)
@@ -48,14 +57,14 @@ async def create_model(
 @router.post("/{model_id}/train", response_model=MLModelSchema)
 async def train_model(
     model_id: int,
-    background_tasks: BackgroundTasks,
     epochs: int = 10,
     batch_size: int = 32,
     learning_rate: float = 0.001,
+    project_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Train an ML model."""
+    """Queue training of an ML model on a project's annotations (the model's configured project by default)."""
     model = db.query(MLModel).filter(MLModel.id == model_id).first()
     
     if not model:
@@ -64,17 +73,76 @@ async def train_model(
             detail="Model not found"
         )
     
-    # Start training in background
-    background_tasks.add_task(
-        TrainingService.train_model,
-        model_id,
+    if model.status in TRAINING_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model is already training"
+        )
+    
+    if project_id is None:
+        project_id = (model.config or {}).get("project_id")
+    
+    if project_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A project_id is required, as a query parameter or in the model config"
+        )
+    
+    # Verify project exists and user owns it
+    project = db.query(Project).filter(
+        Project.id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    model.status = "queued"
+    db.commit()
+    
+    # Training runs in a queue worker process, never on the API's event loop
+    TaskQueue.enqueue(
         db,
-        epochs,
-        batch_size,
-        learning_rate
+        name=f"Training - {model.name}",
+        task_type="model_training",
+        config={
+            "model_id": model_id,
+            "epochs": epochs,
+            "batch_size": batch_size,
+            "learning_rate": learning_rate,
+            "project_id": project_id,
+        },
     )
+    db.refresh(model)
+    
+    return model
+
+
+@router.post("/{model_id}/cancel", response_model=MLModelSchema)
+async def cancel_training(
+    model_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Cancel a queued or running training; the worker stops within a few seconds."""
+    model = db.query(MLModel).filter(MLModel.id == model_id).first()
+    
+    if not model:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Model not found"
+        )
+    
+    if model.status not in TRAINING_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model is not training"
+        )
     
-    model.status = "training"
+    model.status = "cancelling"
     db.commit()
     db.refresh(model)
     
@@ -89,8 +157,6 @@ async def predict(
     current_user: dict = Depends(get_current_user)
 ):
     """Run prediction with a trained model."""
-    from app.models.image import Image
-    
     model = db.query(MLModel).filter(MLModel.id == model_id).first()
     
     if not model:
@@ -111,8 +177,13 @@ async def predict(
         )
     
     try:
-        result = await TrainingService.predict(model_id, image.filepath, db)
+        result = await TrainingService.predict_batched(model_id, image.filepath, db)
         return result
+    except ModelWeightsMissing as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -120,6 +191,91 @@ async def predict(
         )
 
 
+@router.post("/{model_id}/predict/batch")
+async def predict_batch(
+    model_id: int,
+    request: BatchPredictRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Run prediction over many images, or a whole project, streamed as NDJSON."""
+    model = db.query(MLModel).filter(MLModel.id == model_id).first()
+    
+    if not model:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Model not found"
+        )
+    
+    if model.status != "ready":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model not ready for inference"
+        )
+    
+    if (request.image_ids is None) == (request.project_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either image_ids or project_id"
+        )
+    
+    if request.image_ids is not None and not request.image_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="image_ids must not be empty"
+        )
+    
+    query = db.query(Image.id, Image.filepath, Image.project_id)
+    
+    if request.project_id is not None:
+        # Verify project exists and user owns it
+        project = db.query(Project).filter(
+            Project.id == request.project_id,
+            Project.owner_id == int(current_user["id"])
+        ).first()
+        
+        if not project:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Project not found"
+            )
+        
+        images = query.filter(Image.project_id == request.project_id).order_by(Image.id).all()
+    else:
+        # Verify images exist and user owns them
+        image_ids = sorted(set(request.image_ids))
+        images = query.filter(
+            Image.id.in_(image_ids),
+            Image.uploader_id == int(current_user["id"])
+        ).order_by(Image.id).all()
+        
+        if len(images) != len(image_ids):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
+    
+    # Loaded before streaming starts, so a missing model is an error status rather than a broken stream
+    try:
+        await run_in_threadpool(ModelRegistry.get, model)
+    except ModelWeightsMissing as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    # One JSON line per image as its batch finishes, then a summary line
+    return StreamingResponse(
+        TrainingService.predict_stream(
+            model_id,
+            [tuple(row) for row in images],
+            write_annotations=request.write_annotations,
+            batch_size=request.batch_size,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/{model_id}", response_model=MLModelSchema)
 async def get_model(
     model_id: int,
@@ -155,5 +311,6 @@ async def delete_model(
     
     db.delete(model)
     db.commit()
+    ModelRegistry.invalidate(model_id)
     
     return None
@@ -1,11 +1,15 @@
 """Project endpoints."""
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.models.project import Project
 from app.schemas.project import Project as ProjectSchema, ProjectCreate, ProjectUpdate
+from app.services.agreement_service import AgreementService
+from app.services.annotation_service import AnnotationService
+from app.services.result_cache import ResultCache
+from app.services.task_queue import TaskQueue
 
 
 router = APIRouter(prefix="/projects", tags=["projects"])
@@ -63,6 +67,52 @@ async def get_project(
     return project
 
 
+@router.get("/{project_id}/agreement", response_model=dict)
+async def get_project_agreement(
+    project_id: int,
+    response: Response,
+    iou_threshold: float = 0.5,
+    annotator_key: str = "annotator_id",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Score inter-annotator agreement on double-annotated images of a project.
+    
+    Returns the cached scores for the project's current annotations, or
+    202 with the queued (or already running) agreement task to poll.
+    """
+    project = db.query(Project).filter(
+        Project.id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    version = AnnotationService.project_version(db, project_id)
+    cache_key = AgreementService.cache_key(project_id, version, iou_threshold, annotator_key)
+    
+    task = ResultCache.lookup(db, cache_key)
+    if task is not None and task.status == "completed":
+        return task.results
+    
+    # Scoring is CPU-bound; a worker runs it on the vision pool
+    if task is None:
+        task = TaskQueue.enqueue(
+            db,
+            name=f"Agreement - {project.name}",
+            task_type="agreement",
+            config={"project_id": project_id, "iou_threshold": iou_threshold, "annotator_key": annotator_key},
+            cache_key=cache_key,
+        )
+    
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"status": task.status, "task_id": task.id}
+
+
 @router.put("/{project_id}", response_model=ProjectSchema)
 async def update_project(
     project_id: int,
@@ -0,0 +1,74 @@
+"""Search endpoints."""
+import json
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.security import get_current_user
+from app.db.database import get_db
+from app.schemas.annotation import Annotation as AnnotationSchema
+from app.schemas.image import Image as ImageSchema
+from app.services.search_service import SearchService
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/images", response_model=List[ImageSchema])
+async def search_images(
+    q: str,
+    project_id: int = None,
+    fuzzy: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search images by original filename (substring, or fuzzy similarity)."""
+    if not q:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query must not be empty"
+        )
+    
+    return SearchService.search_images(
+        db, int(current_user["id"]), q, project_id, fuzzy, skip, limit
+    )
+
+
+@router.get("/annotations", response_model=List[AnnotationSchema])
+async def search_annotations(
+    label: str = None,
+    metadata_key: str = None,
+    metadata_value: str = None,
+    project_id: int = None,
+    fuzzy: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search annotations by label text and metadata key or key/value."""
+    if not label and not metadata_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a label or metadata_key to search"
+        )
+    
+    if metadata_value is not None and not metadata_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="metadata_value requires metadata_key"
+        )
+    
+    # Accept JSON literals (numbers, booleans) as well as plain strings
+    value = metadata_value
+    if metadata_value is not None:
+        try:
+            value = json.loads(metadata_value)
+        except ValueError:
+            pass
+    
+    return SearchService.search_annotations(
+        db, int(current_user["id"]), label, metadata_key, value,
+        project_id, fuzzy, skip, limit
+    )
@@ -1,33 +1,66 @@
 """Vision task endpoints."""
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.models.task import VisionTask
 from app.models.image import Image
-from app.schemas.task import VisionTask as VisionTaskSchema, VisionTaskCreate
-from app.services.vision_service import VisionService
+from app.models.project import Project
+from app.schemas.task import VisionTask as VisionTaskSchema, VisionTaskCreate, DetectionOptions, BatchClassificationRequest
+from app.services.result_cache import ResultCache
+from app.services.task_queue import TASK_TYPES, TaskQueue
 
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
 
+async def _enqueue_cached(
+    db: Session,
+    image: Image,
+    name: str,
+    task_type: str,
+    config: dict,
+    use_cache: bool,
+) -> VisionTask:
+    """Reuse a task for the same image content and parameters, or queue one.
+    
+    The requester's own task for this image is returned as is; another
+    image's completed results are copied into a new task of the requester.
+    """
+    # Hashing a not-yet-hashed image reads the whole file
+    cache_key = await run_in_threadpool(ResultCache.cache_key, image, task_type, config, db)
+    
+    if use_cache:
+        cached = ResultCache.lookup(db, cache_key)
+        if cached is not None and (cached.config or {}).get("image_id") == image.id:
+            return cached
+        if cached is not None and cached.status == "completed":
+            return ResultCache.copy_result(db, cached, name, config)
+    
+    return TaskQueue.enqueue(db, name=name, task_type=task_type, config=config, cache_key=cache_key)
+
+
 @router.get("/", response_model=List[VisionTaskSchema])
 async def list_tasks(
     skip: int = 0,
     limit: int = 100,
     task_type: str = None,
     status_filter: str = None,
+    parent_id: int = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """List vision tasks."""
+    """List vision tasks; with parent_id, the per-image results of a batch task."""
     query = db.query(VisionTask)
     
     if task_type:
         query = query.filter(VisionTask.task_type == task_type)
     
+    if parent_id is not None:
+        query = query.filter(VisionTask.parent_id == parent_id).order_by(VisionTask.id)
+    
     if status_filter:
         query = query.filter(VisionTask.status == status_filter)
     
@@ -38,23 +71,24 @@ async def list_tasks(
 @router.post("/", response_model=VisionTaskSchema, status_code=status.HTTP_201_CREATED)
 async def create_task(
     task_data: VisionTaskCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new vision task."""
-    task = VisionTask(**task_data.dict())
-    db.add(task)
-    db.commit()
-    db.refresh(task)
+    if task_data.task_type not in TASK_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown task type '{task_data.task_type}'"
+        )
     
-    return task
+    return TaskQueue.enqueue(db, name=task_data.name, task_type=task_data.task_type, config=task_data.config)
 
 
 @router.post("/detect/{image_id}", response_model=VisionTaskSchema)
 async def detect_objects(
     image_id: int,
-    background_tasks: BackgroundTasks,
+    options: DetectionOptions = Depends(),
+    use_cache: bool = True,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -71,27 +105,73 @@ async def detect_objects(
             detail="Image not found"
         )
     
-    # Create task
-    task = VisionTask(
+    # Reuse an identical detection, or queue one for a worker
+    return await _enqueue_cached(
+        db,
+        image,
         name=f"Object Detection - {image.filename}",
         task_type="detection",
-        status="pending",
-        config={"image_id": image_id}
+        config={"image_id": image_id, **options.dict(exclude_none=True)},
+        use_cache=use_cache
     )
-    db.add(task)
-    db.commit()
-    db.refresh(task)
+
+
+@router.post("/classify/batch", response_model=VisionTaskSchema)
+async def classify_batch(
+    request: BatchClassificationRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Classify many images, or a whole project, as one task."""
+    if (request.image_ids is None) == (request.project_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either image_ids or project_id"
+        )
     
-    # Run detection in background
-    background_tasks.add_task(VisionService.detect_objects, image.filepath, task.id, db)
+    if request.project_id is not None:
+        # Verify project exists and user owns it
+        project = db.query(Project).filter(
+            Project.id == request.project_id,
+            Project.owner_id == int(current_user["id"])
+        ).first()
+        
+        if not project:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Project not found"
+            )
+        
+        name = f"Classification - {project.name}"
+        config = {"project_id": request.project_id}
+    else:
+        # Verify images exist and user owns them
+        image_ids = sorted(set(request.image_ids))
+        owned = db.query(Image.id).filter(
+            Image.id.in_(image_ids),
+            Image.uploader_id == int(current_user["id"])
+        ).count()
+        
+        if owned != len(image_ids):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
+        
+        name = f"Classification - {len(image_ids)} images"
+        config = {"image_ids": image_ids}
     
-    return task
+    if request.max_side is not None:
+        config["max_side"] = request.max_side
+    
+    # Queue one task; the worker classifies the images across the vision pool
+    return TaskQueue.enqueue(db, name=name, task_type="batch_classification", config=config)
 
 
 @router.post("/classify/{image_id}", response_model=VisionTaskSchema)
 async def classify_image(
     image_id: int,
-    background_tasks: BackgroundTasks,
+    use_cache: bool = True,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -108,27 +188,21 @@ async def classify_image(
             detail="Image not found"
         )
     
-    # Create task
-    task = VisionTask(
+    # Reuse an identical classification, or queue one for a worker
+    return await _enqueue_cached(
+        db,
+        image,
         name=f"Classification - {image.filename}",
         task_type="classification",
-        status="pending",
-        config={"image_id": image_id}
+        config={"image_id": image_id},
+        use_cache=use_cache
     )
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-    
-    # Run classification in background
-    background_tasks.add_task(VisionService.classify_image, image.filepath, task.id, db)
-    
-    return task
 
 
 @router.post("/auto-annotate/{image_id}", response_model=dict)
 async def auto_annotate(
     image_id: int,
-    background_tasks: BackgroundTasks,
+    options: DetectionOptions = Depends(),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -145,10 +219,115 @@ async def auto_annotate(
             detail="Image not found"
         )
     
-    # Run auto-annotation in background
-    background_tasks.add_task(VisionService.auto_annotate, image_id, db)
+    # Queue auto-annotation for a worker
+    task = TaskQueue.enqueue(
+        db,
+        name=f"Auto-Annotation - {image.filename}",
+        task_type="auto_annotation",
+        config={"image_id": image_id, **options.dict(exclude_none=True)}
+    )
     
-    return {"message": "Auto-annotation started", "image_id": image_id}
+    return {"message": "Auto-annotation started", "image_id": image_id, "task_id": task.id}
+
+
+@router.post("/auto-annotate/project/{project_id}", response_model=VisionTaskSchema)
+async def auto_annotate_project(
+    project_id: int,
+    chunk_size: int = None,
+    options: DetectionOptions = Depends(),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Auto-annotate every pending image of a project as one tracked task."""
+    # Verify project exists and user owns it
+    project = db.query(Project).filter(
+        Project.id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    # Queue one parent task; the worker fans out over the project's images
+    return TaskQueue.enqueue(
+        db,
+        name=f"Auto-Annotation - {project.name}",
+        task_type="project_auto_annotation",
+        config={"project_id": project_id, "chunk_size": chunk_size, **options.dict(exclude_none=True)}
+    )
+
+
+@router.post("/repair-geometry/{project_id}", response_model=VisionTaskSchema)
+async def repair_geometry(
+    project_id: int,
+    simplify_tolerance: float = 0.0,
+    delete_invalid: bool = False,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Clip and optionally simplify all annotations of a project."""
+    # Verify project exists and user owns it
+    project = db.query(Project).filter(
+        Project.id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    # Queue repair for a worker
+    return TaskQueue.enqueue(
+        db,
+        name=f"Geometry Repair - {project.name}",
+        task_type="geometry_repair",
+        config={
+            "project_id": project_id,
+            "simplify_tolerance": simplify_tolerance,
+            "delete_invalid": delete_invalid,
+        }
+    )
+
+
+@router.post("/deduplicate/{project_id}", response_model=VisionTaskSchema)
+async def deduplicate_annotations(
+    project_id: int,
+    iou_threshold: float = 0.7,
+    same_label: bool = True,
+    merge: bool = False,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Find (and optionally merge) duplicate boxes across a project."""
+    # Verify project exists and user owns it
+    project = db.query(Project).filter(
+        Project.id == project_id,
+        Project.owner_id == int(current_user["id"])
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    # Queue deduplication for a worker
+    return TaskQueue.enqueue(
+        db,
+        name=f"Deduplicate - {project.name}",
+        task_type="deduplication",
+        config={
+            "project_id": project_id,
+            "iou_threshold": iou_threshold,
+            "same_label": same_label,
+            "merge": merge,
+        }
+    )
 
 
 @router.get("/{task_id}", response_model=VisionTaskSchema)
@@ -28,6 +28,69 @@ class Settings(BaseSettings):
     UPLOAD_FOLDER: str = "./uploads"
     MAX_CONTENT_LENGTH: int = 16777216  # 16MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
+    CROP_CACHE_FOLDER: str = "./cache/crops"  # Preprocessed training crops
+    
+    # Annotations
+    PACK_POLYGON_COORDINATES: bool = False  # Store polygons as packed float32 instead of JSON
+    GEOMETRY_SIMPLIFY_TOLERANCE: float = 0.0  # Douglas-Peucker tolerance in pixels (0 disables)
+    
+    # Vision workers
+    VISION_WORKERS: int = 0  # Worker processes for OpenCV jobs (0 = CPU count)
+    VISION_JOB_TIMEOUT: int = 300  # Seconds per vision job (0 disables)
+    # Decoded-image cache of each process (0 disables). Every vision and loader worker
+    # holds its own, so a host can use up to (VISION_WORKERS + TRAIN_LOADER_WORKERS + 1) x this
+    IMAGE_CACHE_MB: int = 256
+    DETECTION_MAX_SIDE: int = 1600  # Longest side of the detection raster (0 = full resolution)
+    # Tile images longer than this, at full resolution (0 disables). Tiles are read from a
+    # memory-mapped raster; only uncompressed PPM/BMP/TIFF are mapped in place, compressed
+    # formats such as JPEG and PNG are still decoded whole once to build it
+    DETECTION_TILE_THRESHOLD: int = 4096
+    DETECTION_TILE_SIZE: int = 1024
+    DETECTION_TILE_OVERLAP: int = 128  # Pixels shared by neighbouring tiles
+    DETECTION_NMS: str = "hard"  # hard, soft or none
+    DETECTION_IOU_THRESHOLD: float = 0.5
+    DETECTION_MAX_DETECTIONS: int = 100  # Top-scoring detections kept per image (0 = all)
+    DETECTION_PRE_NMS_TOP_K: int = 1000  # Strongest candidates per class entering NMS (0 = all)
+    CLASSIFICATION_MAX_SIDE: int = 256  # Longest side of the classification raster (0 = full resolution)
+    
+    # Model registry
+    MODEL_CACHE_MB: int = 1024  # Resident inference models per process
+    MODEL_PRELOAD_COUNT: int = 2  # Most recently trained ready models loaded at startup
+    PREDICT_MAX_BATCH: int = 16  # Concurrent predictions per forward pass (1 disables batching)
+    PREDICT_MAX_WAIT_MS: float = 5.0  # Time a prediction waits for others to join its batch
+    PREDICT_BATCH_SIZE: int = 64  # Images per forward pass in batch prediction
+    TRAIN_LOADER_WORKERS: int = 0  # Crop decode workers during training (0 = CPU count)
+    TRAIN_PREFETCH_FACTOR: int = 4  # Batches each training loader worker keeps ready
+    CROP_CACHE_ENABLED: bool = True  # Train from memory-mapped preprocessed crops
+    CROP_CACHE_SHARD_SIZE: int = 1024  # Crops per shard file (~150 KB each)
+    CROP_CACHE_KEEP_VERSIONS: int = 3  # Most recently used crop caches kept per project
+    TRAIN_CHECKPOINT_EVERY: int = 1  # Epochs between resumable checkpoints (0 disables)
+    TRAIN_CANCEL_CHECK_SECONDS: float = 5.0  # How often training polls for cancellation
+    INFERENCE_BACKEND: str = "torch"  # torch, onnx or torchscript; a model's config "inference_backend" overrides it
+    TORCHSCRIPT_EXPORT: bool = True  # Export a frozen TorchScript artifact after training
+    MODEL_COMPILE: bool = False  # torch.compile float models when loading them (needs a C++ compiler)
+    MODEL_BENCHMARK: bool = True  # Time eager vs exported models per batch size after training
+    ONNX_EXPORT: bool = True  # Export an ONNX artifact after training
+    ONNX_INTRA_OP_THREADS: int = 0  # Threads within an ONNX Runtime operator (0 = runtime default)
+    ONNX_INTER_OP_THREADS: int = 0  # Threads across independent operators (0 = runtime default)
+    QUANTIZATION: str = "dynamic"  # Int8 artifact after training: none, dynamic or static
+    QUANTIZATION_CALIBRATION_IMAGES: int = 64  # Crops for static calibration and for the int8 accuracy check
+    QUANTIZATION_HOLDOUT_IMAGES: int = 0  # Crops kept out of training for an unbiased int8 accuracy check (0 = train on all)
+    QUANTIZATION_MAX_ACCURACY_DROP: float = 0.01  # Accuracy the int8 artifact may lose against the float model and still be served
+    PREDICT_QUANTIZED: bool = True  # Serve the int8 artifact when a model has one within the accuracy tolerance
+    
+    # Vision result cache
+    VISION_CACHE_TTL: int = 7 * 24 * 3600  # Seconds a completed result is reused (0 = forever)
+    VISION_CACHE_MAX_ENTRIES: int = 10000  # Cached results kept (0 disables the cache)
+    VISION_CACHE_EVICT_INTERVAL: float = 300.0  # Seconds between cache evictions by each worker process
+    
+    # Task queue
+    TASK_LEASE_SECONDS: int = 60  # Lease extended by worker heartbeats
+    TASK_MAX_ATTEMPTS: int = 3
+    TASK_RETRY_BASE_DELAY: int = 10  # Seconds, doubled per attempt
+    TASK_RETRY_MAX_DELAY: int = 600
+    TASK_POLL_INTERVAL: float = 1.0  # Seconds between claims when the queue is empty
+    AUTO_ANNOTATE_CHUNK_SIZE: int = 64  # Images per commit in project-wide auto-annotation
     
     # Vision API (optional)
     VISION_API_KEY: str = ""
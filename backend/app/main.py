@@ -3,8 +3,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
-from app.api import auth, projects, images, annotations, tasks, models, export
+from app.db.database import SessionLocal
+from app.services.model_registry import ModelRegistry
+from app.api import auth, projects, images, annotations, tasks, models, export, labels, search
 import os
+import threading
 
 
 # Create FastAPI app
@@ -38,6 +41,24 @@ app.include_router(annotations.router, prefix=settings.API_V1_STR)
 app.include_router(tasks.router, prefix=settings.API_V1_STR)
 app.include_router(models.router, prefix=settings.API_V1_STR)
 app.include_router(export.router, prefix=settings.API_V1_STR)
+app.include_router(labels.router, prefix=settings.API_V1_STR)
+app.include_router(search.router, prefix=settings.API_V1_STR)
+
+
+def preload_models():
+    """Load the most recently trained models so first predictions are warm."""
+    db = SessionLocal()
+    try:
+        ModelRegistry.preload(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_model_preload():
+    """Preload models in the background without delaying startup."""
+    if settings.MODEL_PRELOAD_COUNT > 0:
+        threading.Thread(target=preload_models, name="model-preload", daemon=True).start()
 
 
 @app.get("/")
@@ -53,7 +74,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return {"status": "healthy", "models": ModelRegistry.stats()}
 
 
 if __name__ == "__main__":
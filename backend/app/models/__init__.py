@@ -5,5 +5,6 @@ from app.models.annotation import Annotation
 from app.models.project import Project
 from app.models.task import VisionTask
 from app.models.model import MLModel
+from app.models.label import Label
 
-__all__ = ["User", "Image", "Annotation", "Project", "VisionTask", "MLModel"]
+__all__ = ["User", "Image", "Annotation", "Project", "VisionTask", "MLModel", "Label"]
@@ -1,8 +1,11 @@
 """Annotation model."""
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import numpy as np
+from app.core.config import settings
 from app.db.database import Base
+from app.utils.coordinate_codec import points_to_array, pack_array, unpack_array, unpack_coordinates
 
 
 class Annotation(Base):
@@ -13,6 +16,7 @@ class Annotation(Base):
     id = Column(Integer, primary_key=True, index=True)
     image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
     label = Column(String, nullable=False, index=True)
+    label_id = Column(Integer, ForeignKey("labels.id"), nullable=True, index=True)
     annotation_type = Column(String, nullable=False)  # bbox, polygon, point, etc.
     
     # Bounding box coordinates
@@ -21,15 +25,41 @@ class Annotation(Base):
     width = Column(Float)
     height = Column(Float)
     
-    # For complex shapes (polygons, etc.)
-    coordinates = Column(JSON)
+    # For complex shapes (polygons, etc.): either JSON points or packed float32 pairs
+    coordinates_json = Column("coordinates", JSON)
+    coordinates_packed = Column(LargeBinary)
     
     # Additional metadata
     confidence = Column(Float)
-    metadata = Column(JSON)
+    # "metadata" is reserved on declarative classes, so the column is mapped under another name
+    annotation_metadata = Column("metadata", JSON)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     image = relationship("Image", back_populates="annotations")
+    label_ref = relationship("Label", back_populates="annotations")
+    
+    @property
+    def coordinates(self):
+        """Polygon vertices as a list of {"x", "y"} points, whichever way they are stored."""
+        if self.coordinates_packed is not None:
+            return unpack_coordinates(self.coordinates_packed)
+        return self.coordinates_json
+    
+    @coordinates.setter
+    def coordinates(self, value):
+        if value is not None and settings.PACK_POLYGON_COORDINATES:
+            self.coordinates_packed = pack_array(points_to_array(value))
+            self.coordinates_json = None
+        else:
+            self.coordinates_json = value
+            self.coordinates_packed = None
+    
+    @property
+    def coordinate_array(self) -> np.ndarray:
+        """Polygon vertices as an (N, 2) float32 array."""
+        if self.coordinates_packed is not None:
+            return unpack_array(self.coordinates_packed)
+        return points_to_array(self.coordinates_json or [])
@@ -18,9 +18,10 @@ class Image(Base):
     height = Column(Integer)
     file_size = Column(Integer)
     mime_type = Column(String)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file, keys cached vision results
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    status = Column(String, default="pending")  # pending, annotating, completed
+    status = Column(String, default="pending")  # pending, annotating, completed, failed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -12,7 +12,7 @@ class MLModel(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     model_type = Column(String, nullable=False)  # yolo, faster_rcnn, etc.
-    status = Column(String, default="training")  # training, ready, failed
+    status = Column(String, default="training")  # created, queued, training, cancelling, cancelled, ready, failed
     
     # Training metrics
     accuracy = Column(Float)
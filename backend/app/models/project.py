@@ -20,3 +20,4 @@ class Project(Base):
     # Relationships
     owner = relationship("User", back_populates="projects")
     images = relationship("Image", back_populates="project", cascade="all, delete-orphan")
+    labels = relationship("Label", back_populates="project", cascade="all, delete-orphan")
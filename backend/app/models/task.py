@@ -1,5 +1,5 @@
 """Vision task model."""
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text, Index
 from datetime import datetime
 from app.db.database import Base
 
@@ -8,6 +8,9 @@ class VisionTask(Base):
     """Vision task model for AI processing tasks."""
     
     __tablename__ = "vision_tasks"
+    __table_args__ = (
+        Index("ix_vision_tasks_status_available_at", "status", "available_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -22,6 +25,20 @@ class VisionTask(Base):
     results = Column(JSON)
     error_message = Column(Text)
     
+    # Queue state
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    available_at = Column(DateTime, default=datetime.utcnow)  # Not claimable before this (retry backoff)
+    locked_by = Column(String)  # Worker id holding the lease
+    lease_expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    
+    # Result cache: tasks with equal keys on the same image content give equal results
+    cache_key = Column(String(64), index=True)
+    
+    # Batch task a per-image result belongs to
+    parent_id = Column(Integer, ForeignKey("vision_tasks.id", ondelete="CASCADE"), index=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = Column(DateTime)
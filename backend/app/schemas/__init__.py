@@ -1,16 +1,18 @@
 """Pydantic schemas for request/response validation."""
 from app.schemas.user import User, UserCreate, UserLogin, Token
-from app.schemas.image import Image, ImageCreate, ImageUpdate
-from app.schemas.annotation import Annotation, AnnotationCreate, AnnotationUpdate
+from app.schemas.image import Image, ImageCreate, ImageUpdate, ImageWorkspace
+from app.schemas.annotation import Annotation, AnnotationCreate, AnnotationUpdate, AnnotationCompact, DuplicateGroup
 from app.schemas.project import Project, ProjectCreate, ProjectUpdate
 from app.schemas.task import VisionTask, VisionTaskCreate
 from app.schemas.model import MLModel, MLModelCreate
+from app.schemas.label import Label, LabelCreate, LabelUpdate
 
 __all__ = [
     "User", "UserCreate", "UserLogin", "Token",
-    "Image", "ImageCreate", "ImageUpdate",
-    "Annotation", "AnnotationCreate", "AnnotationUpdate",
+    "Image", "ImageCreate", "ImageUpdate", "ImageWorkspace",
+    "Annotation", "AnnotationCreate", "AnnotationUpdate", "AnnotationCompact", "DuplicateGroup",
     "Project", "ProjectCreate", "ProjectUpdate",
     "VisionTask", "VisionTaskCreate",
     "MLModel", "MLModelCreate",
+    "Label", "LabelCreate", "LabelUpdate",
 ]
@@ -1,7 +1,7 @@
 """Annotation schemas."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Union
 
 
 class AnnotationBase(BaseModel):
@@ -19,7 +19,7 @@ class AnnotationCreate(AnnotationBase):
     height: Optional[float] = None
     coordinates: Optional[List[Dict[str, float]]] = None
     confidence: Optional[float] = None
-    metadata: Optional[Dict[str, Any]] = None
+    annotation_metadata: Optional[Dict[str, Any]] = Field(None, alias="metadata")
 
 
 class AnnotationUpdate(BaseModel):
@@ -31,22 +31,44 @@ class AnnotationUpdate(BaseModel):
     height: Optional[float] = None
     coordinates: Optional[List[Dict[str, float]]] = None
     confidence: Optional[float] = None
-    metadata: Optional[Dict[str, Any]] = None
+    annotation_metadata: Optional[Dict[str, Any]] = Field(None, alias="metadata")
 
 
 class Annotation(AnnotationBase):
     """Annotation response schema."""
     id: int
     image_id: int
+    label_id: Optional[int] = None
     x: Optional[float]
     y: Optional[float]
     width: Optional[float]
     height: Optional[float]
     coordinates: Optional[List[Dict[str, float]]]
     confidence: Optional[float]
-    metadata: Optional[Dict[str, Any]]
+    annotation_metadata: Optional[Dict[str, Any]] = Field(None, serialization_alias="metadata")
     created_at: datetime
     updated_at: datetime
     
     class Config:
         from_attributes = True
+
+
+class AnnotationCompact(AnnotationBase):
+    """Compact annotation response schema with encoded polygon coordinates."""
+    id: int
+    image_id: int
+    label_id: Optional[int] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    width: Optional[float] = None
+    height: Optional[float] = None
+    coordinates_encoding: Optional[str] = None  # base64 (packed little-endian float32) or flat
+    coordinates: Optional[Union[str, List[float]]] = None
+    confidence: Optional[float] = None
+
+
+class DuplicateGroup(BaseModel):
+    """Group of overlapping annotations with the one to keep."""
+    keep_id: int
+    duplicate_ids: List[int]
+    max_iou: float
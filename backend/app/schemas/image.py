@@ -1,7 +1,9 @@
 """Image schemas."""
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
+from app.schemas.annotation import Annotation
+from app.schemas.label import Label
 
 
 class ImageBase(BaseModel):
@@ -34,6 +36,7 @@ class Image(ImageBase):
     height: Optional[int]
     file_size: Optional[int]
     mime_type: Optional[str]
+    content_hash: Optional[str] = None
     project_id: Optional[int]
     uploader_id: int
     status: str
@@ -42,3 +45,13 @@ class Image(ImageBase):
     
     class Config:
         from_attributes = True
+
+
+class ImageWorkspace(BaseModel):
+    """Everything the annotator needs to open an image in one response."""
+    image: Image
+    annotations: List[Annotation]
+    labels: List[Label]
+    previous_ids: List[int]
+    next_ids: List[int]
+    file_url: str
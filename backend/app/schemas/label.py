@@ -0,0 +1,34 @@
+"""Label schemas."""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional, List
+
+
+class LabelBase(BaseModel):
+    """Base label schema."""
+    name: str
+    color: Optional[str] = None
+    aliases: Optional[List[str]] = None
+
+
+class LabelCreate(LabelBase):
+    """Label creation schema."""
+    project_id: int
+
+
+class LabelUpdate(BaseModel):
+    """Label update schema."""
+    name: Optional[str] = None
+    color: Optional[str] = None
+    aliases: Optional[List[str]] = None
+
+
+class Label(LabelBase):
+    """Label response schema."""
+    id: int
+    project_id: int
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -1,7 +1,7 @@
 """ML Model schemas."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 
 class MLModelBase(BaseModel):
@@ -31,3 +31,11 @@ class MLModel(MLModelBase):
     
     class Config:
         from_attributes = True
+
+
+class BatchPredictRequest(BaseModel):
+    """Images to score: explicit ids or every image of a project."""
+    image_ids: Optional[List[int]] = None
+    project_id: Optional[int] = None
+    write_annotations: bool = False
+    batch_size: Optional[int] = Field(None, ge=1, le=1024)
@@ -1,7 +1,7 @@
 """Vision task schemas."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Literal, Optional, Dict, Any, List
 
 
 class VisionTaskBase(BaseModel):
@@ -15,6 +15,23 @@ class VisionTaskCreate(VisionTaskBase):
     config: Optional[Dict[str, Any]] = None
 
 
+class DetectionOptions(BaseModel):
+    """Detection options stored in a task's config; unset values use the server settings."""
+    max_side: Optional[int] = Field(None, ge=0)
+    tiled: Optional[bool] = None
+    nms: Optional[Literal["hard", "soft", "none"]] = None
+    iou_threshold: Optional[float] = Field(None, ge=0, le=1)
+    max_detections: Optional[int] = Field(None, ge=0)
+    class_agnostic: Optional[bool] = None
+
+
+class BatchClassificationRequest(BaseModel):
+    """Images to classify: explicit ids or every image of a project."""
+    image_ids: Optional[List[int]] = None
+    project_id: Optional[int] = None
+    max_side: Optional[int] = Field(None, ge=0)
+
+
 class VisionTask(VisionTaskBase):
     """Vision task response schema."""
     id: int
@@ -23,6 +40,13 @@ class VisionTask(VisionTaskBase):
     config: Optional[Dict[str, Any]]
     results: Optional[Dict[str, Any]]
     error_message: Optional[str]
+    attempts: Optional[int] = None
+    max_attempts: Optional[int] = None
+    available_at: Optional[datetime] = None
+    locked_by: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    cache_key: Optional[str] = None
+    parent_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime]
@@ -0,0 +1,257 @@
+"""Agreement service for scoring inter-annotator agreement."""
+import hashlib
+import itertools
+import json
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sqlalchemy.orm import Session
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.services.annotation_service import AnnotationService
+from app.services.overlap_service import OverlapService, POOL_WINDOW
+from app.services.worker_pool import run_vision_jobs
+
+
+# Column access by name: "metadata" is reserved on declarative classes
+annotation_metadata = Annotation.__table__.c["metadata"]
+
+
+def _image_agreement_worker(payload: Tuple[int, Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Vision pool entry point: agreement counts for one image."""
+    _, image = payload
+    return AgreementService.image_agreement(**image)
+
+
+class AgreementService:
+    """Service for inter-annotator agreement on double-annotated images."""
+    
+    @staticmethod
+    def match_boxes(
+        boxes_a: np.ndarray,
+        labels_a: np.ndarray,
+        boxes_b: np.ndarray,
+        labels_b: np.ndarray,
+        iou_threshold: float,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Optimal one-to-one matching of same-label boxes by IoU (Hungarian assignment).
+        
+        Returns matched row indices into A, column indices into B and their IoUs.
+        """
+        iou = OverlapService.pairwise_iou(boxes_a, boxes_b)
+        iou[labels_a[:, None] != labels_b[None, :]] = 0.0
+        
+        rows, cols = linear_sum_assignment(iou, maximize=True)
+        matched = iou[rows, cols] >= iou_threshold
+        return rows[matched], cols[matched], iou[rows[matched], cols[matched]]
+    
+    @staticmethod
+    def image_agreement(
+        annotators: Dict[str, Dict[str, Any]],
+        iou_threshold: float,
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Agreement counts between every pair of annotators of one image.
+        
+        Each annotator maps to {"boxes": (N, 4) array, "labels": (N,) array,
+        "classification": label or None}. The first annotator of a pair is
+        treated as the reference for precision/recall.
+        """
+        results = {}
+        for ref, other in itertools.combinations(sorted(annotators), 2):
+            a, b = annotators[ref], annotators[other]
+            pair = {
+                "tp": Counter(),
+                "reference": Counter(a["labels"].tolist()),
+                "predicted": Counter(b["labels"].tolist()),
+                "iou_sum": 0.0,
+                "matches": 0,
+                "classification": None,
+            }
+            
+            if len(a["labels"]) and len(b["labels"]):
+                rows, _, ious = AgreementService.match_boxes(
+                    a["boxes"], a["labels"], b["boxes"], b["labels"], iou_threshold
+                )
+                pair["tp"] = Counter(a["labels"][rows].tolist())
+                pair["iou_sum"] = float(ious.sum())
+                pair["matches"] = len(rows)
+            
+            if a["classification"] is not None and b["classification"] is not None:
+                pair["classification"] = (a["classification"], b["classification"])
+            
+            results[(ref, other)] = pair
+        
+        return results
+    
+    @staticmethod
+    def cohen_kappa(reference: List[str], predicted: List[str]) -> Tuple[float, float]:
+        """Observed agreement and Cohen's kappa of two label sequences."""
+        if not reference:
+            return 0.0, 0.0
+        
+        classes, codes = np.unique(np.array(reference + predicted, dtype=str), return_inverse=True)
+        k = len(classes)
+        ref_codes, pred_codes = codes[:len(reference)], codes[len(reference):]
+        confusion = np.bincount(ref_codes * k + pred_codes, minlength=k * k).reshape(k, k)
+        
+        n = confusion.sum()
+        observed = np.trace(confusion) / n
+        expected = (confusion.sum(axis=1) @ confusion.sum(axis=0)) / (n * n)
+        kappa = 1.0 if expected == 1 else (observed - expected) / (1 - expected)
+        return float(observed), float(kappa)
+    
+    @staticmethod
+    def cache_key(project_id: int, version: str, iou_threshold: float, annotator_key: str) -> str:
+        """Result cache key of an agreement task; any annotation change gives a new key."""
+        payload = {
+            "task_type": "agreement",
+            "project_id": project_id,
+            "version": version,
+            "iou_threshold": iou_threshold,
+            "annotator_key": annotator_key,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    
+    @staticmethod
+    def _project_images(
+        project_id: int,
+        db: Session,
+        annotator_key: str,
+        iou_threshold: float,
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Stream per-image, per-annotator annotation arrays of images with 2+ annotators."""
+        rows = db.query(
+            Annotation.image_id, annotation_metadata, Annotation.annotation_type, Annotation.label,
+            Annotation.x, Annotation.y, Annotation.width, Annotation.height,
+        ).join(Image).filter(
+            Image.project_id == project_id,
+            annotation_metadata.isnot(None),
+        ).order_by(Annotation.image_id, Annotation.id).yield_per(10000)
+        
+        for image_id, image_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            by_annotator = defaultdict(lambda: {"boxes": [], "labels": [], "classification": None})
+            
+            for _, metadata, annotation_type, label, x, y, width, height in image_rows:
+                annotator = (metadata or {}).get(annotator_key)
+                if annotator is None:
+                    continue
+                
+                entry = by_annotator[str(annotator)]
+                if annotation_type == "classification":
+                    if entry["classification"] is None:
+                        entry["classification"] = label
+                elif x is not None and width is not None:
+                    entry["boxes"].append((x, y, width, height))
+                    entry["labels"].append(label)
+            
+            if len(by_annotator) < 2:
+                continue
+            
+            annotators = {
+                annotator: {
+                    "boxes": np.array(entry["boxes"], dtype=np.float64).reshape(-1, 4),
+                    "labels": np.array(entry["labels"], dtype=str),
+                    "classification": entry["classification"],
+                }
+                for annotator, entry in by_annotator.items()
+            }
+            yield image_id, {"annotators": annotators, "iou_threshold": iou_threshold}
+    
+    @staticmethod
+    def _summarize(pair: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn accumulated pair counts into precision/recall/F1 and kappa."""
+        per_label = {}
+        for label in sorted(set(pair["reference"]) | set(pair["predicted"])):
+            tp, ref, pred = pair["tp"][label], pair["reference"][label], pair["predicted"][label]
+            precision = tp / pred if pred else 0.0
+            recall = tp / ref if ref else 0.0
+            per_label[label] = {
+                "true_positives": tp,
+                "reference": ref,
+                "predicted": pred,
+                "precision": precision,
+                "recall": recall,
+                "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            }
+        
+        tp = sum(pair["tp"].values())
+        ref = sum(pair["reference"].values())
+        pred = sum(pair["predicted"].values())
+        precision = tp / pred if pred else 0.0
+        recall = tp / ref if ref else 0.0
+        agreement, kappa = AgreementService.cohen_kappa(
+            [labels[0] for labels in pair["classification"]],
+            [labels[1] for labels in pair["classification"]],
+        )
+        
+        return {
+            "images": pair["images"],
+            "boxes": {
+                "precision": precision,
+                "recall": recall,
+                "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+                "mean_iou": pair["iou_sum"] / pair["matches"] if pair["matches"] else 0.0,
+                "per_label": per_label,
+            },
+            "classification": {
+                "images": len(pair["classification"]),
+                "agreement": agreement,
+                "kappa": kappa,
+            },
+        }
+    
+    @staticmethod
+    def project_agreement(
+        project_id: int,
+        db: Session,
+        iou_threshold: float = 0.5,
+        annotator_key: str = "annotator_id",
+    ) -> Dict[str, Any]:
+        """Score agreement between all annotator pairs of a project.
+        
+        Runs in a queue worker; images are scored across the vision pool one
+        window at a time. Results are cached as completed agreement tasks
+        keyed by cache_key.
+        """
+        version = AnnotationService.project_version(db, project_id)
+        totals = defaultdict(lambda: {
+            "images": 0, "tp": Counter(), "reference": Counter(), "predicted": Counter(),
+            "iou_sum": 0.0, "matches": 0, "classification": [],
+        })
+        images_compared = 0
+        payloads = AgreementService._project_images(project_id, db, annotator_key, iou_threshold)
+        
+        while True:
+            window = list(itertools.islice(payloads, POOL_WINDOW))
+            if not window:
+                break
+            
+            for image_pairs in run_vision_jobs(_image_agreement_worker, [(payload,) for payload in window]):
+                if isinstance(image_pairs, Exception):
+                    raise image_pairs
+                images_compared += 1
+                for pair_key, pair in image_pairs.items():
+                    total = totals[pair_key]
+                    total["images"] += 1
+                    total["tp"].update(pair["tp"])
+                    total["reference"].update(pair["reference"])
+                    total["predicted"].update(pair["predicted"])
+                    total["iou_sum"] += pair["iou_sum"]
+                    total["matches"] += pair["matches"]
+                    if pair["classification"] is not None:
+                        total["classification"].append(pair["classification"])
+        
+        result = {
+            "project_id": project_id,
+            "version": version,
+            "iou_threshold": iou_threshold,
+            "images_compared": images_compared,
+            "annotators": sorted({annotator for pair_key in totals for annotator in pair_key}),
+            "pairs": {
+                f"{ref}|{other}": AgreementService._summarize(total)
+                for (ref, other), total in sorted(totals.items())
+            },
+        }
+        
+        return result
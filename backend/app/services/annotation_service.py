@@ -0,0 +1,21 @@
+"""Annotation service for project-wide annotation queries."""
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.annotation import Annotation
+from app.models.image import Image
+
+
+class AnnotationService:
+    """Service for facts derived from all annotations of a project."""
+    
+    @staticmethod
+    def project_version(db: Session, project_id: int) -> str:
+        """Cheap fingerprint of a project's annotations, changing on any write or delete.
+        
+        Keys caches of results computed from the annotations (crop caches,
+        agreement scores).
+        """
+        count, max_id, last_update = db.query(
+            func.count(Annotation.id), func.max(Annotation.id), func.max(Annotation.updated_at)
+        ).join(Image).filter(Image.project_id == project_id).one()
+        return f"{count}:{max_id}:{last_update.isoformat() if last_update else ''}"
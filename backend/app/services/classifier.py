@@ -0,0 +1,120 @@
+"""Classifier network and input preprocessing shared by training and inference."""
+import numpy as np
+from typing import Any, List, Optional, Sequence, Tuple
+import torch
+import torch.nn as nn
+from torch.utils.data import Dataset
+from app.utils.image_cache import load_image, resize_square_rgb
+
+
+# Input side length expected by SimpleClassifier
+INPUT_SIZE = 224
+
+
+# (filepath, (x, y, width, height) crop or None for the whole image, class index)
+TrainingSample = Tuple[str, Optional[Tuple[float, float, float, float]], int]
+
+
+def resize_rgb(img: np.ndarray) -> np.ndarray:
+    """Resize a BGR image to the model input size as HxWx3 RGB uint8."""
+    return resize_square_rgb(img, INPUT_SIZE)
+
+
+def rgb_to_tensor(img: np.ndarray) -> torch.Tensor:
+    """Normalize an HxWx3 RGB uint8 image to a 3xHxW float tensor."""
+    return torch.from_numpy(img.transpose(2, 0, 1).astype(np.float32) / 255.0)
+
+
+def preprocess(img: np.ndarray) -> torch.Tensor:
+    """Resize and normalize a BGR image to a 3xHxW float tensor."""
+    return rgb_to_tensor(resize_rgb(img))
+
+
+def image_to_tensor(image_path: str) -> torch.Tensor:
+    """Decode (through the shared image cache) and normalize an image to a 1x3xHxW tensor."""
+    return preprocess(load_image(image_path)).unsqueeze(0)
+
+
+def crop_box(img: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+    """Cut an (x, y, width, height) box out of an image, clipped to its bounds."""
+    height, width = img.shape[:2]
+    x, y, box_width, box_height = box
+    x0 = min(max(int(x), 0), width - 1)
+    y0 = min(max(int(y), 0), height - 1)
+    x1 = min(max(int(np.ceil(x + box_width)), x0 + 1), width)
+    y1 = min(max(int(np.ceil(y + box_height)), y0 + 1), height)
+    return img[y0:y1, x0:x1]
+
+
+def bounding_box(points: np.ndarray) -> Optional[Tuple[float, float, float, float]]:
+    """(x, y, width, height) bounds of (N, 2) polygon vertices, or None if they enclose no area."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    points = points[np.isfinite(points).all(axis=1)]
+    if not len(points):
+        return None
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return float(x0), float(y0), float(x1 - x0), float(y1 - y0)
+
+
+class SimpleClassifier(nn.Module):
+    """Simple CNN classifier for demo."""
+    
+    def __init__(self, num_classes: int = 10):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 32, 3, padding=1)
+        self.conv2 = nn.Conv2d(32, 64, 3, padding=1)
+        self.pool = nn.MaxPool2d(2, 2)
+        self.fc1 = nn.Linear(64 * 56 * 56, 128)
+        self.fc2 = nn.Linear(128, num_classes)
+        self.relu = nn.ReLU()
+        self.dropout = nn.Dropout(0.5)
+    
+    def forward(self, x):
+        x = self.pool(self.relu(self.conv1(x)))
+        x = self.pool(self.relu(self.conv2(x)))
+        x = x.view(-1, 64 * 56 * 56)
+        x = self.relu(self.fc1(x))
+        x = self.dropout(x)
+        x = self.fc2(x)
+        return x
+
+
+class AnnotationCropDataset(Dataset):
+    """Annotation crops (or whole images) with their class index, for training DataLoaders.
+    
+    Each worker process decodes through its own image cache, so several
+    annotations on one image usually share a decode within an epoch. With
+    raw=True items are resized RGB uint8 arrays instead of tensors, as
+    stored by the crop cache.
+    """
+    
+    def __init__(self, samples: Sequence[TrainingSample], raw: bool = False):
+        self.samples = list(samples)
+        self.raw = raw
+    
+    def __len__(self) -> int:
+        return len(self.samples)
+    
+    def __getitem__(self, index: int) -> Optional[Tuple[Any, int]]:
+        filepath, box, label = self.samples[index]
+        # Unreadable images are dropped from their batch rather than stopping training
+        try:
+            img = load_image(filepath)
+            if box is not None:
+                img = crop_box(img, box)
+            img = resize_rgb(img)
+            return (img if self.raw else rgb_to_tensor(img)), label
+        except Exception:
+            return None
+
+
+def collate_training(
+    items: List[Optional[Tuple[torch.Tensor, int]]],
+) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+    """Stack readable samples into an input batch and a label vector."""
+    items = [item for item in items if item is not None]
+    if not items:
+        return None
+    return torch.stack([tensor for tensor, _ in items]), torch.tensor([label for _, label in items])
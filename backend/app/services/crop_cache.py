@@ -0,0 +1,193 @@
+"""Preprocessed training crops in memory-mapped shards, reused across epochs and retrains."""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import torch
+from sqlalchemy.orm import Session
+from torch.utils.data import DataLoader, Dataset
+from app.core.config import settings
+from app.services.annotation_service import AnnotationService
+from app.services.classifier import INPUT_SIZE, AnnotationCropDataset, TrainingSample, rgb_to_tensor
+
+
+# Bumped when the stored crop format changes, invalidating every cache
+CROP_CACHE_FORMAT = 1
+
+# Crops decoded per loader batch while building a cache
+BUILD_BATCH = 64
+
+
+def _collate_crops(items: List[Optional[Tuple[np.ndarray, int]]]) -> List[Optional[Tuple[np.ndarray, int]]]:
+    """Keep build batches as lists; crops are written one by one."""
+    return items
+
+
+class CachedCropDataset(Dataset):
+    """Training crops read as zero-copy slices of memory-mapped shards.
+    
+    Shards are opened lazily, so each DataLoader worker maps them itself
+    and pages are shared through the OS page cache.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        index = np.load(os.path.join(path, "index.npz"))
+        self.shard_ids = index["shard"]
+        self.offsets = index["offset"]
+        self.targets = index["label"]
+        self._shards: Dict[int, np.ndarray] = {}
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Memory maps are reopened in the receiving process rather than pickled
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+    
+    def __len__(self) -> int:
+        return len(self.targets)
+    
+    def _shard(self, shard_id: int) -> np.ndarray:
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            shard = self._shards[shard_id] = np.load(
+                os.path.join(self.path, f"shard_{shard_id:05d}.npy"), mmap_mode="r"
+            )
+        return shard
+    
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, int]:
+        crop = self._shard(int(self.shard_ids[index]))[int(self.offsets[index])]
+        return rgb_to_tensor(crop), int(self.targets[index])
+
+
+class CropCache:
+    """Builds and finds crop caches keyed by a project's annotation version.
+    
+    A cache lives in CROP_CACHE_FOLDER/<project>/<key>/ as .npy shards of
+    CROP_CACHE_SHARD_SIZE resized RGB uint8 crops plus an index of shard,
+    offset and class per crop. Any annotation write or delete changes the
+    key, so the next training run rebuilds. Only the
+    CROP_CACHE_KEEP_VERSIONS most recently used versions are kept, since a
+    concurrent training may still be mapping an older one.
+    """
+    
+    @staticmethod
+    def _project_dir(project_id: int) -> str:
+        return os.path.join(settings.CROP_CACHE_FOLDER, f"project_{project_id}")
+    
+    @staticmethod
+    def key(version: str, labels: List[str]) -> str:
+        """Cache directory name for an annotation version, label set and crop format."""
+        payload = json.dumps([CROP_CACHE_FORMAT, INPUT_SIZE, version, labels])
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+    
+    @staticmethod
+    def build(path: str, samples: List[TrainingSample], labels: List[str]) -> None:
+        """Decode, crop and resize every sample once into shards at path (built aside, then renamed)."""
+        shard_size = max(settings.CROP_CACHE_SHARD_SIZE, 1)
+        staging = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(staging)
+        
+        try:
+            shards = []
+            for start in range(0, len(samples), shard_size):
+                shards.append(np.lib.format.open_memmap(
+                    os.path.join(staging, f"shard_{len(shards):05d}.npy"),
+                    mode="w+",
+                    dtype=np.uint8,
+                    shape=(min(shard_size, len(samples) - start), INPUT_SIZE, INPUT_SIZE, 3),
+                ))
+            
+            loader = DataLoader(
+                AnnotationCropDataset(samples, raw=True),
+                batch_size=BUILD_BATCH,
+                num_workers=settings.TRAIN_LOADER_WORKERS or os.cpu_count() or 1,
+                collate_fn=_collate_crops,
+                multiprocessing_context="spawn",
+            )
+            
+            # Each sample has a fixed slot; unreadable ones leave a hole that the index skips
+            written = []
+            sample_index = 0
+            for batch in loader:
+                for item in batch:
+                    if item is not None:
+                        crop, label = item
+                        shards[sample_index // shard_size][sample_index % shard_size] = crop
+                        written.append((sample_index // shard_size, sample_index % shard_size, label))
+                    sample_index += 1
+            
+            for shard in shards:
+                shard.flush()
+            
+            entries = np.array(written, dtype=np.int64).reshape(-1, 3)
+            np.savez(
+                os.path.join(staging, "index.npz"),
+                shard=entries[:, 0].astype(np.int32),
+                offset=entries[:, 1].astype(np.int32),
+                label=entries[:, 2],
+            )
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({"labels": labels, "samples": len(samples), "crops": len(written)}, f)
+            
+            os.rename(staging, path)
+        except OSError:
+            # Another process finished the same cache first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "index.npz")):
+                raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    
+    @staticmethod
+    def dataset(
+        db: Session,
+        project_id: int,
+        samples: List[TrainingSample],
+        labels: List[str],
+    ) -> Tuple[CachedCropDataset, bool]:
+        """The cached crops for a project's current annotations, building them if needed.
+        
+        Returns the dataset and whether it was built by this call.
+        """
+        project_dir = CropCache._project_dir(project_id)
+        key = CropCache.key(AnnotationService.project_version(db, project_id), labels)
+        path = os.path.join(project_dir, key)
+        
+        built = False
+        if not os.path.exists(os.path.join(path, "index.npz")):
+            os.makedirs(project_dir, exist_ok=True)
+            CropCache.build(path, samples, labels)
+            built = True
+        
+        # The directory's mtime records its last use, which pruning goes by
+        os.utime(path)
+        if built:
+            CropCache._prune(project_dir)
+        
+        return CachedCropDataset(path), built
+    
+    @staticmethod
+    def _prune(project_dir: str) -> None:
+        """Remove all but the most recently used cache versions of a project.
+        
+        Loader workers map shards lazily, so a version in use by another
+        training must survive until it is no longer among the newest.
+        """
+        versions = []
+        for name in os.listdir(project_dir):
+            path = os.path.join(project_dir, name)
+            if name.endswith(".tmp"):
+                continue
+            try:
+                versions.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        
+        versions.sort(reverse=True)
+        for _, path in versions[max(settings.CROP_CACHE_KEEP_VERSIONS, 1):]:
+            shutil.rmtree(path, ignore_errors=True)
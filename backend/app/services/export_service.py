@@ -2,19 +2,35 @@
 import json
 import os
 import zipfile
-from typing import List
+from collections import defaultdict
+from typing import Dict, List
 from sqlalchemy.orm import Session
 from app.models.image import Image
 from app.models.annotation import Annotation
+from app.services.label_service import LabelService
 
 
 class ExportService:
     """Service for exporting datasets."""
     
+    @staticmethod
+    def _annotations_by_image(project_id: int, db: Session) -> Dict[int, List[Annotation]]:
+        """Load all annotations of a project in one query, grouped by image id."""
+        annotations = db.query(Annotation).join(Image).filter(
+            Image.project_id == project_id
+        ).order_by(Annotation.image_id, Annotation.id).all()
+        
+        grouped = defaultdict(list)
+        for ann in annotations:
+            grouped[ann.image_id].append(ann)
+        return grouped
+    
     @staticmethod
     def export_coco(project_id: int, db: Session, output_path: str) -> str:
         """Export dataset in COCO format."""
+        labels = LabelService.get_project_labels(db, project_id)
         images = db.query(Image).filter(Image.project_id == project_id).all()
+        annotations_by_image = ExportService._annotations_by_image(project_id, db)
         
         coco_data = {
             "images": [],
@@ -22,8 +38,6 @@ class ExportService:
             "categories": [],
         }
         
-        # Collect unique labels
-        labels = set()
         annotation_id = 1
         
         for img in images:
@@ -36,14 +50,11 @@ class ExportService:
             })
             
             # Add annotations
-            annotations = db.query(Annotation).filter(Annotation.image_id == img.id).all()
-            for ann in annotations:
-                labels.add(ann.label)
-                
+            for ann in annotations_by_image.get(img.id, []):
                 coco_data["annotations"].append({
                     "id": annotation_id,
                     "image_id": img.id,
-                    "category_id": ann.label,
+                    "category_id": ann.label_id,
                     "bbox": [ann.x, ann.y, ann.width, ann.height] if ann.x is not None else [],
                     "area": (ann.width * ann.height) if ann.width and ann.height else 0,
                     "iscrowd": 0,
@@ -51,10 +62,10 @@ class ExportService:
                 annotation_id += 1
         
         # Add categories
-        for idx, label in enumerate(sorted(labels), 1):
+        for label in labels:
             coco_data["categories"].append({
-                "id": label,
-                "name": label,
+                "id": label.id,
+                "name": label.name,
                 "supercategory": "object",
             })
         
@@ -68,17 +79,17 @@ class ExportService:
     @staticmethod
     def export_yolo(project_id: int, db: Session, output_dir: str) -> str:
         """Export dataset in YOLO format."""
+        labels = LabelService.get_project_labels(db, project_id)
+        class_ids = {label.id: idx for idx, label in enumerate(labels)}
         images = db.query(Image).filter(Image.project_id == project_id).all()
+        annotations_by_image = ExportService._annotations_by_image(project_id, db)
         
         os.makedirs(output_dir, exist_ok=True)
         labels_dir = os.path.join(output_dir, "labels")
         os.makedirs(labels_dir, exist_ok=True)
         
-        # Collect unique labels
-        all_labels = set()
-        
         for img in images:
-            annotations = db.query(Annotation).filter(Annotation.image_id == img.id).all()
+            annotations = annotations_by_image.get(img.id)
             
             if not annotations:
                 continue
@@ -88,8 +99,6 @@ class ExportService:
             
             with open(label_file, 'w') as f:
                 for ann in annotations:
-                    all_labels.add(ann.label)
-                    
                     # YOLO format: class_id x_center y_center width height (normalized)
                     if ann.x is not None and img.width and img.height:
                         x_center = (ann.x + ann.width / 2) / img.width
@@ -97,14 +106,14 @@ class ExportService:
                         norm_width = ann.width / img.width
                         norm_height = ann.height / img.height
                         
-                        class_id = sorted(all_labels).index(ann.label)
+                        class_id = class_ids[ann.label_id]
                         f.write(f"{class_id} {x_center} {y_center} {norm_width} {norm_height}\n")
         
         # Create classes file
         classes_file = os.path.join(output_dir, "classes.txt")
         with open(classes_file, 'w') as f:
-            for label in sorted(all_labels):
-                f.write(f"{label}\n")
+            for label in labels:
+                f.write(f"{label.name}\n")
         
         # Create zip
         zip_path = f"{output_dir}.zip"
@@ -121,13 +130,14 @@ class ExportService:
     def export_pascal_voc(project_id: int, db: Session, output_dir: str) -> str:
         """Export dataset in Pascal VOC format."""
         images = db.query(Image).filter(Image.project_id == project_id).all()
+        annotations_by_image = ExportService._annotations_by_image(project_id, db)
         
         os.makedirs(output_dir, exist_ok=True)
         annotations_dir = os.path.join(output_dir, "Annotations")
         os.makedirs(annotations_dir, exist_ok=True)
         
         for img in images:
-            annotations = db.query(Annotation).filter(Annotation.image_id == img.id).all()
+            annotations = annotations_by_image.get(img.id)
             
             if not annotations:
                 continue
@@ -0,0 +1,291 @@
+"""Geometry service for validating, clipping and simplifying annotations."""
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.models.task import VisionTask
+from app.services.task_queue import TaskQueue
+from app.utils.coordinate_codec import array_to_points
+
+
+class GeometryService:
+    """Vectorized geometry engine operating on whole batches of shapes."""
+    
+    @staticmethod
+    def clip_boxes(boxes: np.ndarray, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Clip (N, 4) x/y/width/height boxes to (N, 2) image width/height bounds.
+        
+        Returns the clipped boxes and a mask of boxes that are finite and keep a
+        positive area. Negative widths/heights are normalized first.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+        
+        x_a, x_b = boxes[:, 0], boxes[:, 0] + boxes[:, 2]
+        y_a, y_b = boxes[:, 1], boxes[:, 1] + boxes[:, 3]
+        x1 = np.clip(np.minimum(x_a, x_b), 0, bounds[:, 0])
+        x2 = np.clip(np.maximum(x_a, x_b), 0, bounds[:, 0])
+        y1 = np.clip(np.minimum(y_a, y_b), 0, bounds[:, 1])
+        y2 = np.clip(np.maximum(y_a, y_b), 0, bounds[:, 1])
+        
+        clipped = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+        valid = np.isfinite(boxes).all(axis=1) & (x2 > x1) & (y2 > y1)
+        return clipped, valid
+    
+    @staticmethod
+    def clip_points(points: np.ndarray, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Clamp (N, 2) points to (N, 2) bounds; returns points and a finiteness mask."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+        return np.clip(points, 0, bounds), np.isfinite(points).all(axis=1)
+    
+    @staticmethod
+    def polygon_areas(vertices: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Shoelace areas of polygons stored back to back in one (M, 2) array."""
+        counts = np.asarray(counts, dtype=np.int64)
+        if len(vertices) == 0:
+            return np.zeros(len(counts))
+        
+        starts = np.cumsum(counts) - counts
+        poly_ids = np.repeat(np.arange(len(counts)), counts)
+        
+        # Index of the next vertex, wrapping the last vertex of each polygon to its first
+        next_idx = np.arange(len(vertices)) + 1
+        nonempty = counts > 0
+        next_idx[(starts + counts - 1)[nonempty]] = starts[nonempty]
+        
+        x, y = vertices[:, 0], vertices[:, 1]
+        cross = x * y[next_idx] - x[next_idx] * y
+        return 0.5 * np.abs(np.bincount(poly_ids, weights=cross, minlength=len(counts)))
+    
+    @staticmethod
+    def clip_polygons(
+        vertices: np.ndarray,
+        counts: np.ndarray,
+        bounds: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Clamp polygon vertices to per-polygon (P, 2) bounds.
+        
+        Returns the clipped vertices and a mask of polygons that are finite,
+        have at least three vertices and keep a positive area.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        counts = np.asarray(counts, dtype=np.int64)
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+        
+        poly_ids = np.repeat(np.arange(len(counts)), counts)
+        clipped = np.clip(vertices, 0, np.repeat(bounds, counts, axis=0))
+        
+        non_finite = ~np.isfinite(vertices).all(axis=1)
+        has_non_finite = np.bincount(poly_ids, weights=non_finite, minlength=len(counts)) > 0
+        areas = GeometryService.polygon_areas(np.nan_to_num(clipped), counts)
+        
+        valid = (counts >= 3) & ~has_non_finite & (areas > 0)
+        return clipped, valid
+    
+    @staticmethod
+    def simplify_polygons(
+        vertices: np.ndarray,
+        counts: np.ndarray,
+        tolerance: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Douglas-Peucker simplification of many polygons at once.
+        
+        All polygons are refined together: each iteration finds the farthest
+        vertex of every open segment across the whole batch, so the number of
+        Python-level iterations is the recursion depth, not the polygon count.
+        Polygons that would drop below three vertices are left unchanged.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        counts = np.asarray(counts, dtype=np.int64)
+        if tolerance <= 0 or len(vertices) == 0:
+            return vertices, counts
+        
+        starts = np.cumsum(counts) - counts
+        ends = starts + counts - 1
+        poly_ids = np.repeat(np.arange(len(counts)), counts)
+        
+        keep = np.zeros(len(vertices), dtype=bool)
+        nonempty = counts > 0
+        keep[starts[nonempty]] = True
+        keep[ends[nonempty]] = True
+        
+        seg_start, seg_end = starts[counts > 2], ends[counts > 2]
+        while len(seg_start):
+            interior = seg_end - seg_start - 1
+            open_segments = interior > 0
+            seg_start, seg_end, interior = seg_start[open_segments], seg_end[open_segments], interior[open_segments]
+            if not len(seg_start):
+                break
+            
+            # Flatten every interior vertex of every open segment into one array
+            seg_ids = np.repeat(np.arange(len(seg_start)), interior)
+            seg_offsets = np.cumsum(interior) - interior
+            idx = seg_start[seg_ids] + 1 + np.arange(len(seg_ids)) - seg_offsets[seg_ids]
+            
+            a = vertices[seg_start][seg_ids]
+            ab = vertices[seg_end][seg_ids] - a
+            ap = vertices[idx] - a
+            norm = np.hypot(ab[:, 0], ab[:, 1])
+            cross = np.abs(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0])
+            dist = np.where(norm > 0, cross / np.where(norm > 0, norm, 1), np.hypot(ap[:, 0], ap[:, 1]))
+            
+            # Farthest vertex per segment: first position reaching the segment maximum
+            seg_max = np.maximum.reduceat(dist, seg_offsets)
+            candidates = np.flatnonzero(dist == seg_max[seg_ids])
+            first = np.ones(len(candidates), dtype=bool)
+            first[1:] = seg_ids[candidates[1:]] != seg_ids[candidates[:-1]]
+            split = idx[candidates[first]]
+            refine = seg_max > tolerance
+            
+            keep[split[refine]] = True
+            seg_start, seg_end = (
+                np.concatenate([seg_start[refine], split[refine]]),
+                np.concatenate([split[refine], seg_end[refine]]),
+            )
+        
+        new_counts = np.bincount(poly_ids[keep], minlength=len(counts))
+        collapsed = (new_counts < 3) & (counts >= 3)
+        if collapsed.any():
+            keep |= collapsed[poly_ids]
+            new_counts = np.bincount(poly_ids[keep], minlength=len(counts))
+        
+        return vertices[keep], new_counts
+    
+    @staticmethod
+    def _bounds(
+        image_ids: List[int],
+        image_sizes: Dict[int, Tuple[Optional[int], Optional[int]]],
+    ) -> np.ndarray:
+        """Per-shape (width, height) bounds; unknown image sizes are unbounded."""
+        bounds = np.full((len(image_ids), 2), np.inf)
+        for row, image_id in enumerate(image_ids):
+            width, height = image_sizes.get(image_id, (None, None))
+            if width:
+                bounds[row, 0] = width
+            if height:
+                bounds[row, 1] = height
+        return bounds
+    
+    @staticmethod
+    def sanitize_annotations(
+        annotations: List[Annotation],
+        image_sizes: Dict[int, Tuple[Optional[int], Optional[int]]],
+        simplify_tolerance: float = 0.0,
+    ) -> Tuple[List[Annotation], List[Annotation], int]:
+        """Clip annotations to their images in place and split them into valid and invalid.
+        
+        Boxes, points and polygons are each processed as one vectorized batch.
+        Attributes are only written back when a value actually changes; the
+        number of annotations rewritten is returned with the split.
+        """
+        boxes = [a for a in annotations if None not in (a.x, a.y, a.width, a.height)]
+        points = [a for a in annotations if a.x is not None and a.y is not None and (a.width is None or a.height is None)]
+        polygons = [a for a in annotations if a.x is None and (a.coordinates_packed is not None or a.coordinates_json)]
+        invalid_ids = set()
+        modified = 0
+        
+        if boxes:
+            raw = np.array([(a.x, a.y, a.width, a.height) for a in boxes], dtype=np.float64)
+            clipped, valid = GeometryService.clip_boxes(raw, GeometryService._bounds([a.image_id for a in boxes], image_sizes))
+            changed = np.flatnonzero(valid & (clipped != raw).any(axis=1))
+            for row in changed.tolist():
+                ann = boxes[row]
+                ann.x, ann.y, ann.width, ann.height = clipped[row].tolist()
+            modified += len(changed)
+            invalid_ids.update(id(boxes[row]) for row in np.flatnonzero(~valid).tolist())
+        
+        if points:
+            raw = np.array([(a.x, a.y) for a in points], dtype=np.float64)
+            clipped, valid = GeometryService.clip_points(raw, GeometryService._bounds([a.image_id for a in points], image_sizes))
+            changed = np.flatnonzero(valid & (clipped != raw).any(axis=1))
+            for row in changed.tolist():
+                ann = points[row]
+                ann.x, ann.y = clipped[row].tolist()
+            modified += len(changed)
+            invalid_ids.update(id(points[row]) for row in np.flatnonzero(~valid).tolist())
+        
+        if polygons:
+            arrays = [a.coordinate_array for a in polygons]
+            counts = np.array([len(arr) for arr in arrays], dtype=np.int64)
+            raw = np.concatenate(arrays).astype(np.float64)
+            bounds = GeometryService._bounds([a.image_id for a in polygons], image_sizes)
+            
+            clipped, valid = GeometryService.clip_polygons(raw, counts, bounds)
+            changed = np.bincount(
+                np.repeat(np.arange(len(counts)), counts),
+                weights=(clipped != raw).any(axis=1),
+                minlength=len(counts),
+            ) > 0
+            
+            new_vertices, new_counts = clipped, counts
+            if simplify_tolerance > 0:
+                new_vertices, new_counts = GeometryService.simplify_polygons(clipped, counts, simplify_tolerance)
+                changed |= new_counts != counts
+            
+            new_starts = np.cumsum(new_counts) - new_counts
+            rewritten = np.flatnonzero(valid & changed)
+            for row in rewritten.tolist():
+                ann = polygons[row]
+                ann.coordinates = array_to_points(new_vertices[new_starts[row]:new_starts[row] + new_counts[row]])
+            modified += len(rewritten)
+            invalid_ids.update(id(polygons[row]) for row in np.flatnonzero(~valid).tolist())
+        
+        valid_annotations = [a for a in annotations if id(a) not in invalid_ids]
+        invalid_annotations = [a for a in annotations if id(a) in invalid_ids]
+        return valid_annotations, invalid_annotations, modified
+    
+    @staticmethod
+    def repair_project(
+        project_id: int,
+        db: Session,
+        simplify_tolerance: float = 0.0,
+        delete_invalid: bool = False,
+        chunk_size: int = 5000,
+        task: Optional[VisionTask] = None,
+    ) -> Dict[str, int]:
+        """Clip (and optionally simplify) every annotation of a project in chunks.
+        
+        Each chunk commits with the last annotation id on the task, so a
+        retried task resumes after the last committed chunk.
+        """
+        image_sizes = {
+            image_id: (width, height)
+            for image_id, width, height in db.query(Image.id, Image.width, Image.height).filter(
+                Image.project_id == project_id
+            )
+        }
+        annotations = db.query(Annotation).join(Image).filter(Image.project_id == project_id)
+        total = annotations.count()
+        stats = {"checked": 0, "modified": 0, "invalid": 0, "deleted": 0}
+        last_id = TaskQueue.resume_point(task, stats) or 0
+        
+        while True:
+            # Keyset pagination keeps each chunk independent of earlier commits
+            chunk = annotations.filter(Annotation.id > last_id).order_by(Annotation.id).limit(chunk_size).all()
+            
+            if not chunk:
+                break
+            
+            last_id = chunk[-1].id
+            _, invalid, modified = GeometryService.sanitize_annotations(chunk, image_sizes, simplify_tolerance)
+            
+            stats["checked"] += len(chunk)
+            stats["modified"] += modified
+            stats["invalid"] += len(invalid)
+            
+            if delete_invalid:
+                for ann in invalid:
+                    db.delete(ann)
+                stats["deleted"] += len(invalid)
+            
+            progress = min(99, int(100 * stats["checked"] / total)) if total else 99
+            TaskQueue.commit_progress(db, task, stats, last_id, progress)
+            
+            # Release the chunk's rows; the task itself stays attached
+            for ann in chunk:
+                if ann in db:
+                    db.expunge(ann)
+        
+        return stats
@@ -0,0 +1,108 @@
+"""Dynamic micro-batching of concurrent predict requests."""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+import torch
+from app.core.config import settings
+from app.services.model_registry import LoadedModel
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds an idle per-model inference thread waits before exiting
+IDLE_TIMEOUT = 60.0
+
+Request = Tuple[LoadedModel, torch.Tensor, Future]
+
+
+class _ModelQueue:
+    """Request queue and inference thread for one model."""
+    
+    def __init__(self, model_id: int):
+        self.model_id = model_id
+        self.requests: "queue.Queue[Request]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"inference-{model_id}", daemon=True)
+    
+    def _collect(self, first: Request) -> List[Request]:
+        """Gather requests until the batch is full or the wait window closes."""
+        batch = [first]
+        deadline = time.monotonic() + settings.PREDICT_MAX_WAIT_MS / 1000
+        while len(batch) < settings.PREDICT_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self.requests.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                if InferenceBatcher._retire(self):
+                    return
+                continue
+            
+            batch = self._collect(first)
+            
+            # A retrain mid-batch can mix weight versions; run each version separately
+            groups: Dict[int, List[Request]] = {}
+            for request in batch:
+                groups.setdefault(id(request[0]), []).append(request)
+            
+            for requests in groups.values():
+                InferenceBatcher._forward(requests)
+
+
+class InferenceBatcher:
+    """Queues predict requests per model and runs them as batched forward passes.
+    
+    Each request waits at most PREDICT_MAX_WAIT_MS for others to join it,
+    and a batch holds at most PREDICT_MAX_BATCH images.
+    """
+    
+    _queues: Dict[int, _ModelQueue] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def submit(cls, loaded: LoadedModel, tensor: torch.Tensor) -> Future:
+        """Queue a 1xCxHxW input; the future resolves to its softmax probabilities."""
+        future: Future = Future()
+        with cls._lock:
+            model_queue = cls._queues.get(loaded.model_id)
+            if model_queue is None:
+                model_queue = cls._queues[loaded.model_id] = _ModelQueue(loaded.model_id)
+                model_queue.thread.start()
+            model_queue.requests.put((loaded, tensor, future))
+        return future
+    
+    @classmethod
+    def _retire(cls, model_queue: _ModelQueue) -> bool:
+        """Remove an idle queue, unless a request arrived in the meantime."""
+        with cls._lock:
+            if not model_queue.requests.empty():
+                return False
+            if cls._queues.get(model_queue.model_id) is model_queue:
+                del cls._queues[model_queue.model_id]
+            return True
+    
+    @staticmethod
+    def _forward(requests: List[Request]) -> None:
+        """Run one batched forward pass and resolve each request's future."""
+        loaded = requests[0][0]
+        try:
+            with torch.inference_mode():
+                outputs = loaded.model(torch.cat([tensor for _, tensor, _ in requests]))
+                probabilities = torch.nn.functional.softmax(outputs, dim=1)
+        except Exception as e:
+            logger.exception("Batched inference failed for model %s", loaded.model_id)
+            for _, _, future in requests:
+                future.set_exception(e)
+            return
+        
+        for row, (_, _, future) in zip(probabilities, requests):
+            future.set_result(row)
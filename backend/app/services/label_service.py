@@ -0,0 +1,72 @@
+"""Label service for the per-project label dictionary."""
+from typing import Dict, Iterable, List
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.label import Label
+from app.models.annotation import Annotation
+
+
+class LabelService:
+    """Service for resolving free-text labels to integer label ids."""
+    
+    @staticmethod
+    def _label_index(db: Session, project_id: int) -> Dict[str, Label]:
+        """Map every label name and alias of a project to its label."""
+        index = {}
+        for label in db.query(Label).filter(Label.project_id == project_id).all():
+            for alias in label.aliases or []:
+                index.setdefault(alias, label)
+            index[label.name] = label
+        return index
+    
+    @staticmethod
+    def matching_label_ids(db: Session, project_ids: Iterable[int], name: str) -> List[int]:
+        """Ids of the labels a name or alias refers to in any of the given projects."""
+        labels = db.query(Label).filter(Label.project_id.in_(list(project_ids))).all()
+        return [label.id for label in labels if label.name == name or name in (label.aliases or [])]
+    
+    @staticmethod
+    def _create_label(db: Session, project_id: int, name: str) -> Label:
+        """Insert a label, or get the one a concurrent transaction inserted first.
+        
+        The insert runs in a savepoint, so losing the race on the
+        (project_id, name) constraint leaves the caller's transaction usable.
+        """
+        try:
+            with db.begin_nested():
+                label = Label(project_id=project_id, name=name)
+                db.add(label)
+            return label
+        except IntegrityError:
+            return db.query(Label).filter(Label.project_id == project_id, Label.name == name).one()
+    
+    @staticmethod
+    def resolve_labels(db: Session, project_id: int, names: Iterable[str]) -> Dict[str, Label]:
+        """Resolve label names (or aliases) to labels, creating missing ones without committing."""
+        index = LabelService._label_index(db, project_id)
+        resolved = {}
+        
+        for name in set(names):
+            label = index.get(name)
+            if label is None:
+                label = index[name] = LabelService._create_label(db, project_id, name)
+            resolved[name] = label
+        
+        return resolved
+    
+    @staticmethod
+    def apply_labels(db: Session, project_id: int, annotations: List[Annotation]) -> None:
+        """Set label_id on annotations and canonicalize aliased label names."""
+        if not project_id or not annotations:
+            return
+        
+        resolved = LabelService.resolve_labels(db, project_id, [ann.label for ann in annotations])
+        for ann in annotations:
+            label = resolved[ann.label]
+            ann.label_id = label.id
+            ann.label = label.name
+    
+    @staticmethod
+    def get_project_labels(db: Session, project_id: int) -> List[Label]:
+        """Get the label dictionary of a project ordered by name."""
+        return db.query(Label).filter(Label.project_id == project_id).order_by(Label.name).all()
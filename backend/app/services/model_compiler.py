@@ -0,0 +1,77 @@
+"""TorchScript artifacts, torch.compile at load, and eager vs compiled benchmarks."""
+import logging
+import os
+from typing import Any, Callable, Dict, Sequence
+import torch
+import torch.nn as nn
+from app.core.config import settings
+from app.services.classifier import INPUT_SIZE
+from app.services.quantization import latency_ms
+
+
+logger = logging.getLogger(__name__)
+
+# Batch sizes timed when benchmarking a trained model
+BENCHMARK_BATCH_SIZES = (1, 8, 32)
+
+# Largest logit difference between eager and TorchScript accepted at export
+PARITY_TOLERANCE = 1e-3
+
+
+def export_torchscript(model: nn.Module, path: str) -> Dict[str, Any]:
+    """Trace and freeze a classifier and check it against eager mode.
+    
+    Freezing inlines the weights as constants so the graph can fold
+    operations; the traced graph accepts any batch size.
+    """
+    model.eval()
+    sample = torch.randn(4, 3, INPUT_SIZE, INPUT_SIZE)
+    
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model, sample[:1]))
+    torch.jit.save(scripted, path)
+    
+    with torch.inference_mode():
+        max_abs_diff = float((torch.jit.load(path)(sample) - model(sample)).abs().max())
+    
+    if max_abs_diff > PARITY_TOLERANCE:
+        os.remove(path)
+        raise ValueError(f"TorchScript output differs from eager by {max_abs_diff:.2e}")
+    
+    return {"path": path, "max_abs_diff": max_abs_diff}
+
+
+def compile_model(model: nn.Module) -> nn.Module:
+    """torch.compile a model and warm it up, returning the eager model if compilation fails.
+    
+    Compilation happens on the first forward passes, so a single image and
+    a full micro-batch are run here rather than inside a request.
+    """
+    try:
+        compiled = torch.compile(model, dynamic=True)
+        with torch.inference_mode():
+            for batch_size in sorted({1, max(settings.PREDICT_MAX_BATCH, 1)}):
+                compiled(torch.zeros(batch_size, 3, INPUT_SIZE, INPUT_SIZE))
+        return compiled
+    except Exception:
+        logger.exception("torch.compile failed, serving the eager model")
+        return model
+
+
+def benchmark(
+    candidates: Dict[str, Callable[[torch.Tensor], torch.Tensor]],
+    batch_sizes: Sequence[int] = BENCHMARK_BATCH_SIZES,
+) -> Dict[str, Dict[str, float]]:
+    """Forward-pass latency of each candidate per batch size, with speedups over "eager"."""
+    results = {}
+    for batch_size in batch_sizes:
+        inputs = torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+        timings = {f"{name}_ms": latency_ms(model, inputs) for name, model in candidates.items()}
+        
+        eager_ms = timings.get("eager_ms")
+        for name in candidates:
+            if name != "eager" and eager_ms and timings[f"{name}_ms"]:
+                timings[f"{name}_speedup"] = eager_ms / timings[f"{name}_ms"]
+        
+        results[str(batch_size)] = timings
+    return results
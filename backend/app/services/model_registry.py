@@ -0,0 +1,229 @@
+"""In-process registry of loaded inference models."""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import torch
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.model import MLModel
+from app.services.classifier import SimpleClassifier
+from app.services.model_compiler import compile_model
+from app.services.onnx_backend import OnnxModel
+
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWeightsMissing(Exception):
+    """A ready model's trained weights are not on disk."""
+
+
+class LoadedModel:
+    """A model ready for inference, with its labels and memory footprint."""
+    
+    def __init__(
+        self,
+        model_id: int,
+        version: Tuple,
+        model: Callable[[torch.Tensor], torch.Tensor],
+        labels: List[str],
+        backend: str = "torch",
+        nbytes: Optional[int] = None,
+    ):
+        self.model_id = model_id
+        self.version = version
+        self.model = model
+        self.labels = labels
+        self.backend = backend
+        if nbytes is not None:
+            self.nbytes = nbytes
+        elif isinstance(model, torch.nn.Module):
+            self.nbytes = sum(
+                tensor.numel() * tensor.element_size()
+                for tensor in list(model.parameters()) + list(model.buffers())
+            )
+        else:
+            self.nbytes = model.nbytes
+
+
+class ModelRegistry:
+    """Loads each MLModel once and keeps recently used ones resident.
+    
+    Entries are evicted least recently used first once their combined
+    footprint exceeds MODEL_CACHE_MB; the entry just used always stays.
+    An entry is reloaded when its model is retrained, which is detected
+    from the model path and completion time, so every API process picks
+    up new weights without coordination.
+    """
+    
+    _entries: "OrderedDict[int, LoadedModel]" = OrderedDict()
+    _bytes = 0
+    _lock = threading.Lock()
+    _load_locks: Dict[int, threading.Lock] = {}
+    hits = 0
+    misses = 0
+    evictions = 0
+    
+    @staticmethod
+    def _artifact(ml_model: MLModel, name: str) -> Optional[str]:
+        """Path of a model's extra artifact from training_info, if it exists on disk."""
+        info = (ml_model.training_info or {}).get(name) or {}
+        path = info.get("path")
+        return path if path and os.path.exists(path) else None
+    
+    @staticmethod
+    def _int8_accurate(ml_model: MLModel) -> bool:
+        """Whether the int8 artifact was measured to lose no more than the tolerated accuracy."""
+        delta = ((ml_model.training_info or {}).get("quantization") or {}).get("accuracy_delta")
+        return delta is not None and delta >= -settings.QUANTIZATION_MAX_ACCURACY_DROP
+    
+    @staticmethod
+    def backend(ml_model: MLModel) -> str:
+        """Inference backend for a model.
+        
+        The configured ONNX or TorchScript artifact if it was exported, else
+        the int8 artifact when one exists and its measured accuracy is within
+        QUANTIZATION_MAX_ACCURACY_DROP of the float model (the model's config
+        "quantized" forces it on or off), else the float torch weights.
+        """
+        config = ml_model.config or {}
+        requested = config.get("inference_backend", settings.INFERENCE_BACKEND)
+        
+        if requested in ("onnx", "torchscript"):
+            if ModelRegistry._artifact(ml_model, requested):
+                return requested
+            logger.warning("Model %s has no %s artifact, using torch", ml_model.id, requested)
+        
+        quantized = config.get("quantized")
+        if quantized is None:
+            quantized = settings.PREDICT_QUANTIZED and ModelRegistry._int8_accurate(ml_model)
+        if quantized and ModelRegistry._artifact(ml_model, "quantization"):
+            return "int8"
+        
+        return "torch"
+    
+    @staticmethod
+    def version(ml_model: MLModel) -> Tuple:
+        """Identity of a model's trained weights and the backend serving them."""
+        return (
+            ml_model.model_path,
+            ml_model.completed_at.isoformat() if ml_model.completed_at else None,
+            ModelRegistry.backend(ml_model),
+        )
+    
+    @staticmethod
+    def load(ml_model: MLModel) -> LoadedModel:
+        """Build a model and load its weights for CPU inference."""
+        training_info = ml_model.training_info or {}
+        num_classes = training_info.get("num_classes", 10)
+        labels = training_info.get("labels", [f"class_{i}" for i in range(num_classes)])
+        version = ModelRegistry.version(ml_model)
+        
+        if version[2] == "onnx":
+            return LoadedModel(ml_model.id, version, OnnxModel(training_info["onnx"]["path"]), labels, "onnx")
+        
+        if version[2] in ("int8", "torchscript"):
+            path = training_info["quantization" if version[2] == "int8" else "torchscript"]["path"]
+            model = torch.jit.load(path, map_location="cpu")
+            model.eval()
+            # Packed or frozen weights aren't visible as parameters; the file size is a fair footprint
+            return LoadedModel(ml_model.id, version, model, labels, version[2], nbytes=os.path.getsize(path))
+        
+        # Never serve (or cache) randomly initialised weights in place of a missing file
+        if not ml_model.model_path or not os.path.exists(ml_model.model_path):
+            raise ModelWeightsMissing(f"Weights of model {ml_model.id} not found at {ml_model.model_path}")
+        
+        model = SimpleClassifier(num_classes=num_classes)
+        model.load_state_dict(torch.load(ml_model.model_path, map_location="cpu"))
+        model.eval()
+        
+        if settings.MODEL_COMPILE:
+            model = compile_model(model)
+        
+        return LoadedModel(ml_model.id, version, model, labels)
+    
+    @classmethod
+    def get(cls, ml_model: MLModel) -> LoadedModel:
+        """Get a resident model, loading (or reloading after retraining) it if needed."""
+        version = cls.version(ml_model)
+        
+        with cls._lock:
+            entry = cls._entries.get(ml_model.id)
+            if entry is not None and entry.version == version:
+                cls._entries.move_to_end(ml_model.id)
+                cls.hits += 1
+                return entry
+            load_lock = cls._load_locks.setdefault(ml_model.id, threading.Lock())
+        
+        # One loader per model; concurrent requests wait for it instead of loading again
+        with load_lock:
+            with cls._lock:
+                entry = cls._entries.get(ml_model.id)
+                if entry is not None and entry.version == version:
+                    cls._entries.move_to_end(ml_model.id)
+                    cls.hits += 1
+                    return entry
+                cls.misses += 1
+            
+            entry = cls.load(ml_model)
+            
+            with cls._lock:
+                previous = cls._entries.pop(ml_model.id, None)
+                if previous is not None:
+                    cls._bytes -= previous.nbytes
+                cls._entries[ml_model.id] = entry
+                cls._bytes += entry.nbytes
+                cls._evict()
+        
+        return entry
+    
+    @classmethod
+    def _evict(cls) -> None:
+        """Drop least recently used entries beyond the memory budget (caller holds the lock)."""
+        budget = settings.MODEL_CACHE_MB * 1024 * 1024
+        while cls._bytes > budget and len(cls._entries) > 1:
+            _, evicted = cls._entries.popitem(last=False)
+            cls._bytes -= evicted.nbytes
+            cls.evictions += 1
+    
+    @classmethod
+    def invalidate(cls, model_id: int) -> None:
+        """Forget a model, e.g. after retraining or deletion."""
+        with cls._lock:
+            entry = cls._entries.pop(model_id, None)
+            if entry is not None:
+                cls._bytes -= entry.nbytes
+    
+    @classmethod
+    def preload(cls, db: Session, model_ids: Optional[List[int]] = None) -> List[int]:
+        """Load the given models, or the most recently trained ready ones up to MODEL_PRELOAD_COUNT."""
+        query = db.query(MLModel).filter(MLModel.status == "ready")
+        if model_ids:
+            models = query.filter(MLModel.id.in_(model_ids)).all()
+        else:
+            models = query.order_by(MLModel.completed_at.desc()).limit(settings.MODEL_PRELOAD_COUNT).all()
+        
+        loaded = []
+        for ml_model in models:
+            try:
+                cls.get(ml_model)
+                loaded.append(ml_model.id)
+            except Exception:
+                logger.exception("Failed to preload model %s", ml_model.id)
+        return loaded
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Resident models and hit/miss counters."""
+        with cls._lock:
+            return {
+                "models": list(cls._entries),
+                "backends": {model_id: entry.backend for model_id, entry in cls._entries.items()},
+                "bytes": cls._bytes,
+                "max_bytes": settings.MODEL_CACHE_MB * 1024 * 1024,
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "evictions": cls.evictions,
+            }
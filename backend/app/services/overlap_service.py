@@ -0,0 +1,499 @@
+"""Overlap service for IoU computation, NMS and duplicate-box detection."""
+import heapq
+import itertools
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.models.task import VisionTask
+from app.services.task_queue import TaskQueue
+from app.services.worker_pool import run_vision_jobs
+
+
+# Images handed to the process pool per round, bounding in-flight memory
+POOL_WINDOW = 256
+
+# Images whose duplicate groups are listed in a deduplication task's results
+DEDUP_RESULT_IMAGES = 100
+
+# Candidate box pairs scored per vectorized block in iter_overlapping_pairs
+PAIR_CHUNK = 1 << 20
+
+# Candidates resolved together by nms, bounding its IoU matrices to NMS_BLOCK squared
+NMS_BLOCK = 512
+
+
+def _image_groups_worker(payload: Tuple[int, Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+    """Vision pool entry point: duplicate groups for one image."""
+    image_id, arrays = payload
+    return image_id, OverlapService.duplicate_groups(**arrays)
+
+
+class OverlapService:
+    """Service for vectorized IoU and duplicate detection."""
+    
+    @staticmethod
+    def pairwise_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+        """IoU matrix between (N, 4) and (M, 4) x/y/width/height boxes."""
+        a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+        b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+        
+        ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+        iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+        ix2 = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+        iy2 = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+        
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+        return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+    
+    @staticmethod
+    def iter_overlapping_pairs(
+        boxes: np.ndarray,
+        iou_threshold: float,
+        classes: Optional[np.ndarray] = None,
+        max_pairs: int = PAIR_CHUNK,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield blocks of box pairs (i < j) with IoU above a threshold.
+        
+        Boxes are bucketed into horizontal strips and swept by left edge
+        within each strip, so only boxes that overlap in both axes become
+        candidates. Candidates are scored in blocks of at most max_pairs and
+        each block's hits are yielded before the next is built, so memory
+        stays bounded however many pairs overlap.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if len(boxes) < 2:
+            return
+        
+        x, y, w, h = boxes.T
+        left = x - x.min()
+        right = left + np.maximum(w, 0)
+        top = y - y.min()
+        bottom = top + np.maximum(h, 0)
+        
+        # Horizontal strips about twice a typical box tall; a box joins every strip it spans
+        heights = h[h > 0]
+        strip_height = 2 * float(np.median(heights)) if len(heights) else 1.0
+        while True:
+            first = np.floor(top / strip_height).astype(np.int64)
+            spans = np.floor(bottom / strip_height).astype(np.int64) - first + 1
+            if spans.sum() <= 8 * len(boxes):
+                break
+            strip_height *= 2
+        
+        entry_box = np.repeat(np.arange(len(boxes)), spans)
+        entry_strip = first[entry_box] + (np.arange(len(entry_box)) - np.repeat(np.cumsum(spans) - spans, spans))
+        
+        # Sort entries by strip, then left edge; within a strip, a box can only
+        # overlap the boxes after it that start before its right edge
+        width = float(right.max()) + 1.0
+        keys = entry_strip * width + left[entry_box]
+        order = np.argsort(keys, kind="stable")
+        keys, entry_box, entry_strip = keys[order], entry_box[order], entry_strip[order]
+        reach = np.searchsorted(keys, entry_strip * width + right[entry_box], side="left")
+        counts = np.maximum(reach - np.arange(len(keys)) - 1, 0)
+        ends = np.cumsum(counts)
+        
+        start = 0
+        while start < len(keys):
+            # Generate candidate pairs in bounded blocks
+            base = ends[start - 1] if start else 0
+            stop = max(int(np.searchsorted(ends, base + max_pairs, side="right")), start + 1)
+            chunk_counts = counts[start:stop]
+            total = int(chunk_counts.sum())
+            if total:
+                rows = np.repeat(np.arange(start, stop), chunk_counts)
+                cols = rows + 1 + np.arange(total) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+                a, b = entry_box[rows], entry_box[cols]
+                
+                # A pair sharing several strips is only reported in the first one
+                keep = entry_strip[rows] == np.maximum(first[a], first[b])
+                del rows, cols
+                if classes is not None:
+                    keep &= classes[a] == classes[b]
+                a, b = a[keep], b[keep]
+                
+                inter = (
+                    np.clip(np.minimum(right[a], right[b]) - np.maximum(left[a], left[b]), 0, None)
+                    * np.clip(np.minimum(bottom[a], bottom[b]) - np.maximum(top[a], top[b]), 0, None)
+                )
+                union = w[a] * h[a] + w[b] * h[b] - inter
+                iou = np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+                hit = iou > iou_threshold
+                if hit.any():
+                    yield np.minimum(a[hit], b[hit]), np.maximum(a[hit], b[hit]), iou[hit]
+            start = stop
+    
+    @staticmethod
+    def overlapping_pairs(
+        boxes: np.ndarray,
+        iou_threshold: float,
+        classes: Optional[np.ndarray] = None,
+        max_pairs: int = PAIR_CHUNK,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """All box pairs (i < j) with IoU above a threshold, as index and IoU arrays.
+        
+        Holds every pair in memory; callers that can consume pairs block by
+        block should use iter_overlapping_pairs.
+        """
+        blocks = list(OverlapService.iter_overlapping_pairs(boxes, iou_threshold, classes, max_pairs))
+        if not blocks:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        return tuple(np.concatenate(arrays) for arrays in zip(*blocks))
+    
+    @staticmethod
+    def nms(
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        iou_threshold: float = 0.5,
+        classes: Optional[np.ndarray] = None,
+        max_keep: Optional[int] = None,
+    ) -> np.ndarray:
+        """Greedy non-maximum suppression; returns kept indices by descending score.
+        
+        Candidates are visited in score order in blocks of NMS_BLOCK: a block
+        is first checked against the overlapping boxes kept so far, then
+        resolved greedily within itself. Memory stays at a few blocks squared
+        however dense the boxes are, and with max_keep set it stops once that
+        many are kept.
+        With classes given, boxes only suppress boxes of the same class.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float64)
+        classes = np.asarray(classes) if classes is not None else np.zeros(len(boxes), dtype=np.int64)
+        order = np.argsort(-scores, kind="stable")
+        
+        kept = np.empty(0, dtype=np.int64)
+        for start in range(0, len(order), NMS_BLOCK):
+            block = order[start:start + NMS_BLOCK]
+            block_boxes, block_classes = boxes[block], classes[block]
+            alive = np.ones(len(block), dtype=bool)
+            
+            # Only kept boxes touching the block's extent can suppress any of it;
+            # the strip sweep then scores just the kept/candidate pairs that overlap
+            x1, y1 = block_boxes[:, 0].min(), block_boxes[:, 1].min()
+            x2, y2 = (block_boxes[:, 0] + block_boxes[:, 2]).max(), (block_boxes[:, 1] + block_boxes[:, 3]).max()
+            kept_boxes = boxes[kept]
+            near = kept[
+                (kept_boxes[:, 0] < x2) & (kept_boxes[:, 0] + kept_boxes[:, 2] > x1)
+                & (kept_boxes[:, 1] < y2) & (kept_boxes[:, 1] + kept_boxes[:, 3] > y1)
+            ]
+            if len(near):
+                pool = np.concatenate([near, block])
+                for pairs_i, pairs_j, _ in OverlapService.iter_overlapping_pairs(
+                    boxes[pool], iou_threshold, classes[pool], max_pairs=NMS_BLOCK * NMS_BLOCK
+                ):
+                    alive[pairs_j[pairs_i < len(near)] - len(near)] = False
+            
+            # Greedy within the block: each surviving box suppresses the weaker ones it overlaps
+            candidates = np.flatnonzero(alive)
+            over = OverlapService.pairwise_iou(block_boxes[candidates], block_boxes[candidates]) > iou_threshold
+            over &= block_classes[candidates][:, None] == block_classes[candidates][None, :]
+            over = np.triu(over, k=1)
+            survivors = np.ones(len(candidates), dtype=bool)
+            for row in range(len(candidates)):
+                if survivors[row]:
+                    survivors &= ~over[row]
+            
+            kept = np.concatenate([kept, block[candidates[survivors]]])
+            if max_keep is not None and len(kept) >= max_keep:
+                return kept[:max_keep]
+        
+        return kept
+    
+    @staticmethod
+    def soft_nms(
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        iou_threshold: float = 0.3,
+        sigma: float = 0.5,
+        method: str = "gaussian",
+        score_threshold: float = 0.001,
+        classes: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Soft-NMS: decay the scores of overlapping boxes instead of dropping them.
+        
+        method is "linear" (scores times 1 - IoU above iou_threshold) or
+        "gaussian" (times exp(-IoU^2 / sigma) for any overlap). Returns kept
+        indices by descending decayed score, and those scores. Selection is
+        sequential, so this costs more than nms on heavily overlapping input.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        scores = np.array(scores, dtype=np.float64)
+        
+        # Linear decay only touches pairs above the threshold; Gaussian decay any overlap
+        pair_threshold = iou_threshold if method == "linear" else 0.0
+        pairs_i, pairs_j, pairs_iou = OverlapService.overlapping_pairs(boxes, pair_threshold, classes)
+        if method == "linear":
+            decay = 1.0 - pairs_iou
+        else:
+            decay = np.exp(-(pairs_iou ** 2) / sigma)
+        
+        # Adjacency lists (CSR) over both pair directions
+        sources = np.concatenate([pairs_i, pairs_j])
+        targets = np.concatenate([pairs_j, pairs_i])
+        factors = np.concatenate([decay, decay])
+        by_source = np.argsort(sources, kind="stable")
+        targets, factors = targets[by_source].tolist(), factors[by_source].tolist()
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(boxes)))]).tolist()
+        
+        current = scores.tolist()
+        heap = [(-score, index) for index, score in enumerate(current)]
+        heapq.heapify(heap)
+        done = [False] * len(boxes)
+        kept = []
+        
+        while heap:
+            neg_score, index = heapq.heappop(heap)
+            if done[index] or -neg_score != current[index]:
+                continue
+            if current[index] < score_threshold:
+                break
+            done[index] = True
+            kept.append(index)
+            for k in range(offsets[index], offsets[index + 1]):
+                other = targets[k]
+                if not done[other]:
+                    current[other] *= factors[k]
+                    heapq.heappush(heap, (-current[other], other))
+        
+        kept = np.array(kept, dtype=np.int64)
+        return kept, np.array(current)[kept]
+    
+    @staticmethod
+    def _identical_boxes(
+        boxes: np.ndarray,
+        classes: Optional[np.ndarray],
+        iou_threshold: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Collapse exact copies of a box: one representative index per distinct box,
+        and the position of every box's representative among them.
+        
+        Copies overlap with IoU 1, so they always group together when the
+        threshold is below 1; zero-area boxes never overlap and stay apart.
+        """
+        count = len(boxes)
+        if iou_threshold >= 1:
+            return np.arange(count), np.arange(count)
+        
+        positive = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+        key = np.column_stack([
+            boxes,
+            classes if classes is not None else np.zeros(count),
+            np.where(positive, -1, np.arange(count)),
+        ])
+        _, representatives, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+        return representatives, inverse.reshape(-1)
+    
+    @staticmethod
+    def _merge_components(component: np.ndarray, pairs_i: np.ndarray, pairs_j: np.ndarray) -> np.ndarray:
+        """Relabel components so that every pair ends up in one component."""
+        a, b = component[pairs_i], component[pairs_j]
+        linking = a != b
+        if not linking.any():
+            return component
+        
+        count = len(component)
+        graph = coo_matrix(
+            (np.ones(int(linking.sum()), dtype=np.int8), (a[linking], b[linking])), shape=(count, count)
+        )
+        _, merged = connected_components(graph, directed=False)
+        return merged[component]
+    
+    @staticmethod
+    def duplicate_groups(
+        ids: Sequence[int],
+        boxes: np.ndarray,
+        iou_threshold: float,
+        labels: Optional[Sequence[str]] = None,
+        confidences: Optional[Sequence[Optional[float]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Group transitively overlapping boxes and pick one box to keep per group.
+        
+        Manually drawn boxes (no confidence) are kept over detections, then the
+        most confident box, then the oldest id. Exact copies are collapsed
+        before pairing and overlapping pairs are merged into components one
+        bounded block at a time, so memory stays flat for dense images.
+        """
+        if len(ids) < 2:
+            return []
+        
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        classes = None
+        if labels is not None:
+            classes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)[1].reshape(-1)
+        
+        representatives, inverse = OverlapService._identical_boxes(boxes, classes, iou_threshold)
+        distinct_boxes = boxes[representatives]
+        distinct_classes = classes[representatives] if classes is not None else None
+        
+        component = np.arange(len(representatives))
+        max_iou = np.zeros(len(representatives))
+        for pairs_i, pairs_j, pairs_iou in OverlapService.iter_overlapping_pairs(
+            distinct_boxes, iou_threshold, distinct_classes
+        ):
+            np.maximum.at(max_iou, pairs_i, pairs_iou)
+            component = OverlapService._merge_components(component, pairs_i, pairs_j)
+        
+        # Copies of one box overlap it completely
+        max_iou[np.bincount(inverse, minlength=len(representatives)) > 1] = 1.0
+        
+        roots = component[inverse]
+        grouped = np.flatnonzero(np.bincount(roots)[roots] > 1)
+        if not len(grouped):
+            return []
+        
+        grouped = grouped[np.argsort(roots[grouped], kind="stable")]
+        splits = np.flatnonzero(np.diff(roots[grouped])) + 1
+        box_iou = max_iou[inverse]
+        
+        confidences = confidences if confidences is not None else [None] * len(ids)
+        groups = []
+        for members in np.split(grouped, splits):
+            members = members.tolist()
+            keep = max(
+                members,
+                key=lambda m: (confidences[m] is None, confidences[m] or 0.0, -ids[m]),
+            )
+            groups.append({
+                "keep_id": int(ids[keep]),
+                "duplicate_ids": sorted(int(ids[m]) for m in members if m != keep),
+                "max_iou": float(box_iou[members].max()),
+            })
+        
+        return groups
+    
+    @staticmethod
+    def find_image_duplicates(
+        image_id: int,
+        db: Session,
+        iou_threshold: float = 0.7,
+        same_label: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Duplicate box groups for a single image."""
+        rows = db.query(
+            Annotation.id, Annotation.label, Annotation.confidence,
+            Annotation.x, Annotation.y, Annotation.width, Annotation.height,
+        ).filter(
+            Annotation.image_id == image_id,
+            Annotation.x.isnot(None),
+            Annotation.width.isnot(None),
+        ).order_by(Annotation.id).all()
+        
+        return OverlapService.duplicate_groups(**OverlapService._arrays(rows, iou_threshold, same_label))
+    
+    @staticmethod
+    def _arrays(rows: List[Tuple], iou_threshold: float, same_label: bool) -> Dict[str, Any]:
+        """Convert (id, label, confidence, x, y, width, height) rows to duplicate_groups arguments."""
+        return {
+            "ids": [row[0] for row in rows],
+            "boxes": np.array([row[3:7] for row in rows], dtype=np.float64).reshape(-1, 4),
+            "iou_threshold": iou_threshold,
+            "labels": [row[1] for row in rows] if same_label else None,
+            "confidences": [row[2] for row in rows],
+        }
+    
+    @staticmethod
+    def delete_duplicates(groups: List[Dict[str, Any]], db: Session, chunk_size: int = 1000) -> int:
+        """Delete every duplicate (non-kept) box of the given groups; the caller commits."""
+        duplicate_ids = [ann_id for group in groups for ann_id in group["duplicate_ids"]]
+        for start in range(0, len(duplicate_ids), chunk_size):
+            db.query(Annotation).filter(
+                Annotation.id.in_(duplicate_ids[start:start + chunk_size])
+            ).delete(synchronize_session=False)
+        return len(duplicate_ids)
+    
+    @staticmethod
+    def _project_payloads(
+        project_id: int,
+        db: Session,
+        iou_threshold: float,
+        same_label: bool,
+        after_image_id: int,
+        limit: int = POOL_WINDOW,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Box arrays of the next images of a project with 2+ boxes, after an image id."""
+        boxes = db.query(Annotation).join(Image).filter(
+            Image.project_id == project_id,
+            Annotation.x.isnot(None),
+            Annotation.width.isnot(None),
+        )
+        image_ids = [
+            row[0] for row in boxes.with_entities(Annotation.image_id).filter(
+                Annotation.image_id > after_image_id
+            ).group_by(Annotation.image_id).having(func.count(Annotation.id) > 1).order_by(
+                Annotation.image_id
+            ).limit(limit)
+        ]
+        if not image_ids:
+            return []
+        
+        rows = boxes.with_entities(
+            Annotation.image_id, Annotation.id, Annotation.label, Annotation.confidence,
+            Annotation.x, Annotation.y, Annotation.width, Annotation.height,
+        ).filter(Annotation.image_id.in_(image_ids)).order_by(Annotation.image_id, Annotation.id).all()
+        
+        return [
+            (image_id, OverlapService._arrays([tuple(row)[1:] for row in image_rows], iou_threshold, same_label))
+            for image_id, image_rows in itertools.groupby(rows, key=lambda row: row[0])
+        ]
+    
+    @staticmethod
+    def deduplicate_project(
+        project_id: int,
+        db: Session,
+        iou_threshold: float = 0.7,
+        same_label: bool = True,
+        merge: bool = False,
+        task: Optional[VisionTask] = None,
+    ) -> Dict[str, Any]:
+        """Find (and with merge, delete) duplicate boxes across a project.
+        
+        Images are grouped on the vision pool a window at a time, and each
+        window's deletions commit together with its cursor on the task, so a
+        retried task resumes after the last committed window. Results list
+        the groups of the first DEDUP_RESULT_IMAGES images with duplicates.
+        """
+        total = db.query(Image).filter(Image.project_id == project_id).count()
+        stats = {
+            "images_scanned": 0,
+            "images_with_duplicates": 0,
+            "groups": 0,
+            "duplicates": 0,
+            "deleted": 0,
+            "by_image": {},
+        }
+        last_id = TaskQueue.resume_point(task, stats) or 0
+        
+        while True:
+            window = OverlapService._project_payloads(project_id, db, iou_threshold, same_label, last_id)
+            if not window:
+                break
+            last_id = window[-1][0]
+            
+            for outcome in run_vision_jobs(_image_groups_worker, [(payload,) for payload in window]):
+                if isinstance(outcome, Exception):
+                    raise outcome
+                image_id, groups = outcome
+                if not groups:
+                    continue
+                
+                stats["images_with_duplicates"] += 1
+                stats["groups"] += len(groups)
+                stats["duplicates"] += sum(len(group["duplicate_ids"]) for group in groups)
+                if len(stats["by_image"]) < DEDUP_RESULT_IMAGES:
+                    stats["by_image"][str(image_id)] = groups
+                if merge:
+                    stats["deleted"] += OverlapService.delete_duplicates(groups, db)
+            
+            stats["images_scanned"] += len(window)
+            progress = min(99, int(100 * stats["images_scanned"] / total)) if total else 99
+            TaskQueue.commit_progress(db, task, stats, last_id, progress)
+        
+        return stats
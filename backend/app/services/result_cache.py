@@ -0,0 +1,105 @@
+"""Result cache for vision tasks, keyed by image content and task parameters."""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Query, Session
+from app.core.config import settings
+from app.models.image import Image
+from app.models.task import VisionTask
+from app.services.vision_service import VisionService
+from app.utils.file_utils import file_sha256
+
+
+class ResultCache:
+    """Reuse vision task results for identical image content and parameters.
+    
+    A task's cache_key hashes the image's SHA-256, the task type, its
+    options, the effective defaults and the model version. A completed
+    task within VISION_CACHE_TTL, or a pending/running one, stands in for
+    queueing the same work again. The key covers image content, not which
+    image or user it came from, so results are handed to other requesters
+    as copies (see copy_result) rather than as the original task.
+    """
+    
+    @staticmethod
+    def image_hash(image: Image, db: Session) -> str:
+        """Content hash of an image, computed and stored on first use."""
+        if not image.content_hash:
+            image.content_hash = file_sha256(image.filepath)
+            db.commit()
+        return image.content_hash
+    
+    @staticmethod
+    def cache_key(image: Image, task_type: str, options: Optional[Dict[str, Any]], db: Session) -> Optional[str]:
+        """Cache key for running a task type on an image, or None if caching is disabled."""
+        if settings.VISION_CACHE_MAX_ENTRIES <= 0:
+            return None
+        
+        payload = {"image": ResultCache.image_hash(image, db), **VisionService.result_signature(task_type, options)}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    @staticmethod
+    def _fresh(query: Query) -> Query:
+        """Restrict a query to completed tasks within the TTL, or still in flight."""
+        completed = VisionTask.status == "completed"
+        if settings.VISION_CACHE_TTL > 0:
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.VISION_CACHE_TTL)
+            completed = completed & (VisionTask.completed_at >= cutoff)
+        return query.filter(or_(completed, VisionTask.status.in_(["pending", "running"])))
+    
+    @staticmethod
+    def lookup(db: Session, cache_key: Optional[str], completed_only: bool = False) -> Optional[VisionTask]:
+        """Find a task with the same key, preferring completed ones."""
+        if cache_key is None:
+            return None
+        
+        query = ResultCache._fresh(db.query(VisionTask).filter(VisionTask.cache_key == cache_key))
+        if completed_only:
+            query = query.filter(VisionTask.status == "completed")
+        
+        return query.order_by((VisionTask.status != "completed"), VisionTask.id.desc()).first()
+    
+    @staticmethod
+    def copy_result(db: Session, cached: VisionTask, name: str, config: Dict[str, Any]) -> VisionTask:
+        """A new completed task for a requester, carrying a cached task's results."""
+        now = datetime.utcnow()
+        task = VisionTask(
+            name=name,
+            task_type=cached.task_type,
+            status="completed",
+            progress=100,
+            config=config,
+            results=cached.results,
+            attempts=0,
+            max_attempts=0,
+            available_at=now,
+            completed_at=now,
+        )
+        db.add(task)
+        db.commit()
+        db.refresh(task)
+        return task
+    
+    @staticmethod
+    def evict(db: Session) -> int:
+        """Drop cache keys of expired results and of results beyond VISION_CACHE_MAX_ENTRIES.
+        
+        Run periodically by queue workers, off the request path.
+        """
+        cached = db.query(VisionTask.id).filter(VisionTask.cache_key.isnot(None), VisionTask.status == "completed")
+        stale = cached.order_by(VisionTask.completed_at.desc()).offset(max(settings.VISION_CACHE_MAX_ENTRIES, 0)).subquery()
+        conditions = [VisionTask.id.in_(select(stale.c.id))]
+        
+        if settings.VISION_CACHE_TTL > 0:
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.VISION_CACHE_TTL)
+            conditions.append(VisionTask.completed_at < cutoff)
+        
+        evicted = db.query(VisionTask).filter(
+            VisionTask.cache_key.isnot(None),
+            VisionTask.status == "completed",
+            or_(*conditions),
+        ).update({VisionTask.cache_key: None}, synchronize_session=False)
+        db.commit()
+        return evicted
@@ -0,0 +1,105 @@
+"""Search service for filenames, labels and annotation metadata."""
+from typing import Any, List, Optional
+from sqlalchemy import cast, column, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Query, Session
+from app.models.annotation import Annotation
+from app.models.image import Image
+
+
+# Column access by name: "metadata" is reserved on declarative classes
+annotation_metadata = Annotation.__table__.c["metadata"]
+
+# SQLite's trigram tokenizer cannot match queries shorter than one trigram
+MIN_FTS_QUERY_LENGTH = 3
+
+
+def _like_pattern(q: str) -> str:
+    """Substring LIKE pattern with wildcards in the query escaped."""
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SearchService:
+    """Service for indexed substring and fuzzy search.
+    
+    PostgreSQL uses pg_trgm GIN indexes for substring/similarity matches and
+    a jsonb GIN index for metadata; SQLite uses FTS5 trigram tables.
+    """
+    
+    @staticmethod
+    def _text_filter(db: Session, query: Query, attribute, fts_table: str, q: str, fuzzy: bool) -> Query:
+        """Filter a query on a text column using the dialect's search index."""
+        dialect = db.get_bind().dialect.name
+        
+        if dialect == "postgresql":
+            if fuzzy:
+                # Trigram similarity (pg_trgm "%" operator), best matches first
+                return query.filter(attribute.op("%")(q)).order_by(func.similarity(attribute, q).desc())
+            return query.filter(attribute.ilike(_like_pattern(q), escape="\\"))
+        
+        if dialect == "sqlite" and len(q) >= MIN_FTS_QUERY_LENGTH:
+            phrase = '"' + q.replace('"', '""') + '"'
+            matches = text(
+                f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :phrase"
+            ).bindparams(phrase=phrase).columns(column("rowid"))
+            return query.filter(attribute.class_.id.in_(matches))
+        
+        return query.filter(attribute.ilike(_like_pattern(q), escape="\\"))
+    
+    @staticmethod
+    def search_images(
+        db: Session,
+        user_id: int,
+        q: str,
+        project_id: Optional[int] = None,
+        fuzzy: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[Image]:
+        """Search a user's images by original filename."""
+        query = db.query(Image).filter(Image.uploader_id == user_id)
+        
+        if project_id:
+            query = query.filter(Image.project_id == project_id)
+        
+        query = SearchService._text_filter(db, query, Image.original_filename, "images_fts", q, fuzzy)
+        return query.offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def search_annotations(
+        db: Session,
+        user_id: int,
+        label: Optional[str] = None,
+        metadata_key: Optional[str] = None,
+        metadata_value: Optional[Any] = None,
+        project_id: Optional[int] = None,
+        fuzzy: bool = False,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[Annotation]:
+        """Search a user's annotations by label text and metadata keys/values."""
+        query = db.query(Annotation).join(Image).filter(Image.uploader_id == user_id)
+        
+        if project_id:
+            query = query.filter(Image.project_id == project_id)
+        
+        if label:
+            query = SearchService._text_filter(db, query, Annotation.label, "annotations_fts", label, fuzzy)
+        
+        if metadata_key:
+            if db.get_bind().dialect.name == "postgresql":
+                # Same expression as the GIN index so the planner can use it
+                metadata_jsonb = cast(annotation_metadata, JSONB)
+                if metadata_value is None:
+                    query = query.filter(metadata_jsonb.has_key(metadata_key))
+                else:
+                    query = query.filter(metadata_jsonb.contains({metadata_key: metadata_value}))
+            else:
+                value = func.json_extract(annotation_metadata, f'$."{metadata_key}"')
+                if metadata_value is None:
+                    query = query.filter(value.isnot(None))
+                else:
+                    query = query.filter(value == metadata_value)
+        
+        return query.offset(skip).limit(limit).all()
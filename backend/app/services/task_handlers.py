@@ -0,0 +1,250 @@
+"""Handlers executed by queue workers, keyed by VisionTask.task_type."""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.image import Image
+from app.models.model import MLModel
+from app.models.task import VisionTask
+from app.services.agreement_service import AgreementService
+from app.services.geometry_service import GeometryService
+from app.services.overlap_service import OverlapService, POOL_WINDOW
+from app.services.result_cache import ResultCache
+from app.services.task_queue import TaskQueue
+from app.services.training_service import TrainingService
+from app.services.vision_service import VisionService
+from app.services.worker_pool import run_vision_job, run_vision_jobs
+
+
+def _get_image(task: VisionTask, db: Session) -> Image:
+    """Get the image a task refers to."""
+    image_id = (task.config or {}).get("image_id")
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise ValueError("Image not found")
+    return image
+
+
+def _detect(task: VisionTask, image: Image) -> Dict[str, Any]:
+    """Run detection on one image with the task's options."""
+    result = VisionService.detect([image.filepath], task.config)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def handle_detection(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Run object detection on the task's image."""
+    return _detect(task, _get_image(task, db))
+
+
+def handle_classification(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Run classification on the task's image."""
+    image = _get_image(task, db)
+    return run_vision_job(VisionService.run_classification, image.filepath, (task.config or {}).get("max_side"))
+
+
+def handle_auto_annotation(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Detect objects and stage annotations; they commit together with task completion.
+    
+    A cached detection of the same image content and options is reused.
+    """
+    image = _get_image(task, db)
+    cached = ResultCache.lookup(db, ResultCache.cache_key(image, "detection", task.config, db), completed_only=True)
+    results = dict(cached.results) if cached else _detect(task, image)
+    annotations = VisionService.create_annotations([image], {image.id: results.get("detections", [])}, db)
+    return {**results, "annotations_created": len(annotations)}
+
+
+def handle_project_auto_annotation(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Auto-annotate every pending image of a project, one chunk per commit.
+    
+    Each chunk's images are detected in parallel in the vision pool and
+    their annotations inserted in one flush. Chunk rows are locked with
+    SKIP LOCKED and leave the pending state on commit (as annotating, or
+    failed if detection failed), so two workers never annotate the same
+    image. Each commit carries a cursor and the running stats and confirms
+    the lease first, so a retried task resumes where it stopped with its
+    counts intact.
+    """
+    config = task.config or {}
+    project_id = config["project_id"]
+    chunk_size = config.get("chunk_size") or settings.AUTO_ANNOTATE_CHUNK_SIZE
+    
+    pending = db.query(Image).filter(Image.project_id == project_id, Image.status == "pending")
+    stats = {"total_images": pending.count(), "processed": 0, "annotations_created": 0, "failed": 0, "errors": []}
+    # A resumed task keeps the total it started with; its done images are no longer pending
+    last_id = TaskQueue.resume_point(task, stats) or 0
+    total = stats["total_images"]
+    
+    while True:
+        images = pending.filter(Image.id > last_id).order_by(Image.id).limit(chunk_size).with_for_update(
+            skip_locked=True
+        ).all()
+        if not images:
+            break
+        last_id = images[-1].id
+        
+        outcomes = VisionService.detect([image.filepath for image in images], config)
+        detected, detections = [], {}
+        for image, outcome in zip(images, outcomes):
+            if isinstance(outcome, Exception):
+                # Leaves the pending state with the chunk, so the image isn't retried forever
+                image.status = "failed"
+                stats["failed"] += 1
+                if len(stats["errors"]) < 100:
+                    stats["errors"].append({"image_id": image.id, "error": str(outcome)})
+            else:
+                detected.append(image)
+                detections[image.id] = outcome.get("detections", [])
+        
+        annotations = VisionService.create_annotations(detected, detections, db)
+        stats["processed"] += len(images)
+        stats["annotations_created"] += len(annotations)
+        
+        progress = min(99, int(100 * stats["processed"] / total)) if total else 99
+        TaskQueue.commit_progress(db, task, stats, last_id, progress)
+    
+    return stats
+
+
+def handle_batch_classification(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Classify a list of images or a whole project across the vision pool.
+    
+    Each image's result is stored as a completed classification task whose
+    parent is this one (listed with GET /tasks/?parent_id=), committed per
+    window together with a cursor, so a retried task resumes after the last
+    window. The task's own results keep only summary counts and the first
+    errors.
+    """
+    config = task.config or {}
+    if config.get("project_id") is not None:
+        query = db.query(Image.id, Image.filepath).filter(Image.project_id == config["project_id"])
+    else:
+        query = db.query(Image.id, Image.filepath).filter(Image.id.in_(config.get("image_ids") or []))
+    
+    total = query.count()
+    stats = {"total_images": total, "classified": 0, "failed": 0, "class_counts": {}, "errors": []}
+    last_id = TaskQueue.resume_point(task, stats) or 0
+    class_counts = Counter(stats["class_counts"])
+    options = {"max_side": config["max_side"]} if config.get("max_side") is not None else {}
+    
+    while True:
+        rows = query.filter(Image.id > last_id).order_by(Image.id).limit(POOL_WINDOW).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        outcomes = run_vision_jobs(
+            VisionService.run_classification, [(row.filepath, config.get("max_side")) for row in rows]
+        )
+        completed_at = datetime.utcnow()
+        for row, outcome in zip(rows, outcomes):
+            if isinstance(outcome, Exception):
+                stats["failed"] += 1
+                if len(stats["errors"]) < 100:
+                    stats["errors"].append({"image_id": row.id, "error": str(outcome)})
+                continue
+            
+            db.add(VisionTask(
+                name=f"Classification - image {row.id}",
+                task_type="classification",
+                status="completed",
+                progress=100,
+                config={"image_id": row.id, **options},
+                results=outcome,
+                attempts=0,
+                max_attempts=0,
+                available_at=completed_at,
+                completed_at=completed_at,
+                parent_id=task.id,
+            ))
+            stats["classified"] += 1
+            class_counts[outcome["class"]] += 1
+        
+        stats["class_counts"] = dict(class_counts)
+        done = stats["classified"] + stats["failed"]
+        TaskQueue.commit_progress(db, task, stats, last_id, min(99, int(100 * done / total)) if total else 99)
+    
+    return stats
+
+
+def handle_geometry_repair(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Clip and optionally simplify all annotations of a project, resuming after the last committed chunk."""
+    config = task.config or {}
+    return GeometryService.repair_project(
+        config["project_id"],
+        db,
+        config.get("simplify_tolerance", 0.0),
+        config.get("delete_invalid", False),
+        task=task,
+    )
+
+
+def handle_deduplication(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Find (and optionally merge) duplicate boxes across a project, resuming after the last committed window."""
+    config = task.config or {}
+    return OverlapService.deduplicate_project(
+        config["project_id"],
+        db,
+        config.get("iou_threshold", 0.7),
+        config.get("same_label", True),
+        config.get("merge", False),
+        task=task,
+    )
+
+
+def handle_agreement(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Score inter-annotator agreement across a project."""
+    config = task.config or {}
+    return AgreementService.project_agreement(
+        config["project_id"],
+        db,
+        config.get("iou_threshold", 0.5),
+        config.get("annotator_key", "annotator_id"),
+    )
+
+
+def handle_model_training(task: VisionTask, db: Session) -> Dict[str, Any]:
+    """Train a model; a retried task resumes from the previous attempt's checkpoint."""
+    config = task.config or {}
+    return TrainingService.train_model(
+        config["model_id"],
+        db,
+        epochs=config.get("epochs", 10),
+        batch_size=config.get("batch_size", 32),
+        learning_rate=config.get("learning_rate", 0.001),
+        project_id=config.get("project_id"),
+        task=task,
+    )
+
+
+def fail_model_training(task: VisionTask, db: Session) -> None:
+    """Release a model whose training task failed for good, even if its worker died mid-run."""
+    model = db.query(MLModel).filter(MLModel.id == (task.config or {}).get("model_id")).first()
+    if model is None or model.status not in ("queued", "training", "cancelling"):
+        return
+    
+    if model.status == "cancelling":
+        model.status = "ready" if model.completed_at and model.model_path else "cancelled"
+    else:
+        model.status = "failed"
+
+
+TASK_HANDLERS: Dict[str, Callable[[VisionTask, Session], Dict[str, Any]]] = {
+    "detection": handle_detection,
+    "classification": handle_classification,
+    "auto_annotation": handle_auto_annotation,
+    "project_auto_annotation": handle_project_auto_annotation,
+    "batch_classification": handle_batch_classification,
+    "geometry_repair": handle_geometry_repair,
+    "deduplication": handle_deduplication,
+    "agreement": handle_agreement,
+    "model_training": handle_model_training,
+}
+
+# Called when a task of the type fails for the last time (see TaskQueue.fail and claim)
+TASK_FAILURE_HOOKS: Dict[str, Callable[[VisionTask, Session], None]] = {
+    "model_training": fail_model_training,
+}
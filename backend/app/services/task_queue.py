@@ -0,0 +1,273 @@
+"""Durable task queue on top of the vision_tasks table."""
+import logging
+import random
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.task import VisionTask
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    """Raised in a handler whose worker no longer holds the task's lease."""
+
+
+class Lease:
+    """A worker's hold on a running task; its heartbeat sets lost once the lease can't be extended."""
+    
+    def __init__(self, task_id: int, worker_id: str):
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+
+
+# Task types queue workers have a handler for (task_handlers.TASK_HANDLERS). Listed
+# here so API processes can validate task types without importing the handlers
+TASK_TYPES = frozenset({
+    "detection",
+    "classification",
+    "auto_annotation",
+    "project_auto_annotation",
+    "batch_classification",
+    "geometry_repair",
+    "deduplication",
+    "agreement",
+    "model_training",
+})
+
+# Lease of the task the current worker thread is running, set by its heartbeat
+current_lease: ContextVar[Optional[Lease]] = ContextVar("current_lease", default=None)
+
+
+class TaskQueue:
+    """Queue operations: enqueue, claim with a lease, heartbeat, complete, fail.
+    
+    Claims use SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers on
+    any number of hosts can share the table without handing out a task twice.
+    A task whose lease expires (its worker died) becomes claimable again.
+    """
+    
+    @staticmethod
+    def enqueue(
+        db: Session,
+        name: str,
+        task_type: str,
+        config: Optional[Dict[str, Any]] = None,
+        max_attempts: Optional[int] = None,
+        cache_key: Optional[str] = None,
+    ) -> VisionTask:
+        """Create a pending task that workers can claim immediately."""
+        task = VisionTask(
+            name=name,
+            task_type=task_type,
+            status="pending",
+            config=config,
+            attempts=0,
+            max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+            available_at=datetime.utcnow(),
+            cache_key=cache_key,
+        )
+        db.add(task)
+        db.commit()
+        db.refresh(task)
+        return task
+    
+    @staticmethod
+    def claim(
+        db: Session,
+        worker_id: str,
+        task_types: Optional[List[str]] = None,
+        exclude_task_types: Optional[List[str]] = None,
+    ) -> Optional[VisionTask]:
+        """Claim the next available task for a worker, or None if the queue is empty.
+        
+        task_types restricts the claim to those types; exclude_task_types
+        leaves those types to other workers.
+        """
+        while True:
+            now = datetime.utcnow()
+            query = db.query(VisionTask).filter(or_(
+                and_(
+                    VisionTask.status == "pending",
+                    or_(VisionTask.available_at.is_(None), VisionTask.available_at <= now),
+                ),
+                and_(VisionTask.status == "running", VisionTask.lease_expires_at < now),
+            ))
+            
+            if task_types:
+                query = query.filter(VisionTask.task_type.in_(task_types))
+            if exclude_task_types:
+                query = query.filter(VisionTask.task_type.notin_(exclude_task_types))
+            
+            task = query.order_by(VisionTask.available_at, VisionTask.id).with_for_update(skip_locked=True).first()
+            
+            if task is None:
+                db.commit()
+                return None
+            
+            # Lease expired on the final attempt: the worker died, give up on the task
+            if task.status == "running" and (task.attempts or 0) >= (task.max_attempts or 1):
+                task.status = "failed"
+                task.error_message = task.error_message or "Worker lease expired"
+                task.locked_by = None
+                task.completed_at = now
+                TaskQueue._on_failed(db, task)
+                db.commit()
+                continue
+            
+            task.status = "running"
+            task.attempts = (task.attempts or 0) + 1
+            task.locked_by = worker_id
+            task.heartbeat_at = now
+            task.lease_expires_at = now + timedelta(seconds=settings.TASK_LEASE_SECONDS)
+            task.error_message = None
+            db.commit()
+            return task
+    
+    @staticmethod
+    def heartbeat(db: Session, task_id: int, worker_id: str) -> bool:
+        """Extend a task's lease; returns False if the worker no longer holds it."""
+        now = datetime.utcnow()
+        updated = db.query(VisionTask).filter(
+            VisionTask.id == task_id,
+            VisionTask.locked_by == worker_id,
+            VisionTask.status == "running",
+        ).update({
+            VisionTask.heartbeat_at: now,
+            VisionTask.lease_expires_at: now + timedelta(seconds=settings.TASK_LEASE_SECONDS),
+        }, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    
+    @staticmethod
+    def check_lease(db: Optional[Session] = None) -> None:
+        """Raise LeaseLost if the task running in this thread lost its lease.
+        
+        Handlers poll this between units of work, so a worker whose task was
+        handed to another attempt stops instead of racing it. With db, the
+        task row is also locked and the lease confirmed in the database,
+        fencing the handler's next commit against a new claim.
+        """
+        lease = current_lease.get()
+        if lease is None:
+            return
+        if not lease.lost.is_set() and db is not None and TaskQueue._locked(db, lease.task_id, lease.worker_id) is None:
+            lease.lost.set()
+        if lease.lost.is_set():
+            raise LeaseLost(f"Lease on task {lease.task_id} lost")
+    
+    @staticmethod
+    def resume_point(task: Optional[VisionTask], stats: Dict[str, Any]) -> Any:
+        """Cursor committed by an earlier attempt of a resumable task, or None.
+        
+        The running stats committed with it are merged into stats.
+        """
+        if task is None:
+            return None
+        saved = dict(task.results or {})
+        cursor = saved.pop("cursor", None)
+        if cursor is not None:
+            stats.update(saved)
+        return cursor
+    
+    @staticmethod
+    def commit_progress(
+        db: Session,
+        task: Optional[VisionTask],
+        stats: Dict[str, Any],
+        cursor: Any,
+        progress: int,
+    ) -> None:
+        """Commit a chunk of a resumable task's work together with its cursor and running stats.
+        
+        The lease is confirmed first, so an attempt that lost its task can
+        never commit over the attempt that took it over.
+        """
+        if task is not None:
+            task.results = {**stats, "cursor": cursor}
+            task.progress = progress
+        TaskQueue.check_lease(db)
+        db.commit()
+    
+    @staticmethod
+    def _locked(db: Session, task_id: int, worker_id: str) -> Optional[VisionTask]:
+        """Lock a task row if the worker still holds its lease."""
+        return db.query(VisionTask).filter(
+            VisionTask.id == task_id,
+            VisionTask.locked_by == worker_id,
+            VisionTask.status == "running",
+        ).with_for_update().first()
+    
+    @staticmethod
+    def complete(db: Session, task_id: int, worker_id: str, results: Optional[Dict[str, Any]]) -> bool:
+        """Mark a task completed, committing the handler's pending writes with it.
+        
+        If the lease was lost, the handler's uncommitted writes are rolled back
+        and False is returned.
+        """
+        task = TaskQueue._locked(db, task_id, worker_id)
+        if task is None:
+            db.rollback()
+            return False
+        
+        task.status = "completed"
+        task.progress = 100
+        task.results = results
+        task.locked_by = None
+        task.lease_expires_at = None
+        task.completed_at = datetime.utcnow()
+        db.commit()
+        return True
+    
+    @staticmethod
+    def fail(db: Session, task_id: int, worker_id: str, error: str) -> None:
+        """Record a failed attempt, scheduling a retry with exponential backoff if attempts remain."""
+        db.rollback()
+        task = TaskQueue._locked(db, task_id, worker_id)
+        if task is None:
+            db.rollback()
+            return
+        
+        now = datetime.utcnow()
+        task.error_message = error
+        task.locked_by = None
+        task.lease_expires_at = None
+        
+        if (task.attempts or 0) < (task.max_attempts or 1):
+            delay = min(
+                settings.TASK_RETRY_BASE_DELAY * 2 ** ((task.attempts or 1) - 1),
+                settings.TASK_RETRY_MAX_DELAY,
+            )
+            task.status = "pending"
+            task.available_at = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        else:
+            task.status = "failed"
+            task.completed_at = now
+            TaskQueue._on_failed(db, task)
+        
+        db.commit()
+    
+    @staticmethod
+    def _on_failed(db: Session, task: VisionTask) -> None:
+        """Run the task type's failure hook, committed together with the task's failed state.
+        
+        Hooks release whatever a handler left in an intermediate state,
+        including when its worker died and no handler code ran at all.
+        """
+        # Imported here so API processes enqueueing tasks don't load the handlers' torch and OpenCV
+        from app.services.task_handlers import TASK_FAILURE_HOOKS
+        
+        hook = TASK_FAILURE_HOOKS.get(task.task_type)
+        if hook is None:
+            return
+        try:
+            with db.begin_nested():
+                hook(task, db)
+        except Exception:
+            logger.exception("Failure hook for task %s failed", task.id)
@@ -1,119 +1,281 @@
 """Training service for ML models."""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from datetime import datetime
 from sqlalchemy.orm import Session
+from torch.utils.data import DataLoader, Dataset, Subset
 from app.models.model import MLModel
 from app.models.annotation import Annotation
-from typing import Dict, Any
+from app.models.image import Image
+from app.models.task import VisionTask
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.classifier import (
+    INPUT_SIZE,
+    AnnotationCropDataset,
+    SimpleClassifier,
+    TrainingSample,
+    bounding_box,
+    rgb_to_tensor,
+    collate_training,
+    image_to_tensor,
+)
+from app.services.crop_cache import CropCache
+from app.services.inference_batcher import InferenceBatcher
+from app.services.label_service import LabelService
+from app.services.model_registry import LoadedModel, ModelRegistry
+from app.services.model_compiler import benchmark, compile_model, export_torchscript
+from app.services.onnx_backend import OnnxModel, export_onnx
+from app.services.quantization import quantize_model
+from app.services.task_queue import LeaseLost, TaskQueue
+from app.services.worker_pool import get_vision_pool
+from app.utils.coordinate_codec import points_to_array, unpack_array
+from app.utils.image_cache import load_square_rgb
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 
-class SimpleClassifier(nn.Module):
-    """Simple CNN classifier for demo."""
-    
-    def __init__(self, num_classes: int = 10):
-        super().__init__()
-        self.conv1 = nn.Conv2d(3, 32, 3, padding=1)
-        self.conv2 = nn.Conv2d(32, 64, 3, padding=1)
-        self.pool = nn.MaxPool2d(2, 2)
-        self.fc1 = nn.Linear(64 * 56 * 56, 128)
-        self.fc2 = nn.Linear(128, num_classes)
-        self.relu = nn.ReLU()
-        self.dropout = nn.Dropout(0.5)
-    
-    def forward(self, x):
-        x = self.pool(self.relu(self.conv1(x)))
-        x = self.pool(self.relu(self.conv2(x)))
-        x = x.view(-1, 64 * 56 * 56)
-        x = self.relu(self.fc1(x))
-        x = self.dropout(x)
-        x = self.fc2(x)
-        return x
+logger = logging.getLogger(__name__)
+
+
+class TrainingCancelled(Exception):
+    """Raised inside the training loop when cancellation was requested."""
 
 
 class TrainingService:
     """Service for training ML models."""
     
     @staticmethod
-    async def train_model(
+    def train_model(
         model_id: int,
         db: Session,
         epochs: int = 10,
         batch_size: int = 32,
-        learning_rate: float = 0.001
+        learning_rate: float = 0.001,
+        project_id: Optional[int] = None,
+        task: Optional[VisionTask] = None,
     ) -> Dict[str, Any]:
-        """Train a machine learning model."""
+        """Train a machine learning model on a project's annotation crops.
+        
+        Runs in a queue worker (blocking). Progress is written to the model
+        and task every epoch, and a checkpoint is saved every
+        TRAIN_CHECKPOINT_EVERY epochs so a retry of the same task resumes
+        where a crashed attempt stopped. A model set to "cancelling" stops
+        within TRAIN_CANCEL_CHECK_SECONDS, and an attempt whose worker lost
+        the task's lease stops without touching the model. Each attempt
+        writes its checkpoint and artifacts to its own directory, so a stale
+        attempt can never overwrite the files a newer one serves.
+        """
+        ml_model = None
+        model_dir = os.path.join("models", f"model_{model_id}")
+        attempt = f"task_{task.id}_{task.attempts or 0}" if task is not None else f"run_{uuid.uuid4().hex[:12]}"
+        run_dir = os.path.join(model_dir, attempt)
+        checkpoint_path = os.path.join(run_dir, "checkpoint.ckpt")
         try:
             # Get model from database
             ml_model = db.query(MLModel).filter(MLModel.id == model_id).first()
             if not ml_model:
                 raise ValueError("Model not found")
             
+            if ml_model.status == "cancelling":
+                raise TrainingCancelled()
+            
             ml_model.status = "training"
             db.commit()
             
-            # Get training data (annotations)
-            annotations = db.query(Annotation).all()
+            if project_id is None:
+                project_id = (ml_model.config or {}).get("project_id")
+            if project_id is None:
+                raise ValueError("Training requires a project")
+            
+            # Get training data (annotation crops)
+            samples, labels = TrainingService._training_samples(db, project_id)
             
-            if not annotations:
+            if not samples:
                 raise ValueError("No training data available")
             
-            # Count unique labels
-            unique_labels = set(ann.label for ann in annotations)
-            num_classes = len(unique_labels)
+            num_classes = len(labels)
+            
+            # Crops decoded once into memory-mapped shards, reused until annotations change
+            crop_cache = None
+            if settings.CROP_CACHE_ENABLED:
+                dataset, built = CropCache.dataset(db, project_id, samples, labels)
+                crop_cache = {"path": dataset.path, "built": built, "crops": len(dataset)}
+            else:
+                dataset = AnnotationCropDataset(samples)
+            
+            # Crops the model never trains on, to measure the int8 artifact's accuracy (opt-in)
+            train_indices, holdout_indices = TrainingService._holdout_split(len(dataset))
+            
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            workers = settings.TRAIN_LOADER_WORKERS or os.cpu_count() or 1
+            loader = DataLoader(
+                Subset(dataset, train_indices),
+                batch_size=batch_size,
+                shuffle=True,
+                num_workers=workers,
+                collate_fn=collate_training,
+                pin_memory=device.type == "cuda",
+                # Workers stay up across epochs and keep batches decoded ahead of the model
+                persistent_workers=True,
+                prefetch_factor=settings.TRAIN_PREFETCH_FACTOR,
+                multiprocessing_context="spawn",
+            )
             
             # Initialize model
-            model = SimpleClassifier(num_classes=num_classes)
+            model = SimpleClassifier(num_classes=num_classes).to(device)
             criterion = nn.CrossEntropyLoss()
             optimizer = optim.Adam(model.parameters(), lr=learning_rate)
             
-            # Training loop (simplified demo)
             training_losses = []
+            training_accuracy = 0.0
+            start_epoch = 0
             
-            for epoch in range(epochs):
-                # Simulate training
-                # In production, you'd load actual image data and train properly
+            # Resume a crashed attempt of this task if it trained on the same data
+            run = {
+                "task_id": task.id if task is not None else None,
+                "epochs": epochs,
+                "batch_size": batch_size,
+                "learning_rate": learning_rate,
+                "project_id": project_id,
+                "labels": labels,
+                "samples": len(samples),
+            }
+            checkpoint = TrainingService._previous_checkpoint(model_dir, task, run)
+            if checkpoint is not None:
+                model.load_state_dict(checkpoint["model"])
+                optimizer.load_state_dict(checkpoint["optimizer"])
+                start_epoch = checkpoint["epoch"]
+                training_losses = checkpoint["training_losses"]
+                training_accuracy = checkpoint["training_accuracy"]
+                logger.info("Resuming model %s training at epoch %s", model_id, start_epoch + 1)
+            
+            next_cancel_check = time.monotonic() + settings.TRAIN_CANCEL_CHECK_SECONDS
+            
+            for epoch in range(start_epoch, epochs):
+                model.train()
                 epoch_loss = 0.0
-                num_batches = max(len(annotations) // batch_size, 1)
+                num_batches = 0
+                correct = seen = 0
                 
-                for batch in range(num_batches):
-                    # Simulate batch training
-                    # In real implementation, load images and create batches
-                    dummy_input = torch.randn(batch_size, 3, 224, 224)
-                    dummy_labels = torch.randint(0, num_classes, (batch_size,))
+                for batch in loader:
+                    if time.monotonic() >= next_cancel_check:
+                        TaskQueue.check_lease()
+                        if TrainingService._cancel_requested(db, model_id):
+                            raise TrainingCancelled()
+                        next_cancel_check = time.monotonic() + settings.TRAIN_CANCEL_CHECK_SECONDS
+                    
+                    if batch is None:
+                        continue
+                    inputs, targets = batch
+                    inputs = inputs.to(device, non_blocking=True)
+                    targets = targets.to(device, non_blocking=True)
                     
                     optimizer.zero_grad()
-                    outputs = model(dummy_input)
-                    loss = criterion(outputs, dummy_labels)
+                    outputs = model(inputs)
+                    loss = criterion(outputs, targets)
                     loss.backward()
                     optimizer.step()
                     
                     epoch_loss += loss.item()
+                    num_batches += 1
+                    correct += (outputs.argmax(dim=1) == targets).sum().item()
+                    seen += len(targets)
+                
+                if num_batches == 0:
+                    raise ValueError("No readable training images")
                 
                 avg_loss = epoch_loss / num_batches
                 training_losses.append(avg_loss)
+                training_accuracy = correct / seen
+                
+                if settings.TRAIN_CHECKPOINT_EVERY and (epoch + 1) % settings.TRAIN_CHECKPOINT_EVERY == 0:
+                    TrainingService._save_checkpoint(checkpoint_path, {
+                        "run": run,
+                        "epoch": epoch + 1,
+                        "model": model.state_dict(),
+                        "optimizer": optimizer.state_dict(),
+                        "training_losses": training_losses,
+                        "training_accuracy": training_accuracy,
+                    })
                 
                 # Update model progress
                 ml_model.epochs_trained = epoch + 1
                 ml_model.loss = avg_loss
+                if task is not None:
+                    task.progress = min(99, int(100 * (epoch + 1) / epochs))
+                TaskQueue.check_lease(db)
                 db.commit()
             
+            # Artifacts are built and served on CPU
+            model = model.cpu().eval()
+            
             # Save model
-            model_path = f"models/model_{model_id}.pth"
-            import os
-            os.makedirs("models", exist_ok=True)
+            model_path = os.path.join(run_dir, "model.pth")
+            os.makedirs(run_dir, exist_ok=True)
             torch.save(model.state_dict(), model_path)
             
+            # ONNX artifact for the ONNX Runtime backend; torch weights still serve if it fails
+            onnx_info = None
+            if settings.ONNX_EXPORT:
+                try:
+                    onnx_info = export_onnx(model, os.path.join(run_dir, "model.onnx"))
+                except Exception as e:
+                    logger.warning("ONNX export failed for model %s: %s", model_id, e)
+            
+            # Frozen TorchScript artifact, free of per-layer Python overhead
+            torchscript_info = None
+            if settings.TORCHSCRIPT_EXPORT:
+                try:
+                    torchscript_info = export_torchscript(model, os.path.join(run_dir, "model.ts.pt"))
+                except Exception as e:
+                    logger.warning("TorchScript export failed for model %s: %s", model_id, e)
+            
+            # Int8 artifact for CPU inference, measured against the float model on held-out
+            # crops, or without a holdout on training crops other than the calibration ones
+            quantization_info = None
+            if settings.QUANTIZATION in ("dynamic", "static"):
+                try:
+                    calibration_indices = TrainingService._spread(train_indices)
+                    if holdout_indices:
+                        evaluation, evaluation_indices = "held_out", holdout_indices
+                    else:
+                        calibrated = set(calibration_indices)
+                        evaluation = "training"
+                        evaluation_indices = TrainingService._spread(
+                            [index for index in train_indices if index not in calibrated]
+                        )
+                    quantization_info = quantize_model(
+                        model,
+                        os.path.join(run_dir, "model.int8.pt"),
+                        settings.QUANTIZATION,
+                        TrainingService._calibration_samples(dataset, calibration_indices),
+                        TrainingService._calibration_samples(dataset, evaluation_indices),
+                    )
+                    quantization_info["evaluation"] = evaluation
+                except Exception as e:
+                    logger.warning("Quantization failed for model %s: %s", model_id, e)
+            
+            benchmark_results = None
+            if settings.MODEL_BENCHMARK:
+                benchmark_results = TrainingService._benchmark(model, onnx_info, torchscript_info, quantization_info)
+            
             # Calculate final metrics
             final_loss = training_losses[-1]
-            # Simulate accuracy (in production, evaluate on validation set)
-            simulated_accuracy = max(0.7, min(0.95, 1.0 - final_loss))
             
             # Update model
             ml_model.status = "ready"
             ml_model.model_path = model_path
-            ml_model.accuracy = simulated_accuracy
+            ml_model.accuracy = training_accuracy
             ml_model.loss = final_loss
             ml_model.completed_at = datetime.utcnow()
             ml_model.training_info = {
@@ -122,57 +284,343 @@ class TrainingService:
                 "learning_rate": learning_rate,
                 "training_losses": training_losses,
                 "num_classes": num_classes,
-                "labels": list(unique_labels),
+                "labels": labels,
+                "project_id": project_id,
+                "samples": len(samples),
+                "held_out": len(holdout_indices),
+                "training_accuracy": training_accuracy,
+                "crop_cache": crop_cache,
+                "onnx": onnx_info,
+                "torchscript": torchscript_info,
+                "quantization": quantization_info,
+                "benchmark": benchmark_results,
             }
+            TaskQueue.check_lease(db)
             db.commit()
             
+            # Serve the new weights from the next prediction on
+            ModelRegistry.invalidate(model_id)
+            TrainingService._remove_checkpoint(checkpoint_path)
+            TrainingService._remove_runs(model_dir, keep=run_dir)
+            
             return {
                 "status": "completed",
-                "accuracy": simulated_accuracy,
+                "accuracy": training_accuracy,
                 "loss": final_loss,
                 "epochs": epochs,
             }
-            
-        except Exception as e:
-            ml_model.status = "failed"
+        
+        except LeaseLost:
+            # The task belongs to a newer attempt, which owns the model and its files now
+            db.rollback()
+            raise
+        
+        except TrainingCancelled:
+            db.rollback()
+            # Weights from an earlier completed run are untouched and keep serving
+            ml_model.status = "ready" if ml_model.completed_at and ml_model.model_path else "cancelled"
             db.commit()
+            TrainingService._remove_runs(model_dir, keep=os.path.dirname(ml_model.model_path or ""))
+            return {"status": "cancelled", "epochs_trained": ml_model.epochs_trained}
+        
+        except Exception:
+            db.rollback()
+            if ml_model is not None:
+                # A retry resumes from the last checkpoint; only the final attempt marks the model failed
+                retrying = task is not None and (task.attempts or 0) < (task.max_attempts or 1)
+                ml_model.status = "queued" if retrying else "failed"
+                db.commit()
+                if not retrying:
+                    TrainingService._remove_runs(model_dir, keep=os.path.dirname(ml_model.model_path or ""))
             raise
     
     @staticmethod
-    async def predict(model_id: int, image_path: str, db: Session) -> Dict[str, Any]:
-        """Run inference with a trained model."""
+    def _cancel_requested(db: Session, model_id: int) -> bool:
+        """Whether cancellation was requested since training started."""
+        return db.query(MLModel.status).filter(MLModel.id == model_id).scalar() == "cancelling"
+    
+    @staticmethod
+    def _save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+        """Write a checkpoint atomically, so a crash mid-write keeps the previous one."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        torch.save(state, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+    
+    @staticmethod
+    def _load_checkpoint(path: str, run: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """A checkpoint left by an earlier attempt of the same run, if any."""
+        if run["task_id"] is None or not os.path.exists(path):
+            return None
+        
+        try:
+            checkpoint = torch.load(path, map_location="cpu")
+        except Exception:
+            logger.warning("Unreadable checkpoint %s, training from scratch", path)
+            return None
+        
+        return checkpoint if checkpoint.get("run") == run else None
+    
+    @staticmethod
+    def _previous_checkpoint(model_dir: str, task: Optional[VisionTask], run: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The latest checkpoint left by an earlier attempt of the same task, if any."""
+        if task is None or not os.path.isdir(model_dir):
+            return None
+        
+        prefix = f"task_{task.id}_"
+        attempts = sorted(
+            (int(name[len(prefix):]) for name in os.listdir(model_dir)
+             if name.startswith(prefix) and name[len(prefix):].isdigit()),
+            reverse=True,
+        )
+        for attempt in attempts:
+            if attempt < (task.attempts or 0):
+                checkpoint = TrainingService._load_checkpoint(
+                    os.path.join(model_dir, f"{prefix}{attempt}", "checkpoint.ckpt"), run
+                )
+                if checkpoint is not None:
+                    return checkpoint
+        return None
+    
+    @staticmethod
+    def _remove_checkpoint(path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+    
+    @staticmethod
+    def _remove_runs(model_dir: str, keep: Optional[str]) -> None:
+        """Delete every attempt directory of a model except the one being served."""
+        if not os.path.isdir(model_dir):
+            return
+        for name in os.listdir(model_dir):
+            path = os.path.join(model_dir, name)
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+    
+    @staticmethod
+    def _benchmark(
+        model: nn.Module,
+        onnx_info: Optional[Dict[str, Any]],
+        torchscript_info: Optional[Dict[str, Any]],
+        quantization_info: Optional[Dict[str, Any]],
+    ) -> Optional[Dict[str, Dict[str, float]]]:
+        """Per-batch-size latency of the eager model against each artifact built for it."""
+        try:
+            candidates = {"eager": model.eval()}
+            if torchscript_info:
+                candidates["torchscript"] = torch.jit.load(torchscript_info["path"])
+            if quantization_info:
+                candidates["int8"] = torch.jit.load(quantization_info["path"])
+            if onnx_info:
+                candidates["onnx"] = OnnxModel(onnx_info["path"])
+            if settings.MODEL_COMPILE:
+                candidates["compiled"] = compile_model(model)
+            return benchmark(candidates)
+        except Exception as e:
+            logger.warning("Benchmark failed: %s", e)
+            return None
+    
+    @staticmethod
+    def _training_samples(db: Session, project_id: int) -> Tuple[List[TrainingSample], List[str]]:
+        """Crop samples and sorted class labels for a project's annotations.
+        
+        Annotations are streamed as plain rows; boxes become crops, polygons
+        are cropped to their vertices' bounding box, and annotations with
+        neither (classifications) use the whole image.
+        """
+        query = db.query(
+            Image.filepath, Annotation.label, Annotation.x, Annotation.y, Annotation.width, Annotation.height,
+            Annotation.coordinates_packed, Annotation.coordinates_json,
+        ).join(Image, Annotation.image_id == Image.id).filter(Image.project_id == project_id)
+        
+        rows = []
+        for filepath, label, x, y, width, height, packed, points in query.order_by(Annotation.id).yield_per(5000):
+            if x is not None and y is not None and width and height:
+                box = (x, y, width, height)
+            elif packed is not None:
+                box = bounding_box(unpack_array(packed))
+            elif points:
+                box = bounding_box(points_to_array(points))
+            else:
+                box = None
+            rows.append((filepath, box, label))
+        
+        labels = sorted({label for _, _, label in rows})
+        class_index = {label: i for i, label in enumerate(labels)}
+        return [(filepath, box, class_index[label]) for filepath, box, label in rows], labels
+    
+    @staticmethod
+    def _holdout_split(size: int) -> Tuple[List[int], List[int]]:
+        """Training and held-out crop indices.
+        
+        With quantization enabled, up to QUANTIZATION_HOLDOUT_IMAGES crops
+        (at most a fifth of them), spread evenly, are kept out of training;
+        by default none are. The split is deterministic, so resumed attempts
+        match.
+        """
+        count = 0
+        if settings.QUANTIZATION in ("dynamic", "static"):
+            count = min(settings.QUANTIZATION_HOLDOUT_IMAGES, size // 5)
+        
+        holdout = set(np.linspace(0, size - 1, count).astype(int).tolist()) if count else set()
+        return [index for index in range(size) if index not in holdout], sorted(holdout)
+    
+    @staticmethod
+    def _spread(indices: List[int]) -> List[int]:
+        """Up to QUANTIZATION_CALIBRATION_IMAGES of the given crop indices, spread evenly."""
+        count = min(settings.QUANTIZATION_CALIBRATION_IMAGES, len(indices))
+        if not count:
+            return []
+        return sorted({indices[int(position)] for position in np.linspace(0, len(indices) - 1, count).astype(int)})
+    
+    @staticmethod
+    def _calibration_samples(dataset: Dataset, indices: List[int]) -> List[Tuple[torch.Tensor, int]]:
+        """(input, class index) pairs of the given crops."""
+        samples = []
+        for index in indices:
+            item = dataset[index]
+            if item is not None:
+                samples.append((item[0].unsqueeze(0), item[1]))
+        
+        return samples
+    
+    @staticmethod
+    def _prepare(model_id: int, image_path: str, db: Session) -> Tuple[LoadedModel, torch.Tensor]:
+        """Resident model and input tensor for a prediction."""
         ml_model = db.query(MLModel).filter(MLModel.id == model_id).first()
         
         if not ml_model or ml_model.status != "ready":
             raise ValueError("Model not ready for inference")
         
-        # Load model
-        training_info = ml_model.training_info or {}
-        num_classes = training_info.get("num_classes", 10)
-        labels = training_info.get("labels", [f"class_{i}" for i in range(num_classes)])
+        # Resident model, loaded once per process
+        return ModelRegistry.get(ml_model), image_to_tensor(image_path)
+    
+    @staticmethod
+    def format_prediction(probabilities: torch.Tensor, labels: List[str]) -> Dict[str, Any]:
+        """Top label and per-label probabilities from one softmax row."""
+        confidence, predicted = torch.max(probabilities, 0)
+        predicted_label = labels[predicted.item()] if predicted.item() < len(labels) else "unknown"
+        
+        return {
+            "label": predicted_label,
+            "confidence": float(confidence.item()),
+            "all_probabilities": {
+                labels[i] if i < len(labels) else f"class_{i}": float(prob)
+                for i, prob in enumerate(probabilities.tolist())
+            }
+        }
+    
+    @staticmethod
+    def predict(model_id: int, image_path: str, db: Session) -> Dict[str, Any]:
+        """Run inference with a trained model (blocking; call from a worker thread)."""
+        loaded, tensor = TrainingService._prepare(model_id, image_path, db)
         
-        model = SimpleClassifier(num_classes=num_classes)
+        # Run inference
+        with torch.inference_mode():
+            probabilities = torch.nn.functional.softmax(loaded.model(tensor), dim=1)
+        return TrainingService.format_prediction(probabilities[0], loaded.labels)
+    
+    @staticmethod
+    async def predict_batched(model_id: int, image_path: str, db: Session) -> Dict[str, Any]:
+        """Run inference through the micro-batcher, sharing forward passes with concurrent requests."""
+        if settings.PREDICT_MAX_BATCH <= 1:
+            return await asyncio.to_thread(TrainingService.predict, model_id, image_path, db)
         
-        if ml_model.model_path and torch.cuda.is_available():
-            model.load_state_dict(torch.load(ml_model.model_path))
+        # Decoding and preprocessing stay on the request's thread; only the forward pass is batched
+        loaded, tensor = await asyncio.to_thread(TrainingService._prepare, model_id, image_path, db)
+        probabilities = await asyncio.wrap_future(InferenceBatcher.submit(loaded, tensor))
+        return TrainingService.format_prediction(probabilities, loaded.labels)
+    
+    @staticmethod
+    def _write_predictions(db: Session, predictions: List[Tuple[int, Optional[int], Dict[str, Any]]]) -> None:
+        """Store (image_id, project_id, prediction) triples as classification annotations."""
+        annotations = [
+            Annotation(
+                image_id=image_id,
+                label=prediction["label"],
+                annotation_type="classification",
+                confidence=prediction["confidence"],
+            )
+            for image_id, _, prediction in predictions
+        ]
+        db.add_all(annotations)
         
-        model.eval()
+        by_project = itertools.groupby(
+            sorted(zip(predictions, annotations), key=lambda pair: pair[0][1] or 0),
+            key=lambda pair: pair[0][1],
+        )
+        for project_id, pairs in by_project:
+            LabelService.apply_labels(db, project_id, [annotation for _, annotation in pairs])
+        db.commit()
+    
+    @staticmethod
+    def predict_stream(
+        model_id: int,
+        images: List[Tuple[int, str, Optional[int]]],
+        write_annotations: bool = False,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[str]:
+        """Score (image_id, filepath, project_id) rows, yielding one NDJSON line per image.
         
-        # Run inference (simplified)
-        with torch.no_grad():
-            dummy_input = torch.randn(1, 3, 224, 224)
-            outputs = model(dummy_input)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
+        Images are decoded and resized on the shared vision pool, the next
+        batch while the current one runs through the model here, so no
+        processes are started per request. Lines are yielded as each batch
+        completes, followed by a summary line. With write_annotations, each
+        batch's predictions are committed as classification annotations.
+        """
+        db = SessionLocal()
+        batch = upcoming = []
+        try:
+            ml_model = db.query(MLModel).filter(MLModel.id == model_id).first()
+            if not ml_model or ml_model.status != "ready":
+                raise ValueError("Model not ready for inference")
+            loaded = ModelRegistry.get(ml_model)
             
-            # Get top prediction
-            confidence, predicted = torch.max(probabilities, 1)
-            predicted_label = labels[predicted.item()] if predicted.item() < len(labels) else "unknown"
+            batch_size = batch_size or settings.PREDICT_BATCH_SIZE
+            pool = get_vision_pool()
             
-            return {
-                "label": predicted_label,
-                "confidence": float(confidence.item()),
-                "all_probabilities": {
-                    labels[i] if i < len(labels) else f"class_{i}": float(prob)
-                    for i, prob in enumerate(probabilities[0])
-                }
-            }
+            def submit(start: int) -> List[Tuple[int, Any]]:
+                return [
+                    (index, pool.submit(load_square_rgb, images[index][1], INPUT_SIZE))
+                    for index in range(start, min(start + batch_size, len(images)))
+                ]
+            
+            scored = failed = 0
+            upcoming = submit(0)
+            for start in range(0, len(images), batch_size):
+                batch, upcoming = upcoming, submit(start + batch_size)
+                
+                indices, tensors = [], []
+                for index, future in batch:
+                    try:
+                        tensors.append(rgb_to_tensor(future.result(timeout=settings.VISION_JOB_TIMEOUT or None)))
+                        indices.append(index)
+                    except Exception as e:
+                        # Unreadable images are reported per item instead of failing the batch
+                        failed += 1
+                        yield json.dumps({"image_id": images[index][0], "error": str(e)}) + "\n"
+                
+                if not tensors:
+                    continue
+                inputs = torch.stack(tensors)
+                
+                with torch.inference_mode():
+                    probabilities = torch.nn.functional.softmax(loaded.model(inputs), dim=1)
+                predictions = [TrainingService.format_prediction(row, loaded.labels) for row in probabilities]
+                
+                if write_annotations:
+                    TrainingService._write_predictions(db, [
+                        (images[index][0], images[index][2], prediction)
+                        for index, prediction in zip(indices, predictions)
+                    ])
+                
+                for index, prediction in zip(indices, predictions):
+                    scored += 1
+                    yield json.dumps({"image_id": images[index][0], **prediction}) + "\n"
+            
+            yield json.dumps({"summary": {"total": len(images), "scored": scored, "failed": failed}}) + "\n"
+        
+        finally:
+            # A client that disconnects mid-stream leaves queued decodes behind
+            for _, future in batch + upcoming:
+                future.cancel()
+            db.close()
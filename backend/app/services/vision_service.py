@@ -1,150 +1,357 @@
 """Vision service for AI tasks."""
+import itertools
+import os
 import cv2
 import numpy as np
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from app.models.task import VisionTask
 from app.models.image import Image
 from app.models.annotation import Annotation
+from app.core.config import settings
+from app.services.geometry_service import GeometryService
+from app.services.label_service import LabelService
+from app.services.overlap_service import OverlapService
+from app.services.worker_pool import run_vision_jobs
+from app.utils.image_cache import load_image_scaled, raster_source, read_image_size, read_region
+
+
+# Detection tiles handled by the vision pool per round, per worker
+TILES_PER_WORKER = 2
+
+# Bump when a detector or classifier changes its output; invalidates cached results
+MODEL_VERSIONS = {"detection": "contour-3", "classification": "color-2"}
+
+# Histogram bins per channel in classification results
+HISTOGRAM_BITS = 4
+HISTOGRAM_BINS = 1 << HISTOGRAM_BITS
 
 
 class VisionService:
     """Service for vision-related tasks."""
     
     @staticmethod
-    async def detect_objects(image_path: str, task_id: int, db: Session) -> Dict[str, Any]:
-        """Run object detection on an image."""
+    def _contour_boxes(
+        img: np.ndarray,
+        scale_x: float = 1.0,
+        scale_y: float = 1.0,
+        offset_x: int = 0,
+        offset_y: int = 0,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Contour detector on a raster; candidate boxes in original image coordinates, scores and classes."""
+        # Simple contour detection as a demo
+        # In production, you'd use a real model like YOLO
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        edges = cv2.Canny(blurred, 50, 150)
+        
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        boxes = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.float64).reshape(-1, 4)
+        # Area in original pixels, so thresholds don't depend on the processing scale
+        areas = np.array([cv2.contourArea(contour) for contour in contours], dtype=np.float64) * scale_x * scale_y
+        
+        # Filter small detections
+        keep = areas > 100
+        boxes = (boxes[keep] + (offset_x, offset_y, 0, 0)) * (scale_x, scale_y, scale_x, scale_y)
+        scores = np.minimum(0.5 + areas[keep] / 10000, 0.99)
+        return boxes, scores, np.full(len(boxes), "object", dtype=object)
+    
+    @staticmethod
+    def postprocess(
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        classes: np.ndarray,
+        options: Optional[Dict[str, Any]] = None,
+        limit: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Suppress overlapping candidates and rank them by score.
+        
+        Options (falling back to settings): "nms" (hard, soft or none),
+        "iou_threshold", "class_agnostic" and "max_detections", which is
+        only applied when limit is set.
+        """
+        options = options or {}
+        method = options.get("nms") or settings.DETECTION_NMS
+        iou_threshold = options.get("iou_threshold")
+        if iou_threshold is None:
+            iou_threshold = settings.DETECTION_IOU_THRESHOLD
+        max_detections = options.get("max_detections")
+        if max_detections is None:
+            max_detections = settings.DETECTION_MAX_DETECTIONS
+        class_codes = None
+        if not options.get("class_agnostic") and len(classes):
+            class_codes = np.unique(classes.astype(str), return_inverse=True)[1].reshape(-1)
+        
+        # Only the strongest candidates of each class take part in suppression
+        if settings.DETECTION_PRE_NMS_TOP_K > 0 and len(scores) > settings.DETECTION_PRE_NMS_TOP_K:
+            top = VisionService._top_k_per_class(scores, class_codes, settings.DETECTION_PRE_NMS_TOP_K)
+            boxes, scores, classes = boxes[top], scores[top], classes[top]
+            class_codes = class_codes[top] if class_codes is not None else None
+        
+        if method == "soft":
+            keep, scores = OverlapService.soft_nms(boxes, scores, iou_threshold, classes=class_codes)
+            boxes, classes = boxes[keep], classes[keep]
+        elif method == "hard":
+            max_keep = max_detections if limit and max_detections > 0 else None
+            keep = OverlapService.nms(boxes, scores, iou_threshold, class_codes, max_keep=max_keep)
+            boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        else:
+            order = np.argsort(-scores, kind="stable")
+            boxes, scores, classes = boxes[order], scores[order], classes[order]
+        
+        if limit and max_detections > 0:
+            boxes, scores, classes = boxes[:max_detections], scores[:max_detections], classes[:max_detections]
+        return boxes, scores, classes
+    
+    @staticmethod
+    def _top_k_per_class(scores: np.ndarray, class_codes: Optional[np.ndarray], k: int) -> np.ndarray:
+        """Indices of the k highest-scoring candidates of each class (of all if class_codes is None)."""
+        if class_codes is None:
+            return np.sort(np.argsort(-scores, kind="stable")[:k])
+        order = np.lexsort((-scores, class_codes))
+        sorted_codes = class_codes[order]
+        first = np.searchsorted(sorted_codes, sorted_codes, side="left")
+        return np.sort(order[np.arange(len(order)) - first < k])
+    
+    @staticmethod
+    def _detection_result(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, **extra: Any) -> Dict[str, Any]:
+        """Build the detection result payload from ranked box, score and class arrays."""
+        detections = [
+            {"bbox": [int(v) for v in box], "confidence": score, "class": str(label)}
+            for box, score, label in zip(np.rint(boxes).tolist(), scores.tolist(), classes.tolist())
+        ]
+        return {"detections": detections, "count": len(detections), **extra}
+    
+    @staticmethod
+    def run_detection(image_path: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Detect objects in an image (CPU-bound, runs in a vision worker).
+        
+        Detection runs on a raster downscaled to at most options["max_side"]
+        pixels (settings.DETECTION_MAX_SIDE by default); boxes are returned in
+        original image coordinates, ranked by score after NMS.
+        """
+        options = options or {}
+        max_side = options.get("max_side")
+        if max_side is None:
+            max_side = settings.DETECTION_MAX_SIDE
+        
+        # Load image at processing resolution
+        img, scale_x, scale_y = load_image_scaled(image_path, max_side)
+        candidates = VisionService._contour_boxes(img, scale_x, scale_y)
+        return VisionService._detection_result(*VisionService.postprocess(*candidates, options))
+    
+    @staticmethod
+    def detect_tile(
+        source: Dict[str, Any],
+        x0: int,
+        y0: int,
+        x1: int,
+        y1: int,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Detect objects in one full-resolution tile (CPU-bound, runs in a vision worker).
+        
+        The worker reads just its tile's region from the raster source.
+        Candidates are not truncated, and are only suppressed within the tile
+        with hard NMS, which leaves scores untouched for the cross-tile
+        merge. Soft-NMS would decay scores a second time there, so it runs
+        once, after the merge.
+        """
+        options = options or {}
+        if (options.get("nms") or settings.DETECTION_NMS) != "hard":
+            options = {**options, "nms": "none"}
+        
+        tile = read_region(source, x0, y0, x1, y1)
+        candidates = VisionService._contour_boxes(tile, offset_x=x0, offset_y=y0)
+        return VisionService.postprocess(*candidates, options, limit=False)
+    
+    @staticmethod
+    def tiles(width: int, height: int, tile_size: int, overlap: int) -> Iterator[Tuple[int, int, int, int]]:
+        """Overlapping (x0, y0, x1, y1) tiles covering a raster; edge tiles are shifted inward."""
+        stride = max(tile_size - overlap, 1)
+        
+        def starts(length: int) -> List[int]:
+            if length <= tile_size:
+                return [0]
+            return list(range(0, length - tile_size, stride)) + [length - tile_size]
+        
+        for y0 in starts(height):
+            for x0 in starts(width):
+                yield x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)
+    
+    @staticmethod
+    def needs_tiling(image_path: str) -> bool:
+        """Whether an image's full-resolution longest side exceeds DETECTION_TILE_THRESHOLD."""
+        threshold = settings.DETECTION_TILE_THRESHOLD
+        return threshold > 0 and max(read_image_size(image_path)) > threshold
+    
+    @staticmethod
+    def run_tiled_detection(
+        image_path: str,
+        options: Optional[Dict[str, Any]] = None,
+        tile_size: Optional[int] = None,
+        overlap: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Detect objects tile by tile at full resolution across the vision pool and merge seams with NMS.
+        
+        Tiling exists to find objects too small for the DETECTION_MAX_SIDE
+        raster, so max_side does not apply here. Workers read their tiles
+        by region from a raster_source, a bounded number at a time, so no
+        process holds the whole raster while detecting and detector memory
+        per worker follows the tile size, not the image size.
+        """
+        options = options or {}
+        tile_size = tile_size or settings.DETECTION_TILE_SIZE
+        overlap = settings.DETECTION_TILE_OVERLAP if overlap is None else overlap
+        
+        source, spill_path = raster_source(image_path)
         try:
-            # Update task status
-            task = db.query(VisionTask).filter(VisionTask.id == task_id).first()
-            if task:
-                task.status = "running"
-                task.progress = 10
-                db.commit()
-            
-            # Load image
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError("Failed to load image")
-            
-            # Simple contour detection as a demo
-            # In production, you'd use a real model like YOLO
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            edges = cv2.Canny(blurred, 50, 150)
-            
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            jobs = (
+                (source, x0, y0, x1, y1, options)
+                for x0, y0, x1, y1 in VisionService.tiles(source["width"], source["height"], tile_size, overlap)
+            )
+            window_size = TILES_PER_WORKER * (settings.VISION_WORKERS or os.cpu_count() or 1)
             
-            detections = []
-            for i, contour in enumerate(contours[:20]):  # Limit to 20 detections
-                x, y, w, h = cv2.boundingRect(contour)
-                area = cv2.contourArea(contour)
+            found, tile_count = [], 0
+            while True:
+                window = list(itertools.islice(jobs, window_size))
+                if not window:
+                    break
                 
-                # Filter small detections
-                if area > 100:
-                    detections.append({
-                        "bbox": [int(x), int(y), int(w), int(h)],
-                        "confidence": min(0.5 + (area / 10000), 0.99),
-                        "class": "object",
-                    })
-            
-            # Update task
-            if task:
-                task.status = "completed"
-                task.progress = 100
-                task.results = {"detections": detections, "count": len(detections)}
-                db.commit()
-            
-            return {"detections": detections, "count": len(detections)}
-            
-        except Exception as e:
-            if task:
-                task.status = "failed"
-                task.error_message = str(e)
-                db.commit()
-            raise
+                for outcome in run_vision_jobs(VisionService.detect_tile, window):
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    found.append(outcome)
+                tile_count += len(window)
+        finally:
+            if spill_path is not None:
+                os.remove(spill_path)
+        
+        boxes, scores, classes = (np.concatenate(parts) for parts in zip(*found))
+        return VisionService._detection_result(
+            *VisionService.postprocess(boxes, scores, classes, options), tiles=tile_count
+        )
     
     @staticmethod
-    async def classify_image(image_path: str, task_id: int, db: Session) -> Dict[str, Any]:
-        """Classify an image."""
-        try:
-            task = db.query(VisionTask).filter(VisionTask.id == task_id).first()
-            if task:
-                task.status = "running"
-                task.progress = 10
-                db.commit()
-            
-            # Simple color-based classification as demo
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError("Failed to load image")
-            
-            # Calculate dominant color
-            avg_color = np.mean(img, axis=(0, 1))
-            b, g, r = avg_color
-            
-            # Simple classification based on dominant color
-            if r > g and r > b:
-                label = "red-dominant"
-                confidence = r / 255.0
-            elif g > r and g > b:
-                label = "green-dominant"
-                confidence = g / 255.0
-            else:
-                label = "blue-dominant"
-                confidence = b / 255.0
-            
-            result = {
-                "class": label,
-                "confidence": float(confidence),
-                "all_scores": {
-                    "red-dominant": float(r / 255.0),
-                    "green-dominant": float(g / 255.0),
-                    "blue-dominant": float(b / 255.0),
-                }
-            }
-            
-            if task:
-                task.status = "completed"
-                task.progress = 100
-                task.results = result
-                db.commit()
-            
-            return result
-            
-        except Exception as e:
-            if task:
-                task.status = "failed"
-                task.error_message = str(e)
-                db.commit()
-            raise
+    def detect(image_paths: List[str], options: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """Run detection for images from a queue worker, one result or exception per image.
+        
+        Regular images are detected in parallel, one per vision worker; huge
+        ones (or all, with options["tiled"]) are split into tiles across the
+        pool. Without a "tiled" option this is decided per image from its size.
+        """
+        options = options or {}
+        tiled = options.get("tiled")
+        results: List[Any] = [None] * len(image_paths)
+        regular = []
+        
+        for index, path in enumerate(image_paths):
+            try:
+                use_tiles = VisionService.needs_tiling(path) if tiled is None else tiled
+                if use_tiles:
+                    results[index] = VisionService.run_tiled_detection(path, options)
+                else:
+                    regular.append(index)
+            except Exception as e:
+                results[index] = e
+        
+        outcomes = run_vision_jobs(VisionService.run_detection, [(image_paths[i], options) for i in regular])
+        for index, outcome in zip(regular, outcomes):
+            results[index] = outcome
+        
+        return results
     
     @staticmethod
-    async def auto_annotate(image_id: int, db: Session) -> List[Annotation]:
-        """Auto-annotate an image using vision models."""
-        image = db.query(Image).filter(Image.id == image_id).first()
-        if not image:
-            raise ValueError("Image not found")
-        
-        # Create a vision task
-        task = VisionTask(
-            name=f"Auto-annotate image {image_id}",
-            task_type="detection",
-            status="running",
-        )
-        db.add(task)
-        db.commit()
+    def result_signature(task_type: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Everything besides the image content that determines a task's results."""
+        signature = {
+            "task_type": task_type,
+            "version": MODEL_VERSIONS[task_type],
+            "options": {key: value for key, value in (options or {}).items() if key != "image_id"},
+        }
+        if task_type == "detection":
+            signature["defaults"] = [
+                settings.DETECTION_MAX_SIDE,
+                settings.DETECTION_TILE_THRESHOLD,
+                settings.DETECTION_TILE_SIZE,
+                settings.DETECTION_TILE_OVERLAP,
+                settings.DETECTION_NMS,
+                settings.DETECTION_IOU_THRESHOLD,
+                settings.DETECTION_MAX_DETECTIONS,
+                settings.DETECTION_PRE_NMS_TOP_K,
+            ]
+        elif task_type == "classification":
+            signature["defaults"] = [settings.CLASSIFICATION_MAX_SIDE]
+        return signature
+    
+    @staticmethod
+    def run_classification(image_path: str, max_side: Optional[int] = None) -> Dict[str, Any]:
+        """Classify an image (CPU-bound, runs in a vision worker).
         
-        try:
-            # Run detection
-            results = await VisionService.detect_objects(image.filepath, task.id, db)
-            
-            # Create annotations from detections
-            annotations = []
-            for detection in results.get("detections", []):
+        Works on a decode downscaled to max_side (CLASSIFICATION_MAX_SIDE by
+        default): channel means and deviations come from one meanStdDev pass
+        and the per-channel histograms from a single bincount.
+        """
+        if max_side is None:
+            max_side = settings.CLASSIFICATION_MAX_SIDE
+        
+        # Simple color-based classification as demo
+        img, _, _ = load_image_scaled(image_path, max_side)
+        
+        # Channel statistics (OpenCV order is BGR)
+        mean, std = cv2.meanStdDev(img)
+        b, g, r = mean.ravel()
+        
+        pixels = img.reshape(-1, 3)
+        codes = (pixels >> (8 - HISTOGRAM_BITS)).astype(np.intp) + np.arange(3) * HISTOGRAM_BINS
+        histogram = np.bincount(codes.ravel(), minlength=3 * HISTOGRAM_BINS).reshape(3, HISTOGRAM_BINS) / len(pixels)
+        
+        # Simple classification based on dominant color
+        if r > g and r > b:
+            label = "red-dominant"
+            confidence = r / 255.0
+        elif g > r and g > b:
+            label = "green-dominant"
+            confidence = g / 255.0
+        else:
+            label = "blue-dominant"
+            confidence = b / 255.0
+        
+        return {
+            "class": label,
+            "confidence": float(confidence),
+            "all_scores": {
+                "red-dominant": float(r / 255.0),
+                "green-dominant": float(g / 255.0),
+                "blue-dominant": float(b / 255.0),
+            },
+            "channel_stats": {
+                channel: {"mean": float(mean[index, 0]), "std": float(std[index, 0])}
+                for index, channel in ((2, "red"), (1, "green"), (0, "blue"))
+            },
+            "histograms": {
+                channel: histogram[index].round(6).tolist()
+                for index, channel in ((2, "red"), (1, "green"), (0, "blue"))
+            },
+        }
+    
+    @staticmethod
+    def create_annotations(
+        images: List[Image],
+        detections: Dict[int, List[Dict[str, Any]]],
+        db: Session,
+    ) -> List[Annotation]:
+        """Add annotations for each image's detections to the session without committing.
+        
+        All images are sanitized and labeled as one batch, so a chunk of a
+        project costs a handful of queries rather than several per image.
+        """
+        annotations = []
+        for image in images:
+            for detection in detections.get(image.id, []):
                 bbox = detection["bbox"]
-                annotation = Annotation(
-                    image_id=image_id,
+                annotations.append(Annotation(
+                    image_id=image.id,
                     label=detection.get("class", "object"),
                     annotation_type="bbox",
                     x=bbox[0],
@@ -152,15 +359,25 @@ class VisionService:
                     width=bbox[2],
                     height=bbox[3],
                     confidence=detection.get("confidence"),
-                )
-                db.add(annotation)
-                annotations.append(annotation)
-            
-            db.commit()
-            return annotations
-            
-        except Exception as e:
-            task.status = "failed"
-            task.error_message = str(e)
-            db.commit()
-            raise
+                ))
+        
+        # Clip detections to their images and drop degenerate boxes
+        annotations, _, _ = GeometryService.sanitize_annotations(
+            annotations,
+            {image.id: (image.width, image.height) for image in images},
+            settings.GEOMETRY_SIMPLIFY_TOLERANCE,
+        )
+        db.add_all(annotations)
+        
+        by_project: Dict[int, List[Annotation]] = {}
+        project_ids = {image.id: image.project_id for image in images}
+        for ann in annotations:
+            by_project.setdefault(project_ids[ann.image_id], []).append(ann)
+        for project_id, project_annotations in by_project.items():
+            LabelService.apply_labels(db, project_id, project_annotations)
+        
+        for image in images:
+            if image.status == "pending":
+                image.status = "annotating"
+        
+        return annotations
@@ -0,0 +1,90 @@
+"""Process pool for CPU-bound vision work."""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from app.core.config import settings
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker() -> None:
+    """Give each worker a single OpenCV thread; the pool provides the parallelism."""
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def get_vision_pool() -> ProcessPoolExecutor:
+    """Get (lazily creating) the shared vision worker pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.VISION_WORKERS or None,
+                # Spawned workers don't inherit the API's DB connections or threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def shutdown_vision_pool() -> None:
+    """Shut down the shared vision worker pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_vision_job(func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    """Run a picklable function in the vision pool and wait for its result.
+    
+    On timeout the caller gets TimeoutError immediately; a job that has
+    already started keeps its worker busy until it finishes.
+    """
+    if timeout is None:
+        timeout = settings.VISION_JOB_TIMEOUT
+    
+    try:
+        return get_vision_pool().submit(func, *args).result(timeout=timeout or None)
+    except FutureTimeoutError:
+        raise TimeoutError(f"Vision job exceeded {timeout}s")
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool for later jobs
+        shutdown_vision_pool()
+        raise
+
+
+def run_vision_jobs(
+    func: Callable[..., Any],
+    jobs: Sequence[Tuple[Any, ...]],
+    timeout: Optional[float] = None,
+) -> List[Any]:
+    """Run a batch of jobs in the vision pool, in parallel.
+    
+    Returns one entry per job, in order: its result, or the exception it
+    raised, so a single bad image doesn't fail the whole batch. The timeout
+    applies to each wait for the next result.
+    """
+    if timeout is None:
+        timeout = settings.VISION_JOB_TIMEOUT
+    
+    futures = [get_vision_pool().submit(func, *args) for args in jobs]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=timeout or None))
+        except FutureTimeoutError:
+            future.cancel()
+            results.append(TimeoutError(f"Vision job exceeded {timeout}s"))
+        except BrokenProcessPool as e:
+            shutdown_vision_pool()
+            results.append(e)
+        except Exception as e:
+            results.append(e)
+    
+    return results
@@ -0,0 +1,52 @@
+"""Compact binary encoding for polygon coordinates."""
+import base64
+from typing import Dict, List, Optional
+import numpy as np
+
+
+# Little-endian float32, vertices stored interleaved as x0, y0, x1, y1, ...
+COORDINATE_DTYPE = np.dtype("<f4")
+
+
+def points_to_array(points: List[Dict[str, float]]) -> np.ndarray:
+    """Convert a list of {"x", "y"} points into an (N, 2) float32 array."""
+    return np.array([(p["x"], p["y"]) for p in points], dtype=COORDINATE_DTYPE).reshape(-1, 2)
+
+
+def array_to_points(array: np.ndarray) -> List[Dict[str, float]]:
+    """Convert an (N, 2) array back into a list of {"x", "y"} points."""
+    return [{"x": x, "y": y} for x, y in np.asarray(array, dtype=np.float64).reshape(-1, 2).tolist()]
+
+
+def pack_array(array: np.ndarray) -> bytes:
+    """Pack an (N, 2) coordinate array into bytes (8 bytes per vertex)."""
+    return np.ascontiguousarray(array, dtype=COORDINATE_DTYPE).tobytes()
+
+
+def unpack_array(data: bytes) -> np.ndarray:
+    """Unpack bytes into a read-only (N, 2) float32 array without copying."""
+    return np.frombuffer(data, dtype=COORDINATE_DTYPE).reshape(-1, 2)
+
+
+def pack_coordinates(points: List[Dict[str, float]]) -> bytes:
+    """Pack a list of {"x", "y"} points into bytes."""
+    return pack_array(points_to_array(points))
+
+
+def unpack_coordinates(data: bytes) -> List[Dict[str, float]]:
+    """Unpack bytes into a list of {"x", "y"} points."""
+    return array_to_points(unpack_array(data))
+
+
+def encode_base64(data: Optional[bytes]) -> Optional[str]:
+    """Encode packed coordinates as base64 text for JSON responses."""
+    if data is None:
+        return None
+    return base64.b64encode(data).decode("ascii")
+
+
+def encode_flat(data: Optional[bytes]) -> Optional[List[float]]:
+    """Encode packed coordinates as a flat [x0, y0, x1, y1, ...] list."""
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype=COORDINATE_DTYPE).tolist()
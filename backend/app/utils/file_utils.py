@@ -1,4 +1,5 @@
 """File utilities for upload handling."""
+import hashlib
 import os
 import uuid
 from pathlib import Path
@@ -53,6 +54,7 @@ async def save_upload_file(file: UploadFile, upload_dir: str = None) -> Tuple[st
         # Get image metadata
         metadata = get_image_metadata(filepath)
         metadata["file_size"] = len(contents)
+        metadata["content_hash"] = hashlib.sha256(contents).hexdigest()
         metadata["mime_type"] = file.content_type
         
         return filepath, metadata
@@ -88,3 +90,12 @@ def delete_file(filepath: str) -> None:
             os.remove(filepath)
     except Exception:
         pass  # Silent fail for file deletion
+
+
+def file_sha256(filepath: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,226 @@
+"""Byte-budgeted LRU cache of decoded images."""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+from app.core.config import settings
+
+
+# JPEG-style reduced decodes OpenCV supports, keyed by scale denominator
+REDUCED_COLOR_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class DecodedImageCache:
+    """LRU cache of decoded image arrays, bounded by total array bytes.
+    
+    Entries are keyed by path, modification time, file size and decode
+    flags, so a replaced file is decoded again. Cached arrays are read-only;
+    callers that need to draw on an image must copy it first. Each process
+    has its own cache (vision pool workers included).
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, path: str, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        """Decode an image, or return the cached array if the file is unchanged."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, flags)
+        
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+        
+        # Decode outside the lock so threads don't serialize on slow files
+        image = cv2.imread(path, flags)
+        if image is None:
+            raise ValueError("Failed to load image")
+        image.setflags(write=False)
+        
+        if image.nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = image
+                    self._bytes += image.nbytes
+                    while self._bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._bytes -= evicted.nbytes
+                        self.evictions += 1
+        
+        return image
+    
+    def clear(self) -> None:
+        """Drop all cached images."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+image_cache = DecodedImageCache(settings.IMAGE_CACHE_MB * 1024 * 1024)
+
+
+def load_image(path: str, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """Decode an image through the process-wide cache (read-only result)."""
+    return image_cache.get(path, flags)
+
+
+def resize_square_rgb(img: np.ndarray, size: int) -> np.ndarray:
+    """Resize a BGR image to size x size RGB uint8."""
+    img = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def load_square_rgb(path: str, size: int) -> np.ndarray:
+    """Decode an image through the cache and resize it to size x size RGB uint8.
+    
+    Vision pool entry point for model inputs; kept free of torch so pool
+    workers don't import it.
+    """
+    return resize_square_rgb(load_image(path), size)
+
+
+def read_image_size(path: str) -> Tuple[int, int]:
+    """Width and height from the file header, without decoding pixels."""
+    with PILImage.open(path) as header:
+        return header.size
+
+
+def load_image_scaled(path: str, max_side: int) -> Tuple[np.ndarray, float, float]:
+    """Decode an image with its longer side at most max_side pixels.
+    
+    The largest reduced decode (1/2, 1/4, 1/8) that still covers max_side
+    is used, so large JPEGs are never fully decoded, then the remainder is
+    resized. Returns the image and the x/y factors mapping its pixel
+    coordinates back to the original resolution. max_side <= 0 decodes at
+    full resolution.
+    """
+    width, height = read_image_size(path)
+    
+    factor = 1
+    if max_side > 0:
+        for candidate in sorted(REDUCED_COLOR_FLAGS, reverse=True):
+            if max(width, height) / candidate >= max_side:
+                factor = candidate
+                break
+    
+    img = load_image(path, REDUCED_COLOR_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    
+    # The decode applies EXIF orientation; the header size doesn't
+    if width != height and (img.shape[1] > img.shape[0]) != (width > height):
+        width, height = height, width
+    
+    longest = max(img.shape[:2])
+    if max_side > 0 and longest > max_side:
+        scale = max_side / longest
+        img = cv2.resize(
+            img,
+            (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    
+    return img, width / img.shape[1], height / img.shape[0]
+
+
+def raster_source(path: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Describe a full-resolution BGR raster whose regions can be read with read_region.
+    
+    Uncompressed 8-bit RGB/BGR files stored as one block (PPM, BMP, single
+    strip TIFF) are read in place, so a region costs only its own rows.
+    Anything else is decoded once and spilled to a temporary raw file,
+    returned as the second value for the caller to delete. Either way
+    readers map the file and copy only their region.
+    
+    Compressed formats (JPEG, PNG, compressed TIFF) are not decoded in
+    tiles: OpenCV can't decode a region of them, so building their spill
+    file briefly holds the whole decoded image (width x height x 3 bytes)
+    in memory.
+    """
+    with PILImage.open(path) as header:
+        tile = header.tile[0] if len(header.tile) == 1 else None
+        if (
+            tile is not None
+            and header.mode == "RGB"
+            and tile[0] == "raw"
+            and tuple(tile[1]) == (0, 0) + header.size
+            and isinstance(tile[3], tuple) and len(tile[3]) == 3
+            and tile[3][0] in ("RGB", "BGR")
+            and tile[3][2] in (1, -1)
+        ):
+            width, height = header.size
+            rawmode, stride, orientation = tile[3]
+            return {
+                "path": path,
+                "offset": tile[2],
+                "width": width,
+                "height": height,
+                "stride": stride or width * 3,
+                "rgb": rawmode == "RGB",
+                "bottom_up": orientation == -1,
+            }, None
+    
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Failed to load image")
+    
+    fd, spill_path = tempfile.mkstemp(suffix=".bgr")
+    with os.fdopen(fd, "wb") as f:
+        img.tofile(f)
+    height, width = img.shape[:2]
+    return {
+        "path": spill_path,
+        "offset": 0,
+        "width": width,
+        "height": height,
+        "stride": width * 3,
+        "rgb": False,
+        "bottom_up": False,
+    }, spill_path
+
+
+def read_region(source: Dict[str, Any], x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+    """Copy the BGR pixels of [x0, x1) x [y0, y1) out of a raster_source."""
+    height = source["height"]
+    rows = np.memmap(
+        source["path"], dtype=np.uint8, mode="r", offset=source["offset"], shape=(height, source["stride"])
+    )
+    if source["bottom_up"]:
+        block = rows[height - y1:height - y0][::-1]
+    else:
+        block = rows[y0:y1]
+    
+    region = block[:, x0 * 3:x1 * 3].reshape(y1 - y0, x1 - x0, 3)
+    if source["rgb"]:
+        region = region[:, :, ::-1]
+    return np.ascontiguousarray(region)
@@ -0,0 +1,188 @@
+"""Queue worker process for vision and training tasks.
+
+Run one or more per host: ``python -m app.worker --threads 4``. Each thread
+claims tasks from the vision_tasks table, keeps its lease alive with
+heartbeats, and hands CPU-bound work to the vision process pool. Model
+training can be given its own workers with ``--task-types model_training``
+and kept off the others with ``--exclude-task-types model_training``.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from typing import List, Optional
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.result_cache import ResultCache
+from app.services.task_handlers import TASK_HANDLERS
+from app.services.task_queue import Lease, LeaseLost, TaskQueue, current_lease
+from app.services.worker_pool import shutdown_vision_pool
+
+
+logger = logging.getLogger("app.worker")
+
+
+class Heartbeat:
+    """Background thread extending a claimed task's lease until stopped.
+    
+    While active, the lease is the current one for TaskQueue.check_lease in
+    the worker thread, so handlers see when it is lost.
+    """
+    
+    def __init__(self, task_id: int, worker_id: str):
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease = Lease(task_id, worker_id)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._token = None
+    
+    def _run(self) -> None:
+        interval = max(settings.TASK_LEASE_SECONDS / 3, 1)
+        while not self._stop.wait(interval):
+            db = SessionLocal()
+            try:
+                if not TaskQueue.heartbeat(db, self.task_id, self.worker_id):
+                    logger.warning("Lost lease on task %s", self.task_id)
+                    self.lease.lost.set()
+                    return
+            except Exception:
+                logger.exception("Heartbeat failed for task %s", self.task_id)
+            finally:
+                db.close()
+    
+    def __enter__(self) -> "Heartbeat":
+        self._token = current_lease.set(self.lease)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        current_lease.reset(self._token)
+
+
+class TaskWorker:
+    """Claims and runs queued vision tasks."""
+    
+    def __init__(
+        self,
+        worker_id: str,
+        task_types: Optional[List[str]] = None,
+        exclude_task_types: Optional[List[str]] = None,
+    ):
+        self.worker_id = worker_id
+        self.task_types = task_types
+        self.exclude_task_types = exclude_task_types
+    
+    def run_once(self) -> bool:
+        """Claim and run one task; returns False if the queue was empty."""
+        db = SessionLocal()
+        try:
+            task = TaskQueue.claim(db, self.worker_id, self.task_types, self.exclude_task_types)
+            if task is None:
+                return False
+            
+            task_id = task.id
+            logger.info("Running task %s (%s, attempt %s)", task_id, task.task_type, task.attempts)
+            
+            try:
+                handler = TASK_HANDLERS.get(task.task_type)
+                if handler is None:
+                    raise ValueError(f"No handler for task type '{task.task_type}'")
+                
+                with Heartbeat(task_id, self.worker_id):
+                    results = handler(task, db)
+                
+                if not TaskQueue.complete(db, task_id, self.worker_id, results):
+                    logger.warning("Task %s lease lost before completion; results discarded", task_id)
+            
+            except LeaseLost:
+                # Another attempt owns the task now; leave its state to that attempt
+                logger.warning("Task %s stopped after losing its lease", task_id)
+                db.rollback()
+            
+            except Exception as e:
+                logger.exception("Task %s failed", task_id)
+                TaskQueue.fail(db, task_id, self.worker_id, str(e))
+            
+            return True
+        
+        finally:
+            db.close()
+    
+    def run_forever(self, stop: threading.Event) -> None:
+        """Process tasks until stopped, polling while the queue is empty."""
+        while not stop.is_set():
+            try:
+                if not self.run_once():
+                    stop.wait(settings.TASK_POLL_INTERVAL)
+            except Exception:
+                # Database unavailable or similar; back off and keep going
+                logger.exception("Worker loop error")
+                stop.wait(settings.TASK_POLL_INTERVAL)
+
+
+def evict_result_cache(stop: threading.Event) -> None:
+    """Evict stale result cache entries every VISION_CACHE_EVICT_INTERVAL until stopped."""
+    while not stop.wait(settings.VISION_CACHE_EVICT_INTERVAL):
+        db = SessionLocal()
+        try:
+            evicted = ResultCache.evict(db)
+            if evicted:
+                logger.info("Evicted %d cached results", evicted)
+        except Exception:
+            logger.exception("Result cache eviction failed")
+        finally:
+            db.close()
+
+
+def main() -> None:
+    """Run worker threads until SIGINT/SIGTERM, finishing in-flight tasks."""
+    parser = argparse.ArgumentParser(description="Vision task queue worker")
+    parser.add_argument("--threads", type=int, default=settings.VISION_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--task-types", nargs="*", default=None, help="Only claim these task types")
+    parser.add_argument("--exclude-task-types", nargs="*", default=None, help="Never claim these task types")
+    args = parser.parse_args()
+    
+    unknown = set(args.task_types or []) | set(args.exclude_task_types or [])
+    unknown -= set(TASK_HANDLERS)
+    if unknown:
+        parser.error(f"Unknown task types: {', '.join(sorted(unknown))}")
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    
+    host_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    threads = [
+        threading.Thread(
+            target=TaskWorker(f"{host_id}:{index}", args.task_types, args.exclude_task_types).run_forever,
+            args=(stop,),
+            name=f"worker-{index}",
+        )
+        for index in range(args.threads)
+    ]
+    
+    for thread in threads:
+        thread.start()
+    if settings.VISION_CACHE_EVICT_INTERVAL > 0:
+        threading.Thread(target=evict_result_cache, args=(stop,), name="cache-eviction", daemon=True).start()
+    logger.info("Worker %s started with %d threads", host_id, len(threads))
+    
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+    finally:
+        stop.set()
+        shutdown_vision_pool()
+
+
+if __name__ == "__main__":
+    main()
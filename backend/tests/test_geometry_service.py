@@ -0,0 +1,150 @@
+"""Tests for clipping, simplification and sanitizing in GeometryService."""
+import numpy as np
+from app.models.annotation import Annotation
+from app.services.geometry_service import GeometryService
+
+
+def _douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Recursive reference implementation over one open chain of vertices."""
+    if len(points) < 3:
+        return points
+    
+    a, ab = points[0], points[-1] - points[0]
+    ap = points[1:-1] - a
+    norm = np.hypot(*ab)
+    if norm > 0:
+        dist = np.abs(ab[0] * ap[:, 1] - ab[1] * ap[:, 0]) / norm
+    else:
+        dist = np.hypot(ap[:, 0], ap[:, 1])
+    
+    split = int(np.argmax(dist)) + 1
+    if dist[split - 1] <= tolerance:
+        return points[[0, -1]]
+    return np.vstack([_douglas_peucker(points[:split + 1], tolerance)[:-1], _douglas_peucker(points[split:], tolerance)])
+
+
+def _random_polygons(rng: np.random.Generator, count: int) -> list:
+    polygons = []
+    for _ in range(count):
+        vertices = int(rng.integers(3, 40))
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radii = rng.uniform(20, 50, vertices)
+        polygons.append(np.column_stack([100 + radii * np.cos(angles), 100 + radii * np.sin(angles)]))
+    return polygons
+
+
+def test_clip_boxes_clamps_normalizes_and_flags_degenerate():
+    boxes = np.array([
+        [-10, -10, 30, 30],      # partly outside: clipped
+        [50, 50, -20, -10],      # negative size: normalized
+        [200, 10, 20, 20],       # entirely right of the image: no area left
+        [10, 10, np.nan, 5],     # non-finite
+        [5, 5, 10, 10],          # already inside
+    ])
+    bounds = np.tile([100, 80], (len(boxes), 1))
+    
+    clipped, valid = GeometryService.clip_boxes(boxes, bounds)
+    
+    np.testing.assert_allclose(clipped[0], [0, 0, 20, 20])
+    np.testing.assert_allclose(clipped[1], [30, 40, 20, 10])
+    np.testing.assert_allclose(clipped[4], boxes[4])
+    assert valid.tolist() == [True, True, False, False, True]
+
+
+def test_clip_boxes_unbounded_images_only_clip_at_zero():
+    clipped, valid = GeometryService.clip_boxes([[-5, 10, 1e6, 20]], [[np.inf, np.inf]])
+    np.testing.assert_allclose(clipped, [[0, 10, 1e6 - 5, 20]])
+    assert valid.all()
+
+
+def test_clip_points_clamps_and_flags_non_finite():
+    clipped, valid = GeometryService.clip_points([[-1, 5], [150, 90], [np.inf, 1]], np.tile([100, 80], (3, 1)))
+    np.testing.assert_allclose(clipped[:2], [[0, 5], [100, 80]])
+    assert valid.tolist() == [True, True, False]
+
+
+def test_polygon_areas_match_shoelace_per_polygon():
+    rng = np.random.default_rng(3)
+    polygons = _random_polygons(rng, 50)
+    vertices = np.concatenate(polygons)
+    counts = np.array([len(polygon) for polygon in polygons])
+    
+    expected = [
+        0.5 * abs(np.dot(p[:, 0], np.roll(p[:, 1], -1)) - np.dot(np.roll(p[:, 0], -1), p[:, 1]))
+        for p in polygons
+    ]
+    np.testing.assert_allclose(GeometryService.polygon_areas(vertices, counts), expected)
+
+
+def test_clip_polygons_flags_degenerate_polygons():
+    polygons = [
+        [[-10, -10], [50, -10], [50, 50], [-10, 50]],  # clipped to a smaller square
+        [[0, 0], [10, 0]],                              # too few vertices
+        [[0, 0], [5, 5], [10, 10]],                     # collinear: no area
+        [[200, 0], [300, 0], [300, 50]],                # clamped onto the right edge
+        [[0, 0], [np.nan, 0], [10, 10]],                # non-finite
+    ]
+    counts = np.array([len(polygon) for polygon in polygons])
+    bounds = np.tile([100, 80], (len(polygons), 1))
+    
+    clipped, valid = GeometryService.clip_polygons(np.concatenate(polygons), counts, bounds)
+    
+    np.testing.assert_allclose(clipped[:4], [[0, 0], [50, 0], [50, 50], [0, 50]])
+    assert valid.tolist() == [True, False, False, False, False]
+
+
+def test_simplify_polygons_matches_recursive_reference():
+    rng = np.random.default_rng(4)
+    polygons = _random_polygons(rng, 200)
+    counts = np.array([len(polygon) for polygon in polygons])
+    
+    vertices, new_counts = GeometryService.simplify_polygons(np.concatenate(polygons), counts, 3.0)
+    
+    starts = np.cumsum(new_counts) - new_counts
+    for polygon, start, count in zip(polygons, starts, new_counts):
+        expected = _douglas_peucker(polygon, 3.0)
+        if len(expected) < 3:
+            expected = polygon
+        np.testing.assert_allclose(vertices[start:start + count], expected)
+
+
+def test_simplify_polygons_drops_collinear_vertices_and_keeps_small_polygons():
+    square = [[0, 0], [5, 0], [10, 0], [10, 5], [10, 10], [5, 10], [0, 10], [0, 5]]
+    triangle = [[0, 0], [1, 0], [0, 1]]
+    
+    vertices, counts = GeometryService.simplify_polygons(np.array(square + triangle), [8, 3], 0.5)
+    
+    assert counts.tolist() == [5, 3]
+    np.testing.assert_allclose(vertices[:5], [[0, 0], [10, 0], [10, 10], [0, 10], [0, 5]])
+    np.testing.assert_allclose(vertices[5:], triangle)
+
+
+def test_simplify_polygons_disabled_returns_input():
+    vertices = np.array([[0, 0], [5, 0], [10, 0], [10, 10]], dtype=np.float64)
+    simplified, counts = GeometryService.simplify_polygons(vertices, [4], 0.0)
+    np.testing.assert_array_equal(simplified, vertices)
+    assert counts.tolist() == [4]
+
+
+def test_sanitize_annotations_counts_only_rewritten_annotations():
+    inside = Annotation(image_id=1, x=10, y=10, width=20, height=20)
+    overhanging = Annotation(image_id=1, x=90, y=70, width=20, height=20)
+    outside = Annotation(image_id=1, x=150, y=10, width=5, height=5)
+    point = Annotation(image_id=1, x=120, y=-3)
+    polygon = Annotation(image_id=1)
+    polygon.coordinates = [{"x": -5, "y": 0}, {"x": 50, "y": 0}, {"x": 50, "y": 50}]
+    unknown_size = Annotation(image_id=2, x=5000, y=5000, width=10, height=10)
+    annotations = [inside, overhanging, outside, point, polygon, unknown_size]
+    
+    valid, invalid, modified = GeometryService.sanitize_annotations(annotations, {1: (100, 80)})
+    
+    assert invalid == [outside]
+    assert valid == [inside, overhanging, point, polygon, unknown_size]
+    assert modified == 3
+    assert (overhanging.x, overhanging.y, overhanging.width, overhanging.height) == (90, 70, 10, 10)
+    assert (point.x, point.y) == (100, 0)
+    assert polygon.coordinates[0] == {"x": 0, "y": 0}
+    assert (inside.x, inside.width, unknown_size.x) == (10, 20, 5000)
+    
+    # A second pass finds nothing left to rewrite
+    assert GeometryService.sanitize_annotations(valid, {1: (100, 80)})[2] == 0
@@ -0,0 +1,48 @@
+"""Tests for label resolution in LabelService."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models import Label, Project, User
+from app.services.label_service import LabelService
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'labels.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    
+    with factory() as db:
+        user = User(username="owner", email="owner@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(Project(id=1, name="Street", owner_id=user.id))
+        db.commit()
+    
+    yield factory
+    engine.dispose()
+
+
+def test_resolve_labels_creates_and_reuses(sessions):
+    with sessions() as db:
+        first = LabelService.resolve_labels(db, 1, ["car", "person"])
+        db.commit()
+        again = LabelService.resolve_labels(db, 1, ["car"])
+        
+        assert again["car"].id == first["car"].id
+        assert db.query(Label).count() == 2
+
+
+def test_resolve_labels_survives_a_concurrent_insert(sessions, monkeypatch):
+    with sessions() as db, sessions() as other:
+        # This session read the dictionary before the other one inserted "car"
+        monkeypatch.setattr(LabelService, "_label_index", staticmethod(lambda db, project_id: {}))
+        other.add(Label(project_id=1, name="car"))
+        other.commit()
+        
+        resolved = LabelService.resolve_labels(db, 1, ["car", "truck"])
+        db.commit()
+        
+        assert resolved["car"].id == other.query(Label).filter(Label.name == "car").one().id
+        assert sorted(name for (name,) in db.query(Label.name)) == ["car", "truck"]
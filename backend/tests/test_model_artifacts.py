@@ -0,0 +1,86 @@
+"""Parity of exported ONNX, TorchScript and int8 artifacts with the eager classifier."""
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.services.classifier import INPUT_SIZE, SimpleClassifier
+from app.services.model_compiler import export_torchscript
+from app.services.onnx_backend import PARITY_TOLERANCE
+from app.services.quantization import quantize_model
+
+
+# The exports trace a batch of 4; other sizes exercise the dynamic batch axis
+BATCH_SIZES = (1, 3, 8)
+
+
+@pytest.fixture(scope="module")
+def model() -> SimpleClassifier:
+    torch.manual_seed(0)
+    return SimpleClassifier(num_classes=5).eval()
+
+
+@pytest.fixture(scope="module")
+def inputs() -> torch.Tensor:
+    generator = torch.Generator().manual_seed(1)
+    return torch.rand(max(BATCH_SIZES), 3, INPUT_SIZE, INPUT_SIZE, generator=generator)
+
+
+def _eager(model: SimpleClassifier, batch: torch.Tensor) -> torch.Tensor:
+    with torch.inference_mode():
+        return model(batch)
+
+
+@pytest.fixture(scope="module")
+def onnx_model(model, tmp_path_factory):
+    pytest.importorskip("onnxruntime")
+    from app.services.onnx_backend import OnnxModel, export_onnx
+    
+    path = str(tmp_path_factory.mktemp("onnx") / "model.onnx")
+    export_onnx(model, path)
+    return OnnxModel(path)
+
+
+@pytest.fixture(scope="module")
+def torchscript_model(model, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("torchscript") / "model.ts.pt")
+    export_torchscript(model, path)
+    return torch.jit.load(path)
+
+
+@pytest.fixture(scope="module")
+def int8_model(model, inputs, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("int8") / "model.int8.pt")
+    samples = [(inputs[i:i + 1], i % 5) for i in range(len(inputs))]
+    quantize_model(model, path, "dynamic", samples[:4], samples[4:])
+    return torch.jit.load(path)
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_onnx_matches_eager(model, onnx_model, inputs, batch_size):
+    batch = inputs[:batch_size]
+    logits = onnx_model(batch)
+    
+    assert logits.shape == (batch_size, 5)
+    assert float((logits - _eager(model, batch)).abs().max()) <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_torchscript_matches_eager(model, torchscript_model, inputs, batch_size):
+    batch = inputs[:batch_size]
+    with torch.inference_mode():
+        logits = torchscript_model(batch)
+    
+    assert logits.shape == (batch_size, 5)
+    assert float((logits - _eager(model, batch)).abs().max()) <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_int8_tracks_eager(model, int8_model, inputs, batch_size):
+    batch = inputs[:batch_size]
+    with torch.inference_mode():
+        logits = int8_model(batch)
+    expected = _eager(model, batch)
+    
+    # Int8 weights only approximate the float ones, so the check is relative and loose
+    assert logits.shape == (batch_size, 5)
+    assert float((logits - expected).abs().max()) <= 0.1 * float(expected.abs().max())
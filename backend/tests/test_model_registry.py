@@ -0,0 +1,32 @@
+"""Tests for loading models in ModelRegistry."""
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.models.model import MLModel
+from app.services.classifier import SimpleClassifier
+from app.services.model_registry import ModelRegistry, ModelWeightsMissing
+
+
+def _ready_model(model_path: str) -> MLModel:
+    return MLModel(id=1, name="m", model_type="classifier", status="ready", model_path=model_path,
+                   config={"quantized": False}, training_info={"num_classes": 3, "labels": ["a", "b", "c"]})
+
+
+def test_missing_weights_raise_instead_of_serving_random_ones(tmp_path):
+    ml_model = _ready_model(str(tmp_path / "model.pth"))
+    
+    with pytest.raises(ModelWeightsMissing):
+        ModelRegistry.get(ml_model)
+    assert 1 not in ModelRegistry.stats()["models"]
+
+
+def test_loads_saved_weights(tmp_path):
+    torch.manual_seed(0)
+    model = SimpleClassifier(num_classes=3)
+    path = str(tmp_path / "model.pth")
+    torch.save(model.state_dict(), path)
+    
+    loaded = ModelRegistry.load(_ready_model(path))
+    assert torch.equal(loaded.model.fc2.weight, model.fc2.weight)
+    assert loaded.labels == ["a", "b", "c"]
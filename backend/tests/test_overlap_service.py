@@ -0,0 +1,138 @@
+"""Tests for pair generation, duplicate grouping and NMS in OverlapService."""
+import tracemalloc
+import numpy as np
+from app.services.overlap_service import OverlapService
+
+
+def _random_boxes(rng: np.random.Generator, count: int, extent: float = 500.0) -> np.ndarray:
+    return np.column_stack([
+        rng.uniform(0, extent, count),
+        rng.uniform(0, extent, count),
+        rng.uniform(5, 60, count),
+        rng.uniform(5, 60, count),
+    ])
+
+
+def _brute_force_groups(boxes: np.ndarray, iou_threshold: float) -> set:
+    iou = OverlapService.pairwise_iou(boxes, boxes)
+    np.fill_diagonal(iou, 0)
+    parent = list(range(len(boxes)))
+    
+    def find(node: int) -> int:
+        while parent[node] != node:
+            node = parent[node]
+        return node
+    
+    for i, j in zip(*np.nonzero(iou > iou_threshold)):
+        parent[find(i)] = find(j)
+    
+    members = {}
+    for node in range(len(boxes)):
+        members.setdefault(find(node), set()).add(node)
+    return {frozenset(group) for group in members.values() if len(group) > 1}
+
+
+def _group_sets(groups: list) -> set:
+    return {frozenset([group["keep_id"], *group["duplicate_ids"]]) for group in groups}
+
+
+def test_overlapping_pairs_matches_brute_force():
+    rng = np.random.default_rng(1)
+    boxes = _random_boxes(rng, 400)
+    pairs_i, pairs_j, pairs_iou = OverlapService.overlapping_pairs(boxes, 0.1, max_pairs=97)
+    
+    iou = OverlapService.pairwise_iou(boxes, boxes)
+    expected_i, expected_j = np.nonzero(np.triu(iou > 0.1, k=1))
+    assert sorted(zip(pairs_i.tolist(), pairs_j.tolist())) == sorted(zip(expected_i.tolist(), expected_j.tolist()))
+    np.testing.assert_allclose(pairs_iou, iou[pairs_i, pairs_j])
+
+
+def test_duplicate_groups_match_brute_force():
+    rng = np.random.default_rng(2)
+    boxes = _random_boxes(rng, 300)
+    # Exact copies and a zero-area box must be handled like any other box
+    boxes = np.vstack([boxes, boxes[:20], [[10, 10, 0, 0], [10, 10, 0, 0]]])
+    ids = list(range(len(boxes)))
+    
+    groups = OverlapService.duplicate_groups(ids, boxes, 0.3)
+    assert _group_sets(groups) == _brute_force_groups(boxes, 0.3)
+
+
+def test_duplicate_groups_respect_labels():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10], [1, 1, 10, 10]], dtype=np.float64)
+    groups = OverlapService.duplicate_groups([1, 2, 3], boxes, 0.5, labels=["cat", "dog", "cat"])
+    assert _group_sets(groups) == {frozenset([1, 3])}
+
+
+def test_duplicate_groups_keep_manual_then_confident_box():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10], [0, 0, 10, 11]], dtype=np.float64)
+    groups = OverlapService.duplicate_groups([5, 6, 7], boxes, 0.5, confidences=[0.9, None, 0.95])
+    assert groups == [{"keep_id": 6, "duplicate_ids": [5, 7], "max_iou": 1.0}]
+
+
+def test_duplicate_groups_dense_stack_stays_bounded():
+    # 10k stacked near-duplicates: ~50M overlapping pairs that must never be held at once
+    rng = np.random.default_rng(3)
+    count = 10000
+    boxes = np.column_stack([
+        100 + rng.uniform(0, 2, count),
+        100 + rng.uniform(0, 2, count),
+        50 + rng.uniform(0, 2, count),
+        50 + rng.uniform(0, 2, count),
+    ])
+    boxes[: count // 2] = boxes[0]
+    
+    tracemalloc.start()
+    try:
+        groups = OverlapService.duplicate_groups(list(range(count)), boxes, 0.7)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert len(groups) == 1
+    assert len(groups[0]["duplicate_ids"]) == count - 1
+    assert groups[0]["max_iou"] == 1.0
+    assert peak < 512 * 1024 * 1024
+
+
+def _reference_nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, classes: np.ndarray) -> list:
+    iou = OverlapService.pairwise_iou(boxes, boxes)
+    kept = []
+    for index in np.argsort(-scores, kind="stable"):
+        if all(iou[index, other] <= iou_threshold or classes[index] != classes[other] for other in kept):
+            kept.append(index)
+    return kept
+
+
+def test_nms_matches_sequential_greedy():
+    rng = np.random.default_rng(4)
+    boxes = _random_boxes(rng, 1500, extent=300.0)
+    scores = rng.uniform(0, 1, len(boxes))
+    classes = rng.integers(0, 3, len(boxes))
+    
+    keep = OverlapService.nms(boxes, scores, 0.4, classes)
+    assert keep.tolist() == _reference_nms(boxes, scores, 0.4, classes)
+    assert OverlapService.nms(boxes, scores, 0.4, classes, max_keep=10).tolist() == keep[:10].tolist()
+
+
+def test_nms_dense_stack_stays_bounded():
+    rng = np.random.default_rng(5)
+    count = 20000
+    boxes = np.column_stack([
+        rng.uniform(0, 20, count),
+        rng.uniform(0, 20, count),
+        np.full(count, 100.0),
+        np.full(count, 100.0),
+    ])
+    scores = rng.uniform(0, 1, count)
+    
+    tracemalloc.start()
+    try:
+        keep = OverlapService.nms(boxes, scores, 0.5)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert keep[0] == np.argmax(scores)
+    assert len(keep) < 10
+    assert peak < 64 * 1024 * 1024
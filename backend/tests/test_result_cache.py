@@ -0,0 +1,119 @@
+"""Tests for vision result reuse and eviction in ResultCache."""
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("cv2")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.db.database import Base
+from app.models import Image, User, VisionTask
+from app.services.result_cache import ResultCache
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _image(db, tmp_path, name: str, content: bytes) -> Image:
+    user = db.query(User).first()
+    if user is None:
+        user = User(username="owner", email="owner@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+    
+    path = tmp_path / name
+    path.write_bytes(content)
+    image = Image(filename=name, filepath=str(path), original_filename=name, uploader_id=user.id)
+    db.add(image)
+    db.commit()
+    return image
+
+
+def _completed(db, cache_key: str, age: timedelta = timedelta(0), results=None) -> VisionTask:
+    task = VisionTask(
+        name="cached",
+        task_type="detection",
+        status="completed",
+        results=results or {"boxes": []},
+        cache_key=cache_key,
+        completed_at=datetime.utcnow() - age,
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+def test_cache_key_follows_content_and_options(db, tmp_path):
+    first = _image(db, tmp_path, "a.jpg", b"same pixels")
+    copy = _image(db, tmp_path, "b.jpg", b"same pixels")
+    other = _image(db, tmp_path, "c.jpg", b"other pixels")
+    
+    key = ResultCache.cache_key(first, "detection", {"image_id": first.id}, db)
+    assert first.content_hash is not None
+    # The requesting image's id is not part of the key, only its content
+    assert ResultCache.cache_key(copy, "detection", {"image_id": copy.id}, db) == key
+    assert ResultCache.cache_key(other, "detection", {"image_id": other.id}, db) != key
+    assert ResultCache.cache_key(first, "detection", {"nms": "soft"}, db) != key
+    assert ResultCache.cache_key(first, "classification", None, db) != key
+
+
+def test_cache_disabled_without_entries(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VISION_CACHE_MAX_ENTRIES", 0)
+    image = _image(db, tmp_path, "a.jpg", b"pixels")
+    
+    assert ResultCache.cache_key(image, "detection", None, db) is None
+    assert ResultCache.lookup(db, None) is None
+
+
+def test_lookup_prefers_completed_and_skips_expired(db, monkeypatch):
+    monkeypatch.setattr(settings, "VISION_CACHE_TTL", 3600)
+    _completed(db, "k", age=timedelta(hours=2))
+    assert ResultCache.lookup(db, "k") is None
+    
+    running = VisionTask(name="in flight", task_type="detection", status="running", cache_key="k")
+    db.add(running)
+    db.commit()
+    assert ResultCache.lookup(db, "k").id == running.id
+    assert ResultCache.lookup(db, "k", completed_only=True) is None
+    
+    fresh = _completed(db, "k", age=timedelta(minutes=5))
+    assert ResultCache.lookup(db, "k").id == fresh.id
+
+
+def test_copy_result_is_a_new_completed_task(db):
+    cached = _completed(db, "k", results={"boxes": [[1, 2, 3, 4]]})
+    
+    copy = ResultCache.copy_result(db, cached, "Detection - b.jpg", {"image_id": 2})
+    
+    assert copy.id != cached.id
+    assert (copy.status, copy.progress, copy.results) == ("completed", 100, cached.results)
+    assert copy.config == {"image_id": 2}
+    # Copies are not cache entries themselves, so eviction never counts them
+    assert copy.cache_key is None
+
+
+def test_evict_drops_expired_and_oldest_beyond_the_limit(db, monkeypatch):
+    monkeypatch.setattr(settings, "VISION_CACHE_TTL", 3600)
+    monkeypatch.setattr(settings, "VISION_CACHE_MAX_ENTRIES", 2)
+    expired = _completed(db, "expired", age=timedelta(hours=2))
+    oldest = _completed(db, "oldest", age=timedelta(minutes=30))
+    newer = _completed(db, "newer", age=timedelta(minutes=20))
+    newest = _completed(db, "newest", age=timedelta(minutes=10))
+    
+    assert ResultCache.evict(db) == 2
+    
+    db.expire_all()
+    assert [task.cache_key for task in (expired, oldest, newer, newest)] == [None, None, "newer", "newest"]
+    # Evicted tasks keep their results; they just stop answering lookups
+    assert expired.results == {"boxes": []}
+    assert ResultCache.lookup(db, "oldest") is None
@@ -0,0 +1,97 @@
+"""Tests for SearchService on a SQLite database built by the migration chain."""
+import os
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.models import Annotation, Image, Project, User
+from app.services.search_service import SearchService
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'search.db'}"
+    # alembic/env.py reads the URL from the settings
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    command.upgrade(config, "head")
+    
+    engine = create_engine(url)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _seed(db) -> User:
+    user = User(username="owner", email="owner@example.com", hashed_password="x")
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    db.add_all([user, other])
+    db.flush()
+    
+    project = Project(name="Street", owner_id=user.id)
+    db.add(project)
+    db.flush()
+    
+    images = [
+        Image(filename=f"{name}.jpg", filepath=f"/data/{owner.id}/{name}.jpg", original_filename=f"{name}.jpg",
+              project_id=project.id if owner is user else None, uploader_id=owner.id)
+        for owner, name in [(user, "crosswalk_01"), (user, "parking_lot"), (other, "crosswalk_02")]
+    ]
+    db.add_all(images)
+    db.flush()
+    
+    db.add_all([
+        Annotation(image_id=images[0].id, label="pedestrian", annotation_type="bbox",
+                   annotation_metadata={"source": "auto"}),
+        Annotation(image_id=images[1].id, label="parked car", annotation_type="bbox",
+                   annotation_metadata={"source": "manual"}),
+        Annotation(image_id=images[2].id, label="pedestrian", annotation_type="bbox"),
+    ])
+    db.commit()
+    return user
+
+
+def test_migrations_create_sqlite_search_tables(db):
+    tables = {row[0] for row in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    assert {"images_fts", "annotations_fts", "labels"} <= tables
+
+
+def test_search_images_uses_fts_and_scopes_to_user(db):
+    user = _seed(db)
+    
+    results = SearchService.search_images(db, user.id, "walk")
+    assert [image.original_filename for image in results] == ["crosswalk_01.jpg"]
+    
+    # Shorter than a trigram: falls back to LIKE
+    assert len(SearchService.search_images(db, user.id, "_0")) == 1
+
+
+def test_search_annotations_by_label_and_metadata(db):
+    user = _seed(db)
+    
+    assert [a.label for a in SearchService.search_annotations(db, user.id, label="destri")] == ["pedestrian"]
+    assert [a.label for a in SearchService.search_annotations(db, user.id, metadata_key="source")] == [
+        "pedestrian", "parked car"
+    ]
+    manual = SearchService.search_annotations(db, user.id, metadata_key="source", metadata_value="manual")
+    assert [a.label for a in manual] == ["parked car"]
+
+
+def test_fts_follows_label_updates(db):
+    user = _seed(db)
+    annotation = db.query(Annotation).filter(Annotation.label == "parked car").one()
+    annotation.label = "delivery van"
+    db.commit()
+    
+    assert SearchService.search_annotations(db, user.id, label="parked") == []
+    assert [a.label for a in SearchService.search_annotations(db, user.id, label="deliv")] == ["delivery van"]
@@ -0,0 +1,153 @@
+"""Tests for the durable task queue."""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models import VisionTask
+from app.services.task_queue import TASK_TYPES, Lease, LeaseLost, TaskQueue, current_lease
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@contextmanager
+def _running_as(task: VisionTask, worker_id: str):
+    """Run the block as the worker thread executing task."""
+    lease = Lease(task.id, worker_id)
+    token = current_lease.set(lease)
+    try:
+        yield lease
+    finally:
+        current_lease.reset(token)
+
+
+def _expire_lease(db, task: VisionTask) -> None:
+    task.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_task_types_match_handlers():
+    pytest.importorskip("torch")
+    from app.services.task_handlers import TASK_HANDLERS
+    
+    assert set(TASK_HANDLERS) == TASK_TYPES
+
+
+def test_claim_hands_out_each_task_once(db):
+    detection = TaskQueue.enqueue(db, "detect", "detection")
+    classification = TaskQueue.enqueue(db, "classify", "classification")
+    
+    task = TaskQueue.claim(db, "w1")
+    assert task.id == detection.id
+    assert (task.status, task.attempts, task.locked_by) == ("running", 1, "w1")
+    assert task.lease_expires_at > datetime.utcnow()
+    
+    assert TaskQueue.claim(db, "w2", exclude_task_types=["classification"]) is None
+    assert TaskQueue.claim(db, "w2", task_types=["classification"]).id == classification.id
+    assert TaskQueue.claim(db, "w3") is None
+
+
+def test_expired_lease_is_reclaimed_and_fences_the_old_worker(db):
+    task = TaskQueue.enqueue(db, "detect", "detection")
+    TaskQueue.claim(db, "w1")
+    _expire_lease(db, task)
+    
+    reclaimed = TaskQueue.claim(db, "w2")
+    assert reclaimed.id == task.id
+    assert (reclaimed.attempts, reclaimed.locked_by) == (2, "w2")
+    
+    # The first worker can no longer extend, poll or complete the task
+    assert not TaskQueue.heartbeat(db, task.id, "w1")
+    with _running_as(task, "w1") as lease:
+        with pytest.raises(LeaseLost):
+            TaskQueue.check_lease(db)
+        assert lease.lost.is_set()
+    assert not TaskQueue.complete(db, task.id, "w1", {"boxes": 1})
+    
+    assert TaskQueue.heartbeat(db, task.id, "w2")
+    assert TaskQueue.complete(db, task.id, "w2", {"boxes": 2})
+    db.refresh(task)
+    assert (task.status, task.results, task.locked_by) == ("completed", {"boxes": 2}, None)
+
+
+def test_failed_attempt_is_retried_after_backoff(db):
+    task = TaskQueue.enqueue(db, "detect", "detection", max_attempts=2)
+    TaskQueue.claim(db, "w1")
+    
+    TaskQueue.fail(db, task.id, "w1", "boom")
+    db.refresh(task)
+    assert (task.status, task.error_message, task.locked_by) == ("pending", "boom", None)
+    assert task.available_at > datetime.utcnow()
+    
+    # Backing off: not claimable until available_at
+    assert TaskQueue.claim(db, "w1") is None
+    task.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    
+    retried = TaskQueue.claim(db, "w2")
+    assert retried.id == task.id
+    assert (retried.attempts, retried.error_message) == (2, None)
+
+
+def test_last_attempt_fails_for_good(db):
+    # Final failures run the task type's failure hook from task_handlers
+    pytest.importorskip("torch")
+    
+    task = TaskQueue.enqueue(db, "detect", "detection", max_attempts=1)
+    TaskQueue.claim(db, "w1")
+    TaskQueue.fail(db, task.id, "w1", "boom")
+    
+    db.refresh(task)
+    assert (task.status, task.error_message) == ("failed", "boom")
+    assert task.completed_at is not None
+    assert TaskQueue.claim(db, "w1") is None
+    
+    # A worker that died on its last attempt fails the task when the lease expires
+    orphan = TaskQueue.enqueue(db, "detect", "detection", max_attempts=1)
+    TaskQueue.claim(db, "w1")
+    _expire_lease(db, orphan)
+    
+    assert TaskQueue.claim(db, "w2") is None
+    db.refresh(orphan)
+    assert (orphan.status, orphan.error_message) == ("failed", "Worker lease expired")
+
+
+def test_progress_resumes_from_the_last_committed_chunk(db):
+    task = TaskQueue.enqueue(db, "repair", "geometry_repair")
+    TaskQueue.claim(db, "w1")
+    
+    stats = {"checked": 0}
+    assert TaskQueue.resume_point(task, stats) is None
+    assert TaskQueue.resume_point(None, stats) is None
+    
+    with _running_as(task, "w1"):
+        stats["checked"] = 10
+        TaskQueue.commit_progress(db, task, stats, 42, 50)
+    db.refresh(task)
+    assert (task.results, task.progress) == ({"checked": 10, "cursor": 42}, 50)
+    
+    # A retried attempt picks up the cursor and the running stats
+    _expire_lease(db, task)
+    TaskQueue.claim(db, "w2")
+    stats = {"checked": 0}
+    assert TaskQueue.resume_point(task, stats) == 42
+    assert stats == {"checked": 10}
+    
+    # The attempt that lost the task can't commit over the one that took it over
+    with _running_as(task, "w1"):
+        with pytest.raises(LeaseLost):
+            TaskQueue.commit_progress(db, task, {"checked": 20}, 84, 90)
+    db.rollback()
+    db.refresh(task)
+    assert task.results == {"checked": 10, "cursor": 42}
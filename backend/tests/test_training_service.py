@@ -0,0 +1,86 @@
+"""Tests for checkpoint resume and cancellation in TrainingService."""
+import os
+from datetime import datetime
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models import MLModel, VisionTask
+from app.services.training_service import TrainingService
+
+
+RUN = {"task_id": 7, "epochs": 5, "batch_size": 8, "learning_rate": 0.01, "project_id": 1,
+       "labels": ["car", "person"], "samples": 40}
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'training.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _checkpoint(model_dir, attempt: str, epoch: int, run=RUN) -> None:
+    TrainingService._save_checkpoint(
+        os.path.join(model_dir, attempt, "checkpoint.ckpt"), {"run": run, "epoch": epoch}
+    )
+
+
+def test_resume_picks_the_latest_earlier_attempt_of_the_same_run(tmp_path):
+    model_dir = str(tmp_path / "model_1")
+    task = VisionTask(id=7, attempts=4)
+    _checkpoint(model_dir, "task_7_1", epoch=1)
+    _checkpoint(model_dir, "task_7_2", epoch=2)
+    # Written with other hyperparameters: never resumed
+    _checkpoint(model_dir, "task_7_3", epoch=3, run={**RUN, "learning_rate": 0.1})
+    # The running attempt's own directory and other tasks are ignored
+    _checkpoint(model_dir, "task_7_4", epoch=4)
+    _checkpoint(model_dir, "task_8_1", epoch=5)
+    
+    assert TrainingService._previous_checkpoint(model_dir, task, RUN)["epoch"] == 2
+
+
+def test_resume_skips_unreadable_checkpoints(tmp_path):
+    model_dir = str(tmp_path / "model_1")
+    _checkpoint(model_dir, "task_7_1", epoch=1)
+    os.makedirs(os.path.join(model_dir, "task_7_2"))
+    with open(os.path.join(model_dir, "task_7_2", "checkpoint.ckpt"), "wb") as f:
+        f.write(b"truncated")
+    
+    assert TrainingService._previous_checkpoint(model_dir, VisionTask(id=7, attempts=3), RUN)["epoch"] == 1
+    assert TrainingService._previous_checkpoint(model_dir, None, RUN) is None
+    assert TrainingService._previous_checkpoint(str(tmp_path / "missing"), VisionTask(id=7, attempts=3), RUN) is None
+
+
+def test_cancel_before_training_keeps_the_served_weights(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    served = os.path.join("models", "model_1", "task_3_1")
+    stale = os.path.join("models", "model_1", "task_5_1")
+    for path in (served, stale):
+        os.makedirs(path)
+    weights = os.path.join(served, "model.pt")
+    open(weights, "wb").close()
+    
+    db.add_all([
+        MLModel(id=1, name="retrained", model_type="classifier", status="cancelling",
+                model_path=weights, completed_at=datetime.utcnow()),
+        MLModel(id=2, name="new", model_type="classifier", status="cancelling"),
+    ])
+    db.commit()
+    
+    assert TrainingService.train_model(1, db)["status"] == "cancelled"
+    assert TrainingService.train_model(2, db)["status"] == "cancelled"
+    
+    # The earlier weights keep serving; leftovers of other attempts are removed
+    assert db.get(MLModel, 1).status == "ready"
+    assert db.get(MLModel, 2).status == "cancelled"
+    assert os.path.exists(weights)
+    assert not os.path.exists(stale)
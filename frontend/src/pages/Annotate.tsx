@@ -24,6 +24,7 @@ export const Annotate: React.FC = () => {
   const navigate = useNavigate();
   
   const [image, setImage] = useState<Image | null>(null);
+  const [imageUrl, setImageUrl] = useState('');
   const [loading, setLoading] = useState(true);
   const [currentLabelInput, setCurrentLabelInput] = useState('object');
   
@@ -48,12 +49,10 @@ export const Annotate: React.FC = () => {
     if (!imageId) return;
 
     try {
-      const [imageData, annotationsData] = await Promise.all([
-        api.getImage(parseInt(imageId)),
-        api.getAnnotations({ image_id: parseInt(imageId) }),
-      ]);
-      setImage(imageData);
-      setAnnotations(annotationsData);
+      const workspace = await api.getImageWorkspace(parseInt(imageId));
+      setImage(workspace.image);
+      setImageUrl(api.getFileUrl(workspace.file_url));
+      setAnnotations(workspace.annotations);
     } catch (error) {
       toast.error('Failed to load image');
       console.error(error);
@@ -297,7 +296,7 @@ export const Annotate: React.FC = () => {
         <div className="flex-1">
           <AnnotationCanvas
             imageId={parseInt(imageId!)}
-            imageUrl={api.getImageUrl(parseInt(imageId!))}
+            imageUrl={imageUrl}
             imageWidth={image.width || 800}
             imageHeight={image.height || 600}
           />
@@ -5,6 +5,7 @@ import type {
   RegisterData,
   Project,
   Image,
+  ImageWorkspace,
   Annotation,
   CreateAnnotation,
   VisionTask,
@@ -127,6 +128,15 @@ class ApiService {
     return response.data;
   }
 
+  async getImageWorkspace(id: number): Promise<ImageWorkspace> {
+    const response = await this.api.get<ImageWorkspace>(`/images/${id}/workspace`);
+    return response.data;
+  }
+
+  getFileUrl(path: string): string {
+    return `${API_URL}${path}`;
+  }
+
   getImageUrl(id: number): string {
     const token = localStorage.getItem('token');
     return `${API_URL}/api/v1/images/${id}/file?token=${token}`;
@@ -192,11 +202,23 @@ class ApiService {
     return response.data;
   }
 
-  async autoAnnotate(imageId: number): Promise<{ message: string; image_id: number }> {
+  async classifyBatch(data: { image_ids?: number[]; project_id?: number; max_side?: number }): Promise<VisionTask> {
+    const response = await this.api.post<VisionTask>('/tasks/classify/batch', data);
+    return response.data;
+  }
+
+  async autoAnnotate(imageId: number): Promise<{ message: string; image_id: number; task_id: number }> {
     const response = await this.api.post(`/tasks/auto-annotate/${imageId}`);
     return response.data;
   }
 
+  async autoAnnotateProject(projectId: number, chunkSize?: number): Promise<VisionTask> {
+    const response = await this.api.post<VisionTask>(`/tasks/auto-annotate/project/${projectId}`, null, {
+      params: { chunk_size: chunkSize },
+    });
+    return response.data;
+  }
+
   async getTask(id: number): Promise<VisionTask> {
     const response = await this.api.get<VisionTask>(`/tasks/${id}`);
     return response.data;
@@ -219,12 +241,17 @@ class ApiService {
 
   async trainModel(
     id: number,
-    params?: { epochs?: number; batch_size?: number; learning_rate?: number }
+    params?: { epochs?: number; batch_size?: number; learning_rate?: number; project_id?: number }
   ): Promise<MLModel> {
     const response = await this.api.post<MLModel>(`/models/${id}/train`, null, { params });
     return response.data;
   }
 
+  async cancelTraining(id: number): Promise<MLModel> {
+    const response = await this.api.post<MLModel>(`/models/${id}/cancel`);
+    return response.data;
+  }
+
   async predict(modelId: number, imageId: number): Promise<any> {
     const response = await this.api.post(`/models/${modelId}/predict`, null, {
       params: { image_id: imageId },
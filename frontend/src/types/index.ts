@@ -54,6 +54,7 @@ export interface Annotation {
   id: number;
   image_id: number;
   label: string;
+  label_id?: number;
   annotation_type: string;
   x?: number;
   y?: number;
@@ -66,6 +67,25 @@ export interface Annotation {
   updated_at: string;
 }
 
+export interface Label {
+  id: number;
+  project_id: number;
+  name: string;
+  color?: string;
+  aliases?: string[];
+  created_at: string;
+  updated_at: string;
+}
+
+export interface ImageWorkspace {
+  image: Image;
+  annotations: Annotation[];
+  labels: Label[];
+  previous_ids: number[];
+  next_ids: number[];
+  file_url: string;
+}
+
 export interface CreateAnnotation {
   image_id: number;
   label: string;